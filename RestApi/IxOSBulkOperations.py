@@ -0,0 +1,257 @@
+"""
+Bulk port and card operations for IxOS REST APIs.
+A BulkOperation runs one operation (e.g. releaseownership) on many
+(chassis, resource) targets at once: the operations are started
+concurrently with a per-chassis limit, and the async operations the
+chassis return are tracked together by one background loop instead of
+one blocking wait_for_async_operation call per resource. The outcome is
+a report with one result per target.
+
+All requests are sent with PRIORITY_LOW, so the pollers' requests go first
+when they share a chassis' rate limit. Each operation times out on its own,
+counted from when it was started, and every polling pass sends at most
+poll_budget status requests per chassis, to the operations polled longest ago.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# works both as part of the RestApi package and when imported from this folder
+try:
+    from .IxOSRestInterface import IxRestException
+    from .IxOSRateLimiter import PRIORITY_LOW
+except ImportError:
+    from IxOSRestInterface import IxRestException
+    from IxOSRateLimiter import PRIORITY_LOW
+
+# operation name -> (resource type, REST operation)
+OPERATIONS = {
+    'takeownership': ('ports', 'takeownership'),
+    'releaseownership': ('ports', 'releaseownership'),
+    'reboot': ('ports', 'reboot'),
+    'resetfactorydefaults': ('ports', 'resetfactorydefaults'),
+    'hotswap': ('cards', 'hotswap'),
+}
+
+# per-target result states
+SUCCESS = 'SUCCESS'
+ERROR = 'ERROR'
+TIMEOUT = 'TIMEOUT'
+NOT_FOUND = 'NOT_FOUND'
+FAILED = 'FAILED'
+PENDING = 'PENDING'
+
+
+class BulkOperation(object):
+    """
+    one operation on many (chassis, resource) targets
+    Constructor arguments:
+        session_for:        callable returning the IxRestSession of a chassis address
+        operation:          one of OPERATIONS
+        targets:            (chassis_address, resource) pairs. resource is either the \
+                            REST id (int) or the port as "card/port" / (card, port), \
+                            the card as "card" / (card,) for hotswap.
+    Optional arguments:
+        per_chassis_limit:  requests in flight per chassis at any time.
+        timeout:            seconds after its start after which an unfinished operation \
+                            is reported as TIMEOUT.
+        poll_interval:      seconds between polling passes over the pending operations.
+        poll_budget:        status requests per chassis in one polling pass.
+    """
+
+    def __init__(self, session_for, operation, targets, per_chassis_limit=8, timeout=300, poll_interval=1,
+                 poll_budget=10):
+        if operation not in OPERATIONS:
+            raise IxRestException('unknown operation %s, expected one of %s' % (operation, ', '.join(OPERATIONS)))
+        self.session_for = session_for
+        self.operation = operation
+        self.resource_type, self.rest_operation = OPERATIONS[operation]
+        self.per_chassis_limit = per_chassis_limit
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.poll_budget = max(1, poll_budget)
+        self.results = [
+            {'chassis': chassis, 'target': resource, 'resourceId': None, 'operation': operation,
+             'status': PENDING, 'message': None, 'resultUrl': None, 'seconds': None}
+            for chassis, resource in targets
+        ]
+        self._limits = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    # public API
+
+    def start(self):
+        """
+        starts the operations in a background thread and returns immediately
+        """
+        if self._thread is None:
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='bulk-%s' % self.operation, daemon=True)
+            self._thread.start()
+        return self
+
+    def done(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        """
+        blocks until every target has a final state (or timeout seconds), returns report()
+        """
+        self.start()
+        self._thread.join(timeout)
+        return self.report()
+
+    def report(self):
+        """
+        summary counts per state and one result dictionary per target
+        """
+        with self._lock:
+            results = [dict(result) for result in self.results]
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return {
+            'operation': self.operation,
+            'total': len(results),
+            'succeeded': counts.get(SUCCESS, 0),
+            'failed': len(results) - counts.get(SUCCESS, 0) - counts.get(PENDING, 0),
+            'pending': counts.get(PENDING, 0),
+            'counts': counts,
+            'seconds': round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else 0,
+            'results': results,
+        }
+
+    # internals
+
+    def _finish(self, index, status, message=None, result_url=None):
+        with self._lock:
+            result = self.results[index]
+            result.update(status=status, message=message, resultUrl=result_url,
+                          seconds=round(time.time() - self.started_at, 3))
+            self._pending.pop(index, None)
+
+    def _limited(self, chassis, fn, *args):
+        with self._limits[chassis]:
+            return fn(*args)
+
+    def _resolve_ids(self, chassis, indexes):
+        """
+        maps the targets of one chassis to REST ids with a single /ports or /cards request
+        """
+        session = self.session_for(chassis)
+        wanted = [self.results[i]['target'] for i in indexes]
+        lookup = {}
+        if any(not isinstance(resource, int) for resource in wanted):
+            if self.resource_type == 'ports':
+                for port in self._limited(chassis, session.get_ports, None, True, PRIORITY_LOW).data or []:
+                    lookup[(str(port.get('cardNumber')), str(port.get('portNumber')))] = port['id']
+            else:
+                for card in self._limited(chassis, session.get_cards, None, PRIORITY_LOW).data or []:
+                    lookup[(str(card.get('cardNumber')),)] = card['id']
+        for index, resource in zip(indexes, wanted):
+            if isinstance(resource, int):
+                self.results[index]['resourceId'] = resource
+                continue
+            key = tuple(str(part) for part in (resource.split('/') if isinstance(resource, str) else resource))
+            if key in lookup:
+                self.results[index]['resourceId'] = lookup[key]
+            else:
+                self._finish(index, NOT_FOUND, 'no %s %s on chassis %s' % (self.resource_type[:-1], resource, chassis))
+        return session
+
+    def _start_one(self, session, chassis, index):
+        try:
+            response = self._limited(chassis, session.start_operation, self.resource_type,
+                                     self.results[index]['resourceId'], self.rest_operation, PRIORITY_LOW)
+            if response.status_code == 202 and response.data:
+                now = time.time()
+                with self._lock:
+                    self._pending[index] = {'session': session, 'chassis': chassis, 'operation': response.data,
+                                            'started': now, 'polled': now}
+                self._update(index, response.data)
+            else:
+                self._finish(index, SUCCESS)
+        except Exception as e:
+            self._finish(index, FAILED, str(e))
+
+    def _update(self, index, body):
+        state = body.get('state')
+        if state in ('SUCCESS', 'COMPLETED'):
+            self._finish(index, SUCCESS, body.get('message'), body.get('resultUrl'))
+        elif state == 'ERROR':
+            self._finish(index, ERROR, body.get('message'))
+        elif state != 'IN_PROGRESS':
+            self._finish(index, FAILED, 'unexpected operation state %s' % state)
+
+    def _poll_one(self, index):
+        with self._lock:
+            pending = self._pending.get(index)
+        if pending is None:
+            return
+        pending['polled'] = time.time()
+        try:
+            self._update(index, self._limited(pending['chassis'], pending['session'].get_operation_status,
+                                              pending['operation']['url'], PRIORITY_LOW))
+        except Exception as e:
+            self._finish(index, FAILED, str(e))
+
+    def _expire(self):
+        """
+        reports the operations started more than timeout seconds ago as TIMEOUT
+        """
+        now = time.time()
+        with self._lock:
+            expired = [index for index, pending in self._pending.items() if now - pending['started'] >= self.timeout]
+        for index in expired:
+            self._finish(index, TIMEOUT, 'operation still in progress after %ss' % self.timeout)
+
+    def _next_polls(self):
+        """
+        up to poll_budget pending operations per chassis, the ones polled longest ago first
+        """
+        by_chassis = {}
+        with self._lock:
+            for index, pending in self._pending.items():
+                by_chassis.setdefault(pending['chassis'], []).append((pending['polled'], index))
+        indexes = []
+        for waiting in by_chassis.values():
+            indexes.extend(index for _, index in sorted(waiting)[:self.poll_budget])
+        return indexes
+
+    def _run(self):
+        by_chassis = {}
+        for index, result in enumerate(self.results):
+            by_chassis.setdefault(result['chassis'], []).append(index)
+        self._limits = {chassis: threading.BoundedSemaphore(self.per_chassis_limit) for chassis in by_chassis}
+        workers = max(1, min(256, self.per_chassis_limit * len(by_chassis)))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                ThreadPoolExecutor(max_workers=workers) as poller:
+            # one id lookup per chassis, then every operation is started without waiting for it
+            sessions = {}
+            lookups = {chassis: executor.submit(self._resolve_ids, chassis, indexes)
+                       for chassis, indexes in by_chassis.items()}
+            for chassis, future in lookups.items():
+                try:
+                    sessions[chassis] = future.result()
+                except Exception as e:
+                    for index in by_chassis[chassis]:
+                        self._finish(index, FAILED, str(e))
+            starts = [
+                executor.submit(self._start_one, sessions[self.results[i]['chassis']], self.results[i]['chassis'], i)
+                for i in range(len(self.results))
+                if self.results[i]['status'] == PENDING and self.results[i]['chassis'] in sessions
+            ]
+
+            # the started async operations are tracked together while the rest are still starting
+            while self._pending or not all(future.done() for future in starts):
+                time.sleep(self.poll_interval)
+                self._expire()
+                list(poller.map(self._poll_one, self._next_polls()))
+
+        self.finished_at = time.time()
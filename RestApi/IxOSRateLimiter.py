@@ -0,0 +1,217 @@
+"""
+Per-chassis request rate limiting for IxOS REST APIs.
+Every IxRestSession sends its requests through a ChassisRateLimiter, a token
+bucket per chassis address. The bucket and the queue of waiting requests
+live in a small state file per chassis, locked with flock, so every process
+on the host (the pollers, bulk operations, ad-hoc scripts) draws on the same
+budget and their priorities compete. When requests have to queue, the ones
+with the lower priority number are served first, in arrival order within
+the same priority.
+
+The default limiter reads CHASSIS_RATE_LIMIT, CHASSIS_RATE_BURST and
+CHASSIS_RATE_LIMIT_DIR from the environment; an application can pass its own
+values (and per-chassis budgets) with default_rate_limiter.configure().
+
+The state directory is private to the user (mode 0700, the default one is
+<tmp>/ixos-rate-limit-<user>) and the state files are mode 0600, so other
+local users can neither change a bucket nor hold its lock.
+"""
+
+import os
+import json
+import time
+import getpass
+import tempfile
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Without fcntl (Windows) the budget is only shared by the threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_NAMES = {PRIORITY_HIGH: 'high', PRIORITY_NORMAL: 'normal', PRIORITY_LOW: 'low'}
+
+# A queued request whose process stopped refreshing it for this long is dropped
+STALE_TICKET_SECONDS = 5.0
+
+# Longest sleep between two looks at the shared state
+MAX_POLL_SECONDS = 0.05
+
+# report limiter waits to prometheus when the client library is installed
+try:
+    from prometheus_client import Histogram
+    _wait_seconds = Histogram(
+        'ixos_rest_rate_limit_wait_seconds',
+        'Time REST requests waited for the per-chassis rate limiter',
+        ['chassis', 'priority'],
+        buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    )
+except ImportError:
+    _wait_seconds = None
+
+
+def _default_state_dir():
+    try:
+        user = str(os.getuid())
+    except AttributeError:
+        user = getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f'ixos-rate-limit-{user}')
+
+
+def _check_private_dir(path):
+    """
+    creates the state directory with mode 0700, an existing one must belong
+    to this user and not be writable by others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        info = os.stat(path)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise PermissionError(f"rate limiter state directory {path} must belong to this user "
+                                  f"and not be writable by others")
+
+
+class ChassisRateLimiter(object):
+    """
+    token bucket per chassis, shared by all processes using the same state_dir
+    Optional arguments:
+        rate:       requests per second allowed per chassis, \
+                    None or 0 disables limiting.
+        burst:      requests that may be sent back to back, \
+                    defaults to rate.
+        budgets:    {chassis_address: (rate, burst)} overriding \
+                    the defaults for single chassis.
+        state_dir:  directory of the per-chassis state files, \
+                    defaults to <tmp>/ixos-rate-limit-<user>.
+    """
+
+    def __init__(self, rate=None, burst=None, budgets=None, state_dir=None):
+        # flock excludes other processes, this lock the other threads of this one
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._checked_dir = None
+        self.configure(rate, burst, budgets, state_dir)
+
+    def configure(self, rate=None, burst=None, budgets=None, state_dir=None):
+        """
+        sets the default and per-chassis budgets and where the shared state is kept
+        """
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self.budgets = dict(budgets or {})
+            self.state_dir = state_dir or _default_state_dir()
+
+    def _budget(self, chassis_address):
+        rate, burst = self.budgets.get(chassis_address, (self.rate, self.burst))
+        if not rate:
+            return None
+        return float(rate), float(burst or max(rate, 1))
+
+    def _state_path(self, chassis_address):
+        name = ''.join(c if c.isalnum() or c in '.-' else '_' for c in chassis_address)
+        return os.path.join(self.state_dir, name + '.json')
+
+    @contextmanager
+    def _shared_state(self, chassis_address):
+        """
+        locks the chassis' state file and yields its content as a dict,
+        written back when the block completes
+        """
+        with self._lock:
+            if self._checked_dir != self.state_dir:
+                _check_private_dir(self.state_dir)
+                self._checked_dir = self.state_dir
+            fd = os.open(self._state_path(chassis_address), os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'r+') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _try_take(self, chassis_address, ticket, priority, rate, burst):
+        """
+        refills the bucket and takes a token if this ticket is first in line
+        returns None when taken, else the seconds to sleep before trying again
+        """
+        with self._shared_state(chassis_address) as state:
+            now = time.time()
+            tokens = min(burst, state.get('tokens', burst) + max(0.0, now - state.get('updated', now)) * rate)
+            state['tokens'], state['updated'] = tokens, now
+
+            waiters = state.setdefault('waiters', {})
+            arrived = waiters[ticket][1] if ticket in waiters else now
+            waiters[ticket] = [priority, arrived, now]
+            for other, (_, _, refreshed) in list(waiters.items()):
+                if now - refreshed > STALE_TICKET_SECONDS:
+                    del waiters[other]
+
+            first = min(waiters, key=lambda t: (waiters[t][0], waiters[t][1], t))
+            if first != ticket:
+                return MAX_POLL_SECONDS
+            if tokens >= 1:
+                state['tokens'] = tokens - 1
+                del waiters[ticket]
+                return None
+            # stay below STALE_TICKET_SECONDS so a slow refill does not look like a dead waiter
+            return min((1 - tokens) / rate, 1.0)
+
+    def _withdraw(self, chassis_address, ticket):
+        with self._shared_state(chassis_address) as state:
+            state.get('waiters', {}).pop(ticket, None)
+
+    def acquire(self, chassis_address, priority=PRIORITY_NORMAL):
+        """
+        blocks until the chassis' budget allows one more request
+        returns the number of seconds waited
+        """
+        budget = self._budget(chassis_address)
+        if budget is None:
+            return 0.0
+        rate, burst = budget
+
+        start = time.monotonic()
+        ticket = f"{os.getpid()}-{threading.get_ident()}-{next(self._sequence)}"
+        granted = False
+        try:
+            while True:
+                delay = self._try_take(chassis_address, ticket, priority, rate, burst)
+                if delay is None:
+                    granted = True
+                    break
+                time.sleep(delay)
+        finally:
+            # an interrupted waiter must not stay in line ahead of everyone else
+            if not granted:
+                self._withdraw(chassis_address, ticket)
+
+        waited = time.monotonic() - start
+        if _wait_seconds is not None:
+            _wait_seconds.labels(chassis_address, PRIORITY_NAMES.get(priority, str(priority))).observe(waited)
+        return waited
+
+
+# limiter used by every IxRestSession unless one is passed explicitly
+default_rate_limiter = ChassisRateLimiter(
+    rate=float(os.getenv('CHASSIS_RATE_LIMIT', '5')),
+    burst=float(os.getenv('CHASSIS_RATE_BURST', '10')),
+    state_dir=os.getenv('CHASSIS_RATE_LIMIT_DIR') or None
+)
@@ -16,6 +16,24 @@ if sys.version_info[0] == 2 and ((sys.version_info[1] == 7 and sys.version_info[
 else:
     import urllib3
 
+# use the faster orjson/ijson backends when they are installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# works both as part of the RestApi package and when imported from this folder
+try:
+    from .IxOSRateLimiter import default_rate_limiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+except ImportError:
+    from IxOSRateLimiter import default_rate_limiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
 class IxRestException(Exception):
     pass
 
@@ -32,10 +50,12 @@ class IxRestSession(object):
         timeout:        Time to wait (in seconds) while polling \
                         for async operation.
         poll_interval:  Polling inteval in seconds.
+        rate_limiter:   ChassisRateLimiter the requests go through, \
+                        defaults to the limiter shared by all sessions.
     """
 
     def __init__(self, chassis_address, username=None, password=None, api_key=None,timeout=30, 
-                 poll_interval=2, verbose=False, insecure_request_warning=False):
+                 poll_interval=2, verbose=False, insecure_request_warning=False, rate_limiter=None):
 
         self.chassis_ip = chassis_address
         self.api_key = api_key
@@ -45,6 +65,9 @@ class IxRestSession(object):
         self._authUri = '/platform/api/v1/auth/session'
         self.username = username
         self.password = password
+        # created on first request and reused so the TLS connection stays alive
+        self._http = None
+        self.rate_limiter = rate_limiter or default_rate_limiter
 
         # ignore self sign certificate warning(s) if insecure_request_warning=False
         if not insecure_request_warning:
@@ -60,6 +83,14 @@ class IxRestSession(object):
         if not api_key:
             self.authenticate(username=self.username, password=self.password)
 
+    def get_http_session(self):
+        """
+        returns the requests.Session used for this chassis, creating it on first use
+        """
+        if self._http is None:
+            self._http = requests.Session()
+        return self._http
+
     def get_ixos_uri(self):
         return 'https://%s/chassis/api/v2/ixos' % self.chassis_ip
 
@@ -89,33 +120,57 @@ class IxRestSession(object):
         )
         self.api_key = response.data['apiKey']
 
-    def http_request(self, method, uri, payload=None, params=None):
+    @staticmethod
+    def decode_response(response):
+        """
+        parses the JSON body once, straight from the raw bytes, and stores it in response.data
+        """
+        data = None
+        try:
+            data = _json_loads(response.content) if response.content else None
+        except ValueError:
+            print('Invalid/Non-JSON payload received: %s' % response.content.decode(errors='replace'))
+            data = None
+        response.data = data
+        return data
+
+    def http_request(self, method, uri, payload=None, params=None, decode=True, priority=PRIORITY_NORMAL,
+                     reauthenticate=True, wait=True):
         """
         wrapper over requests.requests to pretty-print debug info
         and invoke async operation polling depending on HTTP status code (e.g. 202)
+        decode=False leaves response.data as None so the caller can inspect
+        response.content first and call decode_response() only if needed
+        priority decides the order in which requests queued by the chassis rate limiter are sent
+        reauthenticate: on a 401 with an API key given to the constructor (e.g. one
+        reused after a restart), log in again with username/password and retry once
+        wait=False returns a 202 response as is, with the async operation in response.data,
+        instead of polling it to completion
         """
         try:
             # lines with 'debug_string' can be removed without affecting the code
             if not uri.startswith('http'):
                 uri = self.get_ixos_uri() + uri
 
-            if payload is not None:
-                payload = json.dumps(payload, indent=2, sort_keys=True)
+            body = json.dumps(payload, indent=2, sort_keys=True) if payload is not None else None
 
             headers = self.get_headers()
-            response = requests.request(
-                method, uri, data=payload, params=params,
+            self.rate_limiter.acquire(self.chassis_ip, priority)
+            response = self.get_http_session().request(
+                method, uri, data=body, params=params,
                 headers=headers, verify=False, timeout=10
             )
 
+            if (response.status_code == 401 and reauthenticate and self.username and self.password is not None
+                    and uri[-len(self._authUri):] != self._authUri):
+                self.authenticate(username=self.username, password=self.password)
+                return self.http_request(method, uri, payload, params, decode, priority,
+                                         reauthenticate=False, wait=wait)
+
             # debug_string = 'Response => Status %d\n' % response.status_code
             data = None
-            try:
-                data = response.content.decode()
-                data = json.loads(data) if data else None
-            except:
-                print('Invalid/Non-JSON payload received: %s' % data)
-                data = None
+            if decode or response.status_code == 202 or str(response.status_code)[0] == '4':
+                data = self.decode_response(response)
 
             if str(response.status_code)[0] == '4':
                 raise IxRestException("{code} {reason}: {data}.{extraInfo}".format(
@@ -129,7 +184,7 @@ class IxRestSession(object):
                 )
                 )
 
-            if response.status_code == 202:
+            if response.status_code == 202 and wait:
                 result_url = self.wait_for_async_operation(data)
                 return result_url
             else:
@@ -172,24 +227,97 @@ class IxRestSession(object):
     def get_chassis(self, params=None):
         return self.http_request('GET', self.get_ixos_uri() + '/chassis', params=params)
     
-    def get_sensors(self, params=None):
-        return self.http_request('GET', self.get_ixos_uri() + '/sensors', params=params)
+    def get_sensors(self, params=None, decode=True):
+        return self.http_request('GET', self.get_ixos_uri() + '/sensors', params=params, decode=decode,
+                                 priority=PRIORITY_LOW)
 
-    def get_cards(self, params=None):
-        return self.http_request('GET', self.get_ixos_uri() + '/cards', params=params)
+    def get_cards(self, params=None, priority=PRIORITY_NORMAL):
+        return self.http_request('GET', self.get_ixos_uri() + '/cards', params=params, priority=priority)
 
-    def get_ports(self, params=None):
-        return self.http_request('GET', self.get_ixos_uri() + '/ports', params=params)
+    def get_ports(self, params=None, decode=True, priority=PRIORITY_HIGH):
+        return self.http_request('GET', self.get_ixos_uri() + '/ports', params=params, decode=decode,
+                                 priority=priority)
+
+    def iter_ports(self, params=None):
+        """
+        yields the ports one by one while the /ports response is still downloading,
+        so very large port lists are never held as one string plus one decoded list.
+        needs ijson, otherwise falls back to a single parse of the whole body
+        a 401 is retried once after logging in again, as in http_request
+        """
+        reauthenticate = True
+        while True:
+            self.rate_limiter.acquire(self.chassis_ip, PRIORITY_HIGH)
+            response = self.get_http_session().request(
+                'GET', self.get_ixos_uri() + '/ports', params=params,
+                headers=self.get_headers(), verify=False, timeout=10, stream=True
+            )
+            if not (response.status_code == 401 and reauthenticate and self.username
+                    and self.password is not None):
+                break
+            response.close()
+            self.authenticate(username=self.username, password=self.password)
+            reauthenticate = False
+        try:
+            if str(response.status_code)[0] == '4':
+                raise IxRestException("{code} {reason}: {data}.".format(
+                    code=response.status_code, reason=response.reason,
+                    data=self.decode_response(response)))
+            if ijson is None:
+                for port in self.decode_response(response) or []:
+                    yield port
+            else:
+                response.raw.decode_content = True
+                for port in ijson.items(response.raw, 'item', use_float=True):
+                    yield port
+        finally:
+            response.close()
 
     def get_services(self, params=None):
         return self.http_request('GET', self.get_ixos_uri() + '/services', params=params)
     
     def get_perfcounters(self, params=None):
-        return self.http_request('GET', self.get_ixos_uri() + '/perfcounters', params=params)
+        return self.http_request('GET', self.get_ixos_uri() + '/perfcounters', params=params,
+                                 priority=PRIORITY_LOW)
     
     def get_portstats(self, params=None):
         return self.http_request('GET', self.get_ixos_uri() + '/portstats', params=params)
 
+    def start_operation(self, resource_type, resource_id, operation, priority=PRIORITY_NORMAL):
+        """
+        starts an operation such as /ports/<id>/operations/releaseownership without
+        waiting for it, returns the response; on a 202 response.data holds the
+        async operation ('state', 'url') to follow with get_operation_status
+        """
+        return self.http_request(
+            'POST',
+            self.get_ixos_uri() + '/%s/%d/operations/%s' % (resource_type, resource_id, operation),
+            priority=priority, wait=False
+        )
+
+    def get_operation_status(self, operation_url, priority=PRIORITY_NORMAL):
+        """
+        returns the current body of an async operation started with start_operation
+        """
+        return self.http_request('GET', operation_url, priority=priority).data
+
+    def bulk_operation(self, operation, resources, per_chassis_limit=8, timeout=300, poll_interval=1,
+                       poll_budget=10):
+        """
+        starts operation (e.g. 'releaseownership') on many ports/cards of this chassis
+        concurrently and returns the running BulkOperation; wait() on it for the report.
+        resources are REST ids or "card/port" strings, see IxOSBulkOperations
+        """
+        try:
+            from .IxOSBulkOperations import BulkOperation
+        except ImportError:
+            from IxOSBulkOperations import BulkOperation
+        return BulkOperation(
+            lambda chassis: self, operation, [(self.chassis_ip, resource) for resource in resources],
+            per_chassis_limit=per_chassis_limit, timeout=timeout, poll_interval=poll_interval,
+            poll_budget=poll_budget
+        ).start()
+
     def take_ownership(self, resource_id):
         return self.http_request(
             'POST',
@@ -229,7 +357,7 @@ class IxRestSession(object):
 
             resultUrl = self.http_request('POST', url_for_info_fetch, params=" ")
             if "http" in resultUrl:
-                host_id_info = self.http_request('GET', resultUrl, params=" ").json().get("hostId", "NA")
+                host_id_info = self.http_request('GET', resultUrl, params=" ").data.get("hostId", "NA")
                 hids.append(host_id_info)
         return "::".join(hids)
                 
@@ -286,6 +414,9 @@ if __name__ == '__main__':
     # Card specific operations
     session.hotswap_card(card['id'])
 
+    # Same operation on many ports at once, tracked concurrently
+    report = session.bulk_operation('releaseownership', ['1/1', '1/2', '2/1']).wait()
+
     # Chassis specific operations
     session.get_services()
 ''')
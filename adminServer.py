@@ -0,0 +1,287 @@
+"""
+Admin HTTP endpoint of a poller process
+
+Runs next to the Prometheus endpoint (on its port + ADMIN_PORT_OFFSET) and
+serves diagnostics without restarting the poller:
+
+    GET /debug/threads[?busy=1]
+        Stack of every thread. ThreadPoolExecutor workers are marked idle or
+        busy, busy=1 lists only busy workers and the main thread.
+    GET /debug/profile?seconds=10[&interval=0.01]
+        Sampling profile of all threads for a fixed time, returned as collapsed
+        stacks ("thread;file:function;... count") for flamegraph.pl / speedscope.
+    GET /debug/cprofile[?timeout=120&sort=cumulative&limit=40&format=text|pstats]
+        cProfile of the next complete poll cycle, including the executor
+        worker threads it starts. format=pstats returns the marshalled stats
+        for snakeviz / pstats.
+
+Other modules add their own JSON endpoints with add_route(). recent_server
+is a second instance without the /debug routes, for data that other hosts
+may query (the /recent routes on RECENT_BIND).
+"""
+
+import io
+import re
+import sys
+import json
+import time
+import marshal
+import pstats
+import cProfile
+import threading
+import traceback
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from config import ADMIN_PORT_OFFSET, ADMIN_BIND, RECENT_PORT_OFFSET, RECENT_BIND
+
+# Longest sampling profile a request may ask for, in seconds
+MAX_PROFILE_SECONDS = 120
+
+# "ThreadPoolExecutor-3_7" -> "ThreadPoolExecutor" so stacks of all workers merge
+_THREAD_NUMBER = re.compile(r'[-_]\d+(_\d+)?$')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}"
+
+
+def _executor_worker_state(frame):
+    """'busy' or 'idle' for a ThreadPoolExecutor worker thread, None for other threads"""
+    frames = [f for f, _ in traceback.walk_stack(frame)][::-1]
+    for i, f in enumerate(frames):
+        if f.f_code.co_name == '_worker' and f.f_code.co_filename.endswith('thread.py'):
+            following = frames[i + 1] if i + 1 < len(frames) else None
+            return 'busy' if following is not None and following.f_code.co_name == 'run' else 'idle'
+    return None
+
+
+def sample_stacks(seconds, interval=0.01):
+    """Sample every thread's stack for `seconds` and count the collapsed stacks"""
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = [_frame_label(f) for f, _ in traceback.walk_stack(frame)][::-1]
+            thread = _THREAD_NUMBER.sub('', names.get(ident, str(ident)))
+            stacks[";".join([thread] + labels)] += 1
+        time.sleep(interval)
+    return stacks
+
+
+class _CycleProfile(object):
+    """cProfile of one poll cycle, with one Profile per executor worker thread the cycle starts"""
+
+    # Longest time stop() waits for the cycle's worker threads to finish
+    WORKER_TIMEOUT = 5.0
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.profiles = []
+        self.stats = None
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _profile_new_thread(self, frame, event, arg):
+        # threading.setprofile hook, runs in each new thread before its target.
+        # Only executor workers are profiled, not e.g. the admin server's request threads
+        sys.setprofile(None)
+        thread = threading.current_thread()
+        target = getattr(thread, '_target', None)
+        if target is None or not thread.name.startswith('ThreadPoolExecutor'):
+            return
+        profile = cProfile.Profile()
+        finished = threading.Event()
+        with self._lock:
+            self._workers.append((profile, finished))
+
+        def run_profiled(*args, **kwargs):
+            # A Profile is enabled and disabled by its own thread
+            profile.enable()
+            try:
+                return target(*args, **kwargs)
+            finally:
+                profile.disable()
+                finished.set()
+        thread._target = run_profiled
+
+    def start(self):
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        # Before 3.12 a Profile only sees the thread that enabled it
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_new_thread)
+        profile.enable()
+
+    def stop(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+        stats = pstats.Stats(self.profiles[0])
+        # Merge the workers once they have disabled their own Profile; a worker
+        # still running after WORKER_TIMEOUT is left out and stops when it exits
+        deadline = time.monotonic() + self.WORKER_TIMEOUT
+        with self._lock:
+            workers = list(self._workers)
+        for profile, finished in workers:
+            if finished.wait(max(0.0, deadline - time.monotonic())):
+                self.profiles.append(profile)
+                stats.add(profile)
+        self.stats = stats
+        self.done.set()
+
+
+class AdminServer(object):
+    """
+    Route table and HTTP server of the admin endpoint
+    Routes are functions taking the query parameters as a dict of strings
+    and returning a JSON-serializable object, or (status, content type, body).
+    """
+
+    def __init__(self, debug_routes=True, name="adminHttp"):
+        self.routes = {
+            '/debug/threads': self.threads,
+            '/debug/profile': self.profile,
+            '/debug/cprofile': self.cprofile,
+        } if debug_routes else {}
+        self.name = name
+        self.server = None
+        self.cycle_started = None
+        self._profile_lock = threading.Lock()
+        self._pending_cprofile = None
+        self._running_cprofile = None
+
+    def add_route(self, path, handler):
+        self.routes[path] = handler
+
+    def start(self, metrics_port, host=ADMIN_BIND, offset=ADMIN_PORT_OFFSET):
+        """Serve on metrics_port + offset in a daemon thread, returns the port"""
+        port = metrics_port + offset
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name=self.name, daemon=True).start()
+        return port
+
+    # Poll loop hooks
+
+    def begin_cycle(self):
+        """Called by the poll loop when a cycle starts"""
+        self.cycle_started = time.time()
+        if self._pending_cprofile is not None:
+            self._running_cprofile, self._pending_cprofile = self._pending_cprofile, None
+            self._running_cprofile.start()
+
+    def end_cycle(self):
+        """Called by the poll loop when a cycle is complete"""
+        self.cycle_started = None
+        if self._running_cprofile is not None:
+            self._running_cprofile.stop()
+            self._running_cprofile = None
+
+    # Routes
+
+    def threads(self, params):
+        busy_only = params.get('busy') in ('1', 'true')
+        names = {t.ident: t for t in threading.enumerate()}
+        out = []
+        if self.cycle_started is not None:
+            out.append(f"Current poll cycle running for {time.time() - self.cycle_started:.1f}s\n")
+        for ident, frame in sys._current_frames().items():
+            thread = names.get(ident)
+            name = thread.name if thread else str(ident)
+            state = _executor_worker_state(frame)
+            if busy_only and state != 'busy' and name != 'MainThread':
+                continue
+            header = f'Thread "{name}" ident={ident}{" daemon" if thread and thread.daemon else ""}'
+            if state:
+                header += f" worker={state}"
+            out.append(header + "\n" + "".join(traceback.format_stack(frame)))
+        return 200, "text/plain; charset=utf-8", "\n".join(out)
+
+    def profile(self, params):
+        seconds = min(float(params.get('seconds', 10)), MAX_PROFILE_SECONDS)
+        interval = max(float(params.get('interval', 0.01)), 0.001)
+        if not self._profile_lock.acquire(blocking=False):
+            return 409, "text/plain", "A profile is already running\n"
+        try:
+            stacks = sample_stacks(seconds, interval)
+        finally:
+            self._profile_lock.release()
+        body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return 200, "text/plain; charset=utf-8", body
+
+    def cprofile(self, params):
+        timeout = min(float(params.get('timeout', 120)), 600)
+        if not self._profile_lock.acquire(blocking=False):
+            return 409, "text/plain", "A profile is already running\n"
+        try:
+            request = self._pending_cprofile = _CycleProfile()
+            if not request.done.wait(timeout):
+                if self._pending_cprofile is request:
+                    self._pending_cprofile = None
+                return 504, "text/plain", f"No poll cycle completed within {timeout:.0f}s\n"
+        finally:
+            self._profile_lock.release()
+
+        if params.get('format') == 'pstats':
+            return 200, "application/octet-stream", marshal.dumps(request.stats.stats)
+        out = io.StringIO()
+        request.stats.stream = out
+        request.stats.sort_stats(params.get('sort', 'cumulative')).print_stats(int(params.get('limit', 40)))
+        return 200, "text/plain; charset=utf-8", out.getvalue()
+
+
+def _make_handler(admin):
+
+    class AdminHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            handler = admin.routes.get(url.path)
+            if handler is None:
+                self.send_error(404, f"Routes: {', '.join(sorted(admin.routes))}")
+                return
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                result = handler(params)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            if isinstance(result, tuple):
+                status, content_type, body = result
+            else:
+                status, content_type, body = 200, "application/json", json.dumps(result)
+            if isinstance(body, str):
+                body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AdminHandler
+
+
+# One admin endpoint per poller process
+admin_server = AdminServer()
+
+# /recent routes of the poller, see recentStore; started with start_recent_server()
+recent_server = AdminServer(debug_routes=False, name="recentHttp")
+
+
+def start_recent_server(metrics_port):
+    """Serve the routes added to recent_server on RECENT_BIND, returns the port or None when disabled"""
+    if not RECENT_PORT_OFFSET:
+        return None
+    return recent_server.start(metrics_port, RECENT_BIND, RECENT_PORT_OFFSET)
@@ -0,0 +1,106 @@
+"""
+Streaming anomaly detection for chassis metrics
+
+Every series (e.g. CPU of one chassis, one temperature sensor) gets an
+EwmaDetector that keeps an exponentially weighted mean and variance. An
+update is O(1) and each detector holds a handful of floats, so memory is
+bounded by the number of series regardless of how long the poller runs.
+"""
+
+import math
+
+
+class EwmaDetector(object):
+    """
+    EWMA/EWMV detector for a single series
+    alpha:          weight of the newest sample (0-1)
+    z_threshold:    deviation (in standard deviations) considered anomalous
+    limit:          optional absolute ceiling, e.g. 90 for CPU saturation
+    sustain:        consecutive anomalous samples needed before flagging
+    warmup:         samples to learn the baseline before scoring
+    min_std:        floor of the standard deviation, so a series that was
+                    flat still scores a step
+    min_std_ratio:  floor of the standard deviation relative to |mean|
+    """
+
+    __slots__ = ('alpha', 'z_threshold', 'limit', 'sustain', 'warmup', 'min_std', 'min_std_ratio',
+                 'mean', 'var', 'count', 'streak')
+
+    def __init__(self, alpha=0.2, z_threshold=3.0, limit=None, sustain=3, warmup=5,
+                 min_std=0.5, min_std_ratio=0.02):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.limit = limit
+        self.sustain = sustain
+        self.warmup = warmup
+        self.min_std = min_std
+        self.min_std_ratio = min_std_ratio
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.streak = 0
+
+    def update(self, value):
+        """Feed one sample
+
+        Returns:
+            (score, flag): deviation of the sample from the baseline in
+            standard deviations, and whether the anomaly is sustained
+        """
+        value = float(value)
+        if self.count == 0:
+            self.mean = value
+        self.count += 1
+
+        # Score against the baseline before the sample is folded into it
+        score = 0.0
+        diff = value - self.mean
+        if self.count > self.warmup:
+            std = max(math.sqrt(self.var), self.min_std, self.min_std_ratio * abs(self.mean))
+            score = abs(diff) / std
+            # An outlier moves the baseline by at most z_threshold deviations, so a
+            # level shift stays anomalous for a few samples instead of being absorbed
+            bound = self.z_threshold * std
+            diff = max(-bound, min(bound, diff))
+
+        anomalous = score > self.z_threshold or (self.limit is not None and value >= self.limit)
+        self.streak = self.streak + 1 if anomalous else 0
+
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+
+        return score, self.streak >= self.sustain
+
+
+class DetectorBank(object):
+    """
+    Keeps one EwmaDetector per series key, created on first sample
+    detector_kwargs:    arguments passed to every new EwmaDetector
+    """
+
+    def __init__(self, **detector_kwargs):
+        self.detector_kwargs = detector_kwargs
+        self.detectors = {}
+
+    def update(self, key, value, **overrides):
+        """Feed a sample for the series identified by key, see EwmaDetector.update"""
+        detector = self.detectors.get(key)
+        if detector is None:
+            kwargs = dict(self.detector_kwargs, **overrides)
+            detector = self.detectors[key] = EwmaDetector(**kwargs)
+        return detector.update(value)
+
+    def snapshot(self):
+        """Baselines of every detector as [[key, limit, mean, var, count, streak], ...]"""
+        return [
+            [list(key) if isinstance(key, tuple) else key, d.limit, d.mean, d.var, d.count, d.streak]
+            for key, d in list(self.detectors.items())
+        ]
+
+    def restore(self, snapshot, age=0):
+        """Recreate the detectors of snapshot() so baselines survive a restart"""
+        for key, limit, mean, var, count, streak in snapshot:
+            key = tuple(key) if isinstance(key, list) else key
+            detector = self.detectors[key] = EwmaDetector(**dict(self.detector_kwargs, limit=limit))
+            detector.mean, detector.var, detector.count, detector.streak = mean, var, count, streak
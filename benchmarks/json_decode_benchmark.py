@@ -0,0 +1,122 @@
+"""
+Benchmark: REST response decoding on realistic multi-megabyte /ports and /sensors bodies
+
+Compares, per polling cycle:
+  - the previous path: content.decode() + json.loads(str), and for /sensors a
+    second parse through response.json()
+  - the single-parse path: json.loads straight from bytes
+  - orjson.loads from bytes (if orjson is installed)
+  - incremental ijson decoding of /ports (if ijson is installed)
+
+Usage:
+    python benchmarks/json_decode_benchmark.py [--ports 4096] [--sensors 400] [--chassis 20]
+"""
+
+import io
+import json
+import time
+import argparse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def make_ports_body(ports):
+    """A /ports body shaped like what IxOS returns, about 1 KB per port"""
+    body = []
+    for i in range(ports):
+        card, port = i // 32 + 1, i % 32 + 1
+        body.append({
+            "id": i + 1, "parentId": card, "cardNumber": card, "portNumber": port,
+            "fullyQualifiedPortName": f"{card}/{port}", "portName": f"Port {port}",
+            "owner": "IxNetwork/lab-host-%02d/user%d" % (i % 17, i % 5) if i % 3 else "",
+            "linkState": "UP" if i % 4 else "DOWN", "transmitState": bool(i % 2),
+            "type": "QSFP-DD-400GE", "speed": "400000", "mtu": 9216, "mode": "NORMAL",
+            "transceiverModel": "QDD-400G-SR8", "transceiverManufacturer": "KEYSIGHT",
+            "transceiverSerialNumber": "KS%010d" % i, "transceiverRevision": "A1",
+            "tcpOffloadEnabled": False, "autoNegotiation": True, "ptpEnabled": False,
+            "resourceGroup": "RG-%d" % (i // 8), "resourceMode": "400G",
+            "supportedResourceModes": ["400G", "200G", "100G", "50G"],
+            "lastUpdated": "2025-11-09T22:41:38.123456Z", "description": "x" * 200,
+            "statistics": {"framesSent": i * 1000, "framesReceived": i * 999, "bytesSent": i * 1500000,
+                           "bytesReceived": i * 1499000, "crcErrors": 0, "collisions": 0},
+        })
+    return json.dumps(body).encode()
+
+
+def make_sensors_body(sensors):
+    body = []
+    for i in range(sensors):
+        body.append({
+            "id": i, "parentId": i // 10, "name": f"Sensor {i}", "type": ["CPU", "FAN", "PSU"][i % 3],
+            "unit": ["CELSIUS", "PERCENTAGE", "AMPERAGE"][i % 3], "value": 40.0 + i % 30,
+            "criticalValue": 95, "maxValue": 105, "minValue": 0, "adapterName": "adapter",
+            "sensorSetName": "set", "cpuName": "cpu0",
+        })
+    return json.dumps(body).encode()
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare REST response decode paths")
+    parser.add_argument("--ports", type=int, default=4096, help="Ports per chassis")
+    parser.add_argument("--sensors", type=int, default=400, help="Sensors per chassis")
+    parser.add_argument("--chassis", type=int, default=20, help="Chassis per cycle, used to scale the per-cycle numbers")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ports_body = make_ports_body(args.ports)
+    sensors_body = make_sensors_body(args.sensors)
+    print(f"/ports body:   {len(ports_body) / 1e6:.2f} MB ({args.ports} ports)")
+    print(f"/sensors body: {len(sensors_body) / 1e3:.1f} KB ({args.sensors} sensors)")
+    print(f"Scaled to {args.chassis} chassis per cycle\n")
+
+    paths = {
+        "previous (decode + loads, sensors parsed twice)": lambda: (
+            json.loads(ports_body.decode()),
+            json.loads(sensors_body.decode()), json.loads(sensors_body.decode()),
+        ),
+        "single parse, json.loads(bytes)": lambda: (
+            json.loads(ports_body), json.loads(sensors_body),
+        ),
+    }
+    if orjson is not None:
+        paths["single parse, orjson.loads(bytes)"] = lambda: (
+            orjson.loads(ports_body), orjson.loads(sensors_body),
+        )
+    if ijson is not None:
+        paths["streaming /ports, ijson.items"] = lambda: (
+            list(ijson.items(io.BytesIO(ports_body), "item", use_float=True)), json.loads(sensors_body),
+        )
+
+    baseline = None
+    for name, fn in paths.items():
+        per_chassis = best_of(fn, args.repeat)
+        baseline = baseline or per_chassis
+        print(f"{name:<50} {per_chassis * 1000:8.1f} ms/chassis  "
+              f"{per_chassis * args.chassis:6.2f} s CPU/cycle  "
+              f"saved {(baseline - per_chassis) * args.chassis:6.2f} s/cycle")
+
+    if orjson is None:
+        print("\n(orjson not installed, skipped)")
+    if ijson is None:
+        print("(ijson not installed, skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Micro-benchmark: portUtilization encoding via influxdb_client.Point vs PortLineProtocolEncoder
+
+Encodes a synthetic fleet of ports (no InfluxDB needed) with the previous
+path (one Point per port, old schema with repeated card/port fields and
+chassis totals) and with PortLineProtocolEncoder (lean schema plus one
+chassisUtilization line per chassis), checks they carry the same port states
+and reports the time and line protocol bytes per cycle.
+
+Usage:
+    python benchmarks/line_protocol_benchmark.py [--chassis 50] [--ports 256] [--cycles 20]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import influxdb_client
+from influxDBclient import PortLineProtocolEncoder
+
+
+def make_fleet(chassis_count, ports_per_chassis):
+    """Port details shaped like get_chassis_ports_information output"""
+    owners = ["Free", "IxNetwork/ixia-lab-01/alice", "IxNetwork/ixia-lab-02/bob", "ixtcl/carol"]
+    fleet = []
+    for c in range(chassis_count):
+        for p in range(ports_per_chassis):
+            card = p // 16 + 1
+            fleet.append({
+                "owner": owners[(c + p) % len(owners)],
+                "cardNumber": card,
+                "portNumber": p % 16 + 1,
+                "fullyQualifiedPortName": f"{card}/{p % 16 + 1}" if p % 5 else "N/A",
+                "linkState": "UP" if p % 3 else "DOWN",
+                "transmitState": bool(p % 2),
+                "totalPorts": ports_per_chassis,
+                "ownedPorts": ports_per_chassis * 3 // 4,
+                "freePorts": ports_per_chassis // 4,
+                "chassisIp": f"10.36.{c // 250}.{c % 250}",
+                "collectedAt": 1762728398,
+            })
+    return fleet
+
+
+def encode_with_point(port_detail):
+    """The previous write path: one Point per port with per-value conversions"""
+    chassis_tag = str(port_detail["chassisIp"])
+    card_tag = str(port_detail["cardNumber"])
+    if port_detail["fullyQualifiedPortName"] == "N/A":
+        port_tag = str(port_detail["portNumber"])
+    else:
+        port_tag = str(port_detail["fullyQualifiedPortName"])
+    transmit_state = port_detail["transmitState"]
+    if isinstance(transmit_state, bool):
+        transmit_state_str = "active" if transmit_state else "idle"
+    else:
+        transmit_state_str = str(transmit_state)
+    total_ports = int(port_detail["totalPorts"]) if port_detail["totalPorts"] != "NA" else 0
+    owned_ports = int(port_detail["ownedPorts"]) if port_detail["ownedPorts"] != "NA" else 0
+    free_ports = int(port_detail["freePorts"]) if port_detail["freePorts"] != "NA" else 0
+    return influxdb_client.Point("portUtilization")\
+        .tag("chassis", chassis_tag)\
+        .tag("card", card_tag)\
+        .tag("port", port_tag)\
+        .field("cardNumber", card_tag)\
+        .field("portNumber", port_tag)\
+        .field("owner", str(port_detail["owner"]))\
+        .field("linkState", str(port_detail["linkState"]))\
+        .field("transmitState", transmit_state_str)\
+        .field("totalPorts", total_ports)\
+        .field("ownedPorts", owned_ports)\
+        .field("freePorts", free_ports)\
+        .to_line_protocol()
+
+
+def port_state(line):
+    """Series key plus the owner / linkState / transmitState fields of a portUtilization line"""
+    series, fields = line.split(" ")[:2]
+    return series, tuple(sorted(f for f in fields.split(",") if f.split("=")[0] in ("owner", "linkState", "transmitState")))
+
+
+def time_cycles(fn, cycles):
+    best = float("inf")
+    for _ in range(cycles):
+        start_time = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Point-based and direct line protocol encoding")
+    parser.add_argument("--chassis", type=int, default=50)
+    parser.add_argument("--ports", type=int, default=256, help="Ports per chassis")
+    parser.add_argument("--cycles", type=int, default=20)
+    args = parser.parse_args()
+
+    fleet = make_fleet(args.chassis, args.ports)
+    encoder = PortLineProtocolEncoder()
+
+    # Both paths must describe the same port states
+    for port_detail in fleet[:1000]:
+        assert port_state(encode_with_point(port_detail)) == port_state(encoder.encode(port_detail))
+    encoder.flush()
+
+    def point_cycle():
+        return "\n".join(encode_with_point(p) for p in fleet)
+
+    def encoder_cycle():
+        chassis_seen = set()
+        for p in fleet:
+            encoder.encode(p)
+            if p["chassisIp"] not in chassis_seen:
+                chassis_seen.add(p["chassisIp"])
+                encoder.encode_chassis(p)
+        return encoder.flush()
+
+    point_bytes = len(point_cycle())
+    encoder_bytes = len(encoder_cycle())
+
+    point_time = time_cycles(point_cycle, args.cycles)
+    encoder_time = time_cycles(encoder_cycle, args.cycles)
+
+    print(f"Ports per cycle:          {len(fleet)}")
+    print(f"Point + to_line_protocol: {point_time * 1000:8.1f} ms/cycle  ({point_time / len(fleet) * 1e6:.2f} us/port)")
+    print(f"PortLineProtocolEncoder:  {encoder_time * 1000:8.1f} ms/cycle  ({encoder_time / len(fleet) * 1e6:.2f} us/port)")
+    print(f"Speedup:                  {point_time / encoder_time:8.1f}x")
+    print(f"Payload, old schema:      {point_bytes / 1e6:8.2f} MB/cycle  ({point_bytes / len(fleet):.0f} bytes/port)")
+    print(f"Payload, lean schema:     {encoder_bytes / 1e6:8.2f} MB/cycle  ({encoder_bytes / len(fleet):.0f} bytes/port)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Startup benchmark for the pollers
+
+Measures how long importing each poller module takes (using `python -X importtime`)
+and, optionally, how long the first and second collection cycles take against the
+chassis configured in config.py / .env.
+
+Usage:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --first-cycle
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Poller module -> function that runs one complete collection cycle
+POLLERS = {
+    "portInfoPoller": "get_chassis_port_data",
+    "perfMetricsPoller": "get_chassis_metrics",
+    "sensorsPoller": "get_all_chassis_sensors",
+}
+
+
+def measure_import_time(module_name, top=8):
+    """Import a module in a fresh interpreter and parse the -X importtime report
+
+    Returns:
+        (total cumulative microseconds, list of (cumulative_us, package) slowest imports)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    entries = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        cumulative_us = int(fields[1])
+        package_name = fields[2][1:].rstrip()
+        entries.append((cumulative_us, package_name))
+        if package_name == module_name:
+            total_us = cumulative_us
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Only report the module's direct imports, deeper ones are included in their parent
+    direct = [(us, name.strip()) for us, name in entries
+              if name.startswith("  ") and not name.startswith("   ")]
+    direct.sort(reverse=True)
+    return total_us, direct[:top]
+
+
+def measure_cycles(module_name):
+    """Run two collection cycles in-process and time each of them"""
+    sys.path.insert(0, REPO_ROOT)
+    module = __import__(module_name)
+    collect = getattr(module, POLLERS[module_name])
+
+    timings = []
+    for _ in range(2):
+        start_time = time.perf_counter()
+        collect()
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure poller import time and cold start")
+    parser.add_argument("--first-cycle", action="store_true",
+                        help="Also time the first (cold) and second (warm) collection cycle against the configured chassis")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("IMPORT TIME (python -X importtime)")
+    print("=" * 80)
+    for module_name in POLLERS:
+        try:
+            total_us, slowest = measure_import_time(module_name)
+        except RuntimeError as e:
+            print(f"✗ {module_name}: import failed ({e})")
+            continue
+        print(f"\n{module_name}: {total_us / 1000:.1f} ms")
+        for cumulative_us, package_name in slowest:
+            print(f"   {cumulative_us / 1000:8.1f} ms  {package_name}")
+
+    if args.first_cycle:
+        print("\n" + "=" * 80)
+        print("COLLECTION CYCLES (cold start -> first completed cycle)")
+        print("=" * 80)
+        for module_name in POLLERS:
+            cold, warm = measure_cycles(module_name)
+            print(f"{module_name:<20} first cycle: {cold:.2f}s   second cycle: {warm:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Run one port or card operation on many ports across the chassis fleet
+
+Releasing the ports of a finished test run, rebooting a set of ports or
+resetting them to factory defaults one port at a time means one blocking
+request and async-operation wait per port. This command selects the ports
+on every chassis in CHASSIS_LIST (or the ones given), starts the operation
+on all of them concurrently, at most BULK_OPERATIONS_PER_CHASSIS per chassis
+at a time, and tracks the async operations together until each one has
+finished, failed or timed out.
+
+Usage:
+    # Release every port owned by a user matching a regex, see the selection first
+    python bulkPortOperations.py releaseownership --owner '^jenkins' --dry-run
+    python bulkPortOperations.py releaseownership --owner '^jenkins'
+
+    # Reboot ports 1/1 and 1/2 on two chassis, print the per-port report as JSON
+    python bulkPortOperations.py reboot --chassis 10.36.236.121 10.36.236.122 --ports 1/1 1/2 --json
+
+    # Hotswap cards 3 and 4
+    python bulkPortOperations.py hotswap --chassis 10.36.236.121 --cards 3 4
+
+Exits with 1 if any operation did not succeed.
+"""
+
+import re
+import sys
+import json
+import argparse
+
+from RestApi.IxOSBulkOperations import BulkOperation, OPERATIONS, SUCCESS
+from RestApi.IxOSRateLimiter import PRIORITY_LOW
+from chassisSessions import get_session
+from config import CHASSIS_LIST, BULK_OPERATIONS_PER_CHASSIS, BULK_OPERATION_TIMEOUT, BULK_POLL_BUDGET
+
+
+def select_targets(chassis_list, args):
+    """(chassis IP, resource) pairs for the operation, and display names of REST ids
+
+    Ports given by --owner are looked up on each chassis and returned by REST id,
+    --ports / --cards are passed on as numbers and resolved by BulkOperation.
+    """
+    if args.cards:
+        return [(chassis['ip'], (card,)) for chassis in chassis_list for card in args.cards], {}
+    if args.ports:
+        return [(chassis['ip'], port) for chassis in chassis_list for port in args.ports], {}
+
+    owner = re.compile(args.owner)
+    targets = []
+    names = {}
+    for chassis in chassis_list:
+        try:
+            ports = get_session(chassis).get_ports(priority=PRIORITY_LOW).data or []
+        except Exception as e:
+            print(f"✗ Could not list ports of {chassis['ip']}: {e}")
+            continue
+        for port in ports:
+            if port.get('owner') and owner.search(port['owner']):
+                targets.append((chassis['ip'], port['id']))
+                names[(chassis['ip'], port['id'])] = f"{port.get('cardNumber')}/{port.get('portNumber')}"
+                if args.dry_run:
+                    print(f"  {chassis['ip']} {names[(chassis['ip'], port['id'])]} owner={port['owner']}")
+    return targets, names
+
+
+def print_report(report, names):
+    for result in report['results']:
+        mark = "✓" if result['status'] == SUCCESS else "✗"
+        message = f" - {result['message']}" if result['message'] and result['status'] != SUCCESS else ""
+        print(f"{mark} {result['chassis']} {names.get((result['chassis'], result['target']), result['target'])} "
+              f"{result['status']} ({result['seconds']}s){message}")
+    print("=" * 70)
+    print(f"{report['operation']}: {report['succeeded']}/{report['total']} succeeded in {report['seconds']}s "
+          f"{report['counts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one port/card operation on many ports across chassis")
+    parser.add_argument("operation", choices=sorted(OPERATIONS))
+    parser.add_argument("--chassis", nargs="+", help="Chassis IPs from CHASSIS_LIST (default: all)")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--owner", help="Regex matched against the port owner")
+    selection.add_argument("--ports", nargs="+", help="Ports as card/port, e.g. 1/1 2/4")
+    selection.add_argument("--cards", nargs="+", help="Card numbers (hotswap)")
+    parser.add_argument("--per-chassis", type=int, default=BULK_OPERATIONS_PER_CHASSIS)
+    parser.add_argument("--timeout", type=int, default=BULK_OPERATION_TIMEOUT)
+    parser.add_argument("--poll-budget", type=int, default=BULK_POLL_BUDGET,
+                        help="Status requests per chassis in one polling pass")
+    parser.add_argument("--dry-run", action="store_true", help="List the selected ports only")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if (OPERATIONS[args.operation][0] == 'cards') != bool(args.cards):
+        parser.error(f"{args.operation} needs {'--cards' if OPERATIONS[args.operation][0] == 'cards' else '--owner or --ports'}")
+
+    chassis_list = [c for c in CHASSIS_LIST if not args.chassis or c['ip'] in args.chassis]
+    unknown = set(args.chassis or ()) - {c['ip'] for c in chassis_list}
+    if unknown:
+        parser.error(f"not in CHASSIS_LIST: {', '.join(sorted(unknown))}")
+    by_ip = {c['ip']: c for c in chassis_list}
+
+    targets, names = select_targets(chassis_list, args)
+    print(f"{args.operation}: {len(targets)} target(s) on {len({ip for ip, _ in targets})} chassis")
+    if args.dry_run or not targets:
+        return 0
+
+    bulk = BulkOperation(lambda ip: get_session(by_ip[ip]), args.operation, targets,
+                         per_chassis_limit=args.per_chassis, timeout=args.timeout, poll_budget=args.poll_budget)
+    report = bulk.wait()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, names)
+    return 0 if report['succeeded'] == report['total'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
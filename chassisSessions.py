@@ -0,0 +1,82 @@
+"""
+Shared IxRestSession cache for the pollers
+
+Logging in to a chassis costs a full REST round trip, so each poller keeps
+one authenticated session per chassis and reuses it on every cycle instead
+of logging in again. A session is dropped when a request through it fails,
+which makes the next cycle log in afresh.
+
+The API keys can be exported to a checkpoint and restored after a restart,
+so a restarted poller reuses them instead of logging in to every chassis.
+
+All sessions go through the REST package's default per-chassis rate
+limiter, whose budget is shared with the other pollers on the host.
+"""
+
+import time
+import threading
+
+from RestApi.IxOSRestInterface import IxRestSession
+from config import CHECKPOINT_API_KEY_MAX_AGE
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# When each chassis' API key was obtained, and keys restored from a checkpoint
+_key_obtained = {}
+_restored_keys = {}
+
+
+def get_session(chassis, verbose=False):
+    """Return the cached session for a chassis, logging in on first use
+
+    Args:
+        chassis: Dictionary with 'ip', 'username', 'password'
+
+    Returns:
+        Authenticated IxRestSession for this chassis
+    """
+    session = _sessions.get(chassis['ip'])
+    if session is None:
+        # A restored key skips the login, an expired one is renewed on its first 401
+        api_key, obtained = _restored_keys.pop(chassis['ip'], (None, None))
+        session = IxRestSession(
+            chassis['ip'],
+            chassis['username'],
+            chassis['password'],
+            api_key=api_key,
+            verbose=verbose)
+        with _sessions_lock:
+            _sessions[chassis['ip']] = session
+            _key_obtained[chassis['ip']] = (session.api_key, obtained or time.time())
+    return session
+
+
+def invalidate_session(chassis_ip):
+    """Forget the cached session for a chassis so the next poll logs in again"""
+    with _sessions_lock:
+        _sessions.pop(chassis_ip, None)
+        _key_obtained.pop(chassis_ip, None)
+
+
+def export_api_keys():
+    """API keys of the cached sessions as {chassis IP: [api key, time obtained]}"""
+    with _sessions_lock:
+        keys = {}
+        for chassis_ip, session in _sessions.items():
+            api_key, obtained = _key_obtained.get(chassis_ip, (None, time.time()))
+            # a key renewed after a 401 counts from the renewal
+            if session.api_key != api_key:
+                obtained = time.time()
+                _key_obtained[chassis_ip] = (session.api_key, obtained)
+            keys[chassis_ip] = [session.api_key, obtained]
+        return keys
+
+
+def restore_api_keys(keys, age=0):
+    """Reuse checkpointed API keys younger than CHECKPOINT_API_KEY_MAX_AGE for the next logins"""
+    now = time.time()
+    with _sessions_lock:
+        for chassis_ip, (api_key, obtained) in keys.items():
+            if api_key and now - obtained < CHECKPOINT_API_KEY_MAX_AGE:
+                _restored_keys[chassis_ip] = (api_key, obtained)
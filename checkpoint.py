@@ -0,0 +1,286 @@
+"""
+Warm-restart checkpoints for the pollers
+
+Each poller registers the pieces of working state that are expensive to
+rebuild (chassis API keys, previous port snapshots, counter values,
+detector baselines, gauge values, poll counters) with a Checkpoint. The
+Checkpoint writes them to one gzip-compressed JSON file in CHECKPOINT_DIR
+periodically and on SIGTERM, and hands them back to the registered restore
+functions on startup. A restarted poller therefore reuses its API keys
+instead of logging in to every chassis, and change detection and rate
+conversion continue from the state before the restart.
+
+The file is replaced atomically (written next to it, then renamed), so a
+crash while saving leaves the previous checkpoint intact. It holds chassis
+API keys and is only readable by the poller's user (mode 0600).
+
+With COLLECTION_MODE=process the sessions and per-chassis caches live in the
+collection worker processes. A WorkerState hands each new worker its part
+of the restored state, and the workers send their state back with a cycle's
+results once per checkpoint interval, so the main process saves what the
+workers currently hold.
+"""
+
+import os
+import gzip
+import json
+import time
+import signal
+import functools
+
+from config import CHECKPOINT_DIR, CHECKPOINT_INTERVAL, CHECKPOINT_MAX_AGE, COLLECTION_MODE
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint(object):
+    """
+    State of one poller, saved to <directory>/<name>.json.gz
+    name:       poller name, used as the file name
+    directory:  checkpoint directory, empty disables checkpointing
+    interval:   seconds between periodic saves
+    max_age:    checkpoints older than this are ignored on startup
+    """
+
+    def __init__(self, name, directory=CHECKPOINT_DIR, interval=CHECKPOINT_INTERVAL, max_age=CHECKPOINT_MAX_AGE):
+        self.path = os.path.join(directory, f"{name}.json.gz") if directory else None
+        self.interval = interval
+        self.max_age = max_age
+        self.last_saved = time.time()
+        self._providers = {}
+
+    def register(self, key, save, restore):
+        """Add a piece of state
+
+        save:       returns a JSON-serializable snapshot, None leaves the key out
+        restore:    called with (snapshot, seconds since it was saved) on startup
+        """
+        self._providers[key] = (save, restore)
+
+    def restore(self):
+        """Restore every registered piece of state from the checkpoint file
+
+        Returns:
+            True if a checkpoint was restored
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+
+        age = time.time() - checkpoint.get("saved_at", 0)
+        if checkpoint.get("version") != CHECKPOINT_VERSION or age > self.max_age:
+            print(f"⚠️  Ignoring checkpoint {self.path} (saved {age:.0f}s ago)")
+            return False
+
+        for key, (_, restore) in self._providers.items():
+            if key in checkpoint["state"]:
+                try:
+                    restore(checkpoint["state"][key], age)
+                except Exception as e:
+                    print(f"⚠️  Could not restore {key} from checkpoint: {e}")
+        print(f"✓ Restored {', '.join(k for k in self._providers if k in checkpoint['state'])} "
+              f"from checkpoint saved {age:.0f}s ago")
+        return True
+
+    def save(self):
+        """Write every registered piece of state to the checkpoint file"""
+        if not self.path:
+            return
+        state = {}
+        for key, (save, _) in self._providers.items():
+            try:
+                snapshot = save()
+            except Exception as e:
+                print(f"⚠️  Could not checkpoint {key}: {e}")
+                continue
+            if snapshot is not None:
+                state[key] = snapshot
+        checkpoint = {"version": CHECKPOINT_VERSION, "saved_at": time.time(), "state": state}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(checkpoint, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+            self.last_saved = checkpoint["saved_at"]
+        except OSError as e:
+            print(f"✗ Error writing checkpoint {self.path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def maybe_save(self):
+        """Save if the checkpoint interval has passed since the last save"""
+        if time.time() - self.last_saved >= self.interval:
+            self.save()
+
+    def save_on_sigterm(self):
+        """Save once more and exit when the poller is stopped with SIGTERM (pkill, docker stop)"""
+        owner = os.getpid()
+
+        def handle_sigterm(signum, frame):
+            # Collection workers reset SIGTERM, this covers any child forked before it does
+            if os.getpid() != owner:
+                raise SystemExit(0)
+            self.save()
+            print(f"\nCheckpoint saved to {self.path}, exiting on SIGTERM.")
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+def chassis_subset(snapshot, chassis_ips):
+    """Part of a per-chassis snapshot for some chassis
+
+    Dictionaries are keyed by chassis IP, list entries start with a key whose
+    first element is the chassis IP (ResponseFingerprintCache.snapshot()).
+    """
+    if isinstance(snapshot, dict):
+        return {ip: value for ip, value in snapshot.items() if ip in chassis_ips}
+    return [entry for entry in snapshot if entry[0][0] in chassis_ips]
+
+
+def merge_partitions(snapshots):
+    """Combine the per-chassis snapshots of disjoint partitions"""
+    if snapshots and isinstance(snapshots[0], dict):
+        merged = {}
+        for snapshot in snapshots:
+            merged.update(snapshot)
+        return merged
+    return [entry for snapshot in snapshots for entry in snapshot]
+
+
+class WorkerState(object):
+    """
+    Per-chassis state owned by the collection workers in COLLECTION_MODE=process
+    providers:  {key: (save, restore)} as for Checkpoint.register, run inside
+                the worker processes in process mode
+    interval:   seconds between two reports of a worker's state
+
+    In thread mode the providers are registered with the Checkpoint as usual.
+    In process mode the main process never holds this state: it passes the
+    restored snapshot to every worker the pool starts (initargs, init_worker),
+    the partition functions return report() with their results, and update()
+    keeps the latest report of every partition for the next save.
+    """
+
+    def __init__(self, providers, interval=CHECKPOINT_INTERVAL):
+        self.providers = providers
+        self.interval = interval
+        self.enabled = bool(CHECKPOINT_DIR)
+        # main process: restored snapshot and the partitions' reports
+        self._restored = {}
+        self._restored_at = time.time()
+        self._reports = {}
+        # worker process: its chassis and when it last reported
+        self._partition = ()
+        self._last_report = None
+
+    def register(self, checkpoint):
+        """Register the providers with the poller's Checkpoint"""
+        for key, (save, restore) in self.providers.items():
+            if COLLECTION_MODE == 'process':
+                checkpoint.register(key, functools.partial(self._merged, key), functools.partial(self._keep, key))
+            else:
+                checkpoint.register(key, save, restore)
+
+    def _keep(self, key, snapshot, age):
+        self._restored[key] = snapshot
+        self._restored_at = time.time() - age
+
+    def _merged(self, key):
+        # Nothing is saved for the workers until they have reported, rather than the old snapshot
+        reports = [state[key] for _, state in self._reports.values() if key in state]
+        return merge_partitions(reports) if reports else None
+
+    def initargs(self):
+        """(snapshot, age) a new worker starts from: the workers' last reports, else the restored checkpoint"""
+        if not self._reports:
+            return self._restored, time.time() - self._restored_at
+        oldest = min(reported_at for reported_at, _ in self._reports.values())
+        return {key: self._merged(key) for key in self.providers}, time.time() - oldest
+
+    def update(self, reports):
+        """Keep the state reported with a cycle's partition results (None when not due)"""
+        for report in reports:
+            if report is not None:
+                partition, state = report
+                self._reports[tuple(partition)] = (time.time(), state)
+
+    def init_worker(self, partition, snapshot, age):
+        """In a new worker process: restore the partition's part of the snapshot"""
+        chassis_ips = {chassis['ip'] for chassis in partition}
+        self._partition = sorted(chassis_ips)
+        for key, (_, restore) in self.providers.items():
+            if snapshot.get(key) is not None:
+                try:
+                    restore(chassis_subset(snapshot[key], chassis_ips), age)
+                except Exception as e:
+                    print(f"⚠️  Could not restore {key} in the collection worker: {e}")
+
+    def report(self):
+        """In a worker process: (partition, state) once per interval, else None"""
+        now = time.monotonic()
+        if not self.enabled or (self._last_report is not None and now - self._last_report < self.interval):
+            return None
+        self._last_report = now
+        state = {}
+        for key, (save, _) in self.providers.items():
+            try:
+                state[key] = save()
+            except Exception as e:
+                print(f"⚠️  Could not report {key} from the collection worker: {e}")
+        return self._partition, state
+
+
+class PollSchedule(object):
+    """
+    Poll counter and cycle start time of a poller
+    Restored from a checkpoint, the first cycle after a restart waits for the
+    slot the old process would have used, so the sampling cadence is kept.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.poll_count = 0
+        self.last_started = None
+
+    def start_cycle(self):
+        """Record the start of a cycle and return its poll number"""
+        self.poll_count += 1
+        self.last_started = time.time()
+        return self.poll_count
+
+    def initial_delay(self):
+        """Seconds until the next cycle was due before the restart, 0 if overdue"""
+        if self.last_started is None:
+            return 0
+        return max(0.0, min(self.interval, self.last_started + self.interval - time.time()))
+
+    def snapshot(self):
+        return {"poll_count": self.poll_count, "last_started": self.last_started}
+
+    def restore(self, snapshot, age):
+        self.poll_count = snapshot["poll_count"]
+        self.last_started = snapshot["last_started"]
+
+
+def snapshot_gauges(*gauges):
+    """Current samples of prometheus Gauges as {metric name: [[labels, value], ...]}"""
+    return {
+        metric.name: [[sample.labels, sample.value] for sample in metric.samples]
+        for gauge in gauges for metric in gauge.collect()
+    }
+
+
+def restore_gauges(gauges, snapshot):
+    """Set Gauges back to the values of snapshot_gauges()"""
+    for gauge in gauges:
+        for metric in gauge.collect():
+            for labels, value in snapshot.get(metric.name, ()):
+                (gauge.labels(**labels) if labels else gauge).set(value)
@@ -0,0 +1,107 @@
+"""
+Multiprocess collection mode for large fleets
+
+In the default thread mode all JSON decoding and filtering runs under one
+GIL. In process mode the chassis list is split into partitions and every
+partition is pinned to its own single-worker process, so each worker keeps
+its own chassis sessions (and any per-chassis state) across cycles. Workers
+only send back compact results, which the poller's main process writes.
+
+Workers are started through a forkserver: by the first cycle the poller's
+HTTP servers and writer threads are running, and forking that process could
+copy a lock held by one of them and the listening sockets into the worker.
+Worker functions and initializers therefore have to be module-level
+functions; the worker imports the poller module to find them.
+"""
+
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Windows has no forkserver, spawn is as safe there
+_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def partition_chassis(chassis_list, partitions):
+    """Split the chassis list round-robin into at most `partitions` non-empty lists"""
+    partitions = max(1, min(partitions, len(chassis_list)))
+    return [chassis_list[i::partitions] for i in range(partitions)]
+
+
+def _init_worker(initializer, partition, *args):
+    """Drop the SIGTERM handler inherited from the poller, only the main process saves a checkpoint"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if initializer is not None:
+        initializer(partition, *args)
+
+
+class CollectionPool(object):
+    """
+    Worker processes with a fixed chassis partition each
+    chassis_list:   chassis dictionaries from config.CHASSIS_LIST
+    workers:        number of worker processes
+    initializer:    module-level function called as initializer(partition, *initargs())
+                    in every new worker process
+    initargs:       returns the further initializer arguments when a worker starts,
+                    so a replaced worker starts from the current state
+    """
+
+    def __init__(self, chassis_list, workers, initializer=None, initargs=tuple):
+        self.partitions = partition_chassis(chassis_list, workers)
+        self.initializer = initializer
+        self.initargs = initargs
+        # One single-process executor per partition keeps a partition on the same process
+        self.executors = [self._start_worker(partition) for partition in self.partitions]
+
+    def _start_worker(self, partition):
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(_START_METHOD),
+                                   initializer=_init_worker,
+                                   initargs=(self.initializer, partition) + tuple(self.initargs()))
+
+    def map(self, fn):
+        """Run fn(partition) in every worker process
+
+        Returns:
+            List of results, one per partition that completed without error
+        """
+        futures = []
+        for i, partition in enumerate(self.partitions):
+            try:
+                futures.append(self.executors[i].submit(fn, partition))
+            except BrokenProcessPool:
+                self._replace_worker(i)
+                futures.append(self.executors[i].submit(fn, partition))
+        results = []
+        for i, (future, partition) in enumerate(zip(futures, self.partitions)):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                # The worker died (killed, OOM); its partition is collected by a new one next cycle
+                print(f"✗ Worker for {[c['ip'] for c in partition]} died: {e}, restarting it")
+                self._replace_worker(i)
+            except Exception as e:
+                print(f"✗ Worker for {[c['ip'] for c in partition]} failed: {e}")
+        return results
+
+    def _replace_worker(self, i):
+        self.executors[i].shutdown(wait=False)
+        self.executors[i] = self._start_worker(self.partitions[i])
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+
+
+def get_collection_pool(chassis_list, workers, initializer=None, initargs=tuple):
+    """Return this process' CollectionPool, starting the workers on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CollectionPool(chassis_list, workers, initializer, initargs)
+    return _pool
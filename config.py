@@ -16,13 +16,14 @@ dotenv.load_dotenv()
 # =============================================================================
 
 # Try to load chassis list from environment variable first (Docker mode)
+# Parse errors are reported by validate_config() rather than printed at import
 _chassis_env = os.getenv('CHASSIS_LIST', '')
+_chassis_env_error = None
 if _chassis_env:
     try:
         CHASSIS_LIST = json.loads(_chassis_env)
     except json.JSONDecodeError as e:
-        print(f"⚠️  Warning: Invalid CHASSIS_LIST JSON in environment variable: {e}")
-        print(f"   Using default configuration from code.")
+        _chassis_env_error = e
         CHASSIS_LIST = []
 else:
     # Default configuration (used when not running in Docker)
@@ -46,6 +47,199 @@ else:
 # Polling interval in seconds (how often to query chassis)
 POLLING_INTERVAL = int(os.getenv('POLLING_INTERVAL', '10'))
 POLLING_INTERVAL_PERF_METRICS = int(os.getenv('POLLING_INTERVAL_PERF_METRICS', '60'))
+POLLING_INTERVAL_PORT_STATS = int(os.getenv('POLLING_INTERVAL_PORT_STATS', '10'))
+
+# Monotonic /portstats counters converted to per-second rates by portStatsPoller
+PORT_STATS_COUNTERS = [
+    c.strip() for c in os.getenv('PORT_STATS_COUNTERS', 'framesSent,framesReceived,bytesSent,bytesReceived').split(',')
+    if c.strip()
+]
+
+# PORT_STATS_COUNTERS that are 32 bits wide on the chassis; only these are read as
+# wrapping at 2^32, a decrease of any other counter is a reset
+PORT_STATS_32BIT_COUNTERS = [
+    c.strip() for c in os.getenv('PORT_STATS_32BIT_COUNTERS', '').split(',') if c.strip()
+]
+
+# Collection mode: 'thread' polls every chassis from threads in one process,
+# 'process' splits the chassis across worker processes so JSON decoding and
+# transformation use all cores (recommended for hundreds of chassis)
+COLLECTION_MODE = os.getenv('COLLECTION_MODE', 'thread').lower()
+
+# Number of worker processes in 'process' mode
+COLLECTION_PROCESSES = int(os.getenv('COLLECTION_PROCESSES', str(os.cpu_count() or 1)))
+
+# Decode /ports incrementally while it downloads (needs the optional ijson
+# package) instead of parsing the whole body at once. Useful for very large chassis.
+PORTS_STREAMING_DECODE = os.getenv('PORTS_STREAMING_DECODE', 'false').lower() in ('1', 'true', 'yes')
+
+# Skip decoding /ports when its raw body is byte-identical to the previous
+# cycle and write a small portPollHeartbeat point instead of every port
+FINGERPRINT_UNCHANGED = os.getenv('FINGERPRINT_UNCHANGED', 'true').lower() in ('1', 'true', 'yes')
+
+# Seconds after which unchanged ports are written in full again anyway, so
+# dashboards with a bounded time range always have recent points
+FINGERPRINT_MAX_AGE = int(os.getenv('FINGERPRINT_MAX_AGE', '300'))
+
+# Prometheus metrics port of portInfoPoller (perfMetricsPoller uses 9001, sensorsPoller 9002)
+PORT_INFO_METRICS_PORT = int(os.getenv('PORT_INFO_METRICS_PORT', '9003'))
+
+# Port owner / linkState / transmitState transitions detected by portInfoPoller:
+# appended to this JSONL file (empty disables it) and served over HTTP on this
+# port as long-poll /events and Server-Sent Events /events/stream (0 disables it)
+PORT_EVENTS_FILE = os.getenv('PORT_EVENTS_FILE', 'portEvents.jsonl')
+PORT_EVENTS_PORT = int(os.getenv('PORT_EVENTS_PORT', '9005'))
+
+# Interface the port events endpoint listens on (no auth: loopback unless other
+# hosts need it, e.g. 0.0.0.0)
+PORT_EVENTS_BIND = os.getenv('PORT_EVENTS_BIND', '127.0.0.1')
+
+# Prometheus metrics port of portStatsPoller
+PORT_STATS_METRICS_PORT = int(os.getenv('PORT_STATS_METRICS_PORT', '9004'))
+
+# =============================================================================
+# CHASSIS REQUEST RATE LIMITING
+# =============================================================================
+
+# Requests per second all processes on this host together may send to one
+# chassis (0 = unlimited) and how many may go back to back. A chassis can
+# override both with optional "rate_limit" / "rate_burst" keys in its
+# CHASSIS_LIST entry.
+CHASSIS_RATE_LIMIT = float(os.getenv('CHASSIS_RATE_LIMIT', '5'))
+CHASSIS_RATE_BURST = float(os.getenv('CHASSIS_RATE_BURST', '10'))
+
+# Directory of the shared per-chassis limiter state (empty = <tmp>/ixos-rate-limit).
+# Processes share a budget when they use the same directory.
+CHASSIS_RATE_LIMIT_DIR = os.getenv('CHASSIS_RATE_LIMIT_DIR', '')
+
+# Hand the budgets to the REST package's default limiter used by every session
+from RestApi.IxOSRateLimiter import default_rate_limiter
+
+default_rate_limiter.configure(
+    rate=CHASSIS_RATE_LIMIT,
+    burst=CHASSIS_RATE_BURST,
+    budgets={
+        chassis['ip']: (chassis.get('rate_limit', CHASSIS_RATE_LIMIT),
+                        chassis.get('rate_burst', chassis.get('rate_limit', CHASSIS_RATE_BURST)))
+        for chassis in CHASSIS_LIST
+        if 'rate_limit' in chassis or 'rate_burst' in chassis
+    },
+    state_dir=CHASSIS_RATE_LIMIT_DIR or None
+)
+
+# =============================================================================
+# BULK PORT OPERATIONS
+# =============================================================================
+
+# Operations (take/release ownership, reboot, reset, hotswap) in flight per
+# chassis during a bulk run, and seconds after its start before an unfinished
+# one times out
+BULK_OPERATIONS_PER_CHASSIS = int(os.getenv('BULK_OPERATIONS_PER_CHASSIS', '8'))
+BULK_OPERATION_TIMEOUT = int(os.getenv('BULK_OPERATION_TIMEOUT', '300'))
+
+# Status requests per chassis in one polling pass over the running operations
+BULK_POLL_BUDGET = int(os.getenv('BULK_POLL_BUDGET', '10'))
+
+# =============================================================================
+# REMOTE WRITE (push mode)
+# =============================================================================
+
+# remote_write endpoint sensorsPoller and perfMetricsPoller push their metrics
+# to after every cycle, e.g. http://localhost:9090/api/v1/write (empty disables it)
+REMOTE_WRITE_URL = os.getenv('REMOTE_WRITE_URL', '')
+
+# Samples per request, samples kept while the endpoint is unreachable (oldest
+# dropped first), seconds between flushes and retries of a failed request
+REMOTE_WRITE_BATCH_SIZE = int(os.getenv('REMOTE_WRITE_BATCH_SIZE', '1000'))
+REMOTE_WRITE_MAX_BUFFER = int(os.getenv('REMOTE_WRITE_MAX_BUFFER', '100000'))
+REMOTE_WRITE_FLUSH_INTERVAL = float(os.getenv('REMOTE_WRITE_FLUSH_INTERVAL', '5'))
+REMOTE_WRITE_RETRIES = int(os.getenv('REMOTE_WRITE_RETRIES', '5'))
+
+# =============================================================================
+# RECENT STATE STORE (/recent endpoint)
+# =============================================================================
+
+# Seconds of samples each poller keeps in memory per series, and the most
+# samples kept per series whatever the window and poll interval
+RECENT_WINDOW = int(os.getenv('RECENT_WINDOW', '900'))
+RECENT_MAX_SAMPLES = int(os.getenv('RECENT_MAX_SAMPLES', '1000'))
+
+# The /recent routes have their own endpoint on the Prometheus port +
+# RECENT_PORT_OFFSET (9301, 9302, 9303 by default, 0 disables it), apart from
+# the admin endpoint's /debug routes, so RECENT_BIND can open it to other hosts
+# (e.g. 0.0.0.0 for the lab reservation tooling) without exposing /debug
+RECENT_PORT_OFFSET = int(os.getenv('RECENT_PORT_OFFSET', '300'))
+RECENT_BIND = os.getenv('RECENT_BIND', '127.0.0.1')
+
+# =============================================================================
+# GRAFANA QUERY CACHE PROXY (queryProxy.py)
+# =============================================================================
+
+# Port the caching Flux proxy listens on (point the Grafana datasource at it)
+QUERY_PROXY_PORT = int(os.getenv('QUERY_PROXY_PORT', '8087'))
+
+# Absolute query ranges are rounded to this many seconds so refreshes share results
+QUERY_CACHE_ALIGN = int(os.getenv('QUERY_CACHE_ALIGN', str(POLLING_INTERVAL)))
+
+# Seconds a result stays cached; no newer data exists before the next poll
+QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', str(POLLING_INTERVAL)))
+
+# Seconds a result of a range that ended in the past stays cached
+QUERY_CACHE_HISTORY_TTL = int(os.getenv('QUERY_CACHE_HISTORY_TTL', '3600'))
+
+# Memory for cached results, least recently used results are dropped first
+QUERY_CACHE_MAX_MB = int(os.getenv('QUERY_CACHE_MAX_MB', '256'))
+
+# =============================================================================
+# ADMIN / PROFILING ENDPOINT
+# =============================================================================
+
+# Each poller serves /debug/threads, /debug/profile and /debug/cprofile on its
+# Prometheus port + ADMIN_PORT_OFFSET (9101, 9102, 9103, 9104 by default)
+ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMIN_PORT_OFFSET = int(os.getenv('ADMIN_PORT_OFFSET', '100'))
+
+# Interface the admin endpoint listens on; it exposes stacks, so local only by default
+ADMIN_BIND = os.getenv('ADMIN_BIND', '127.0.0.1')
+
+# =============================================================================
+# WARM-RESTART CHECKPOINTS
+# =============================================================================
+
+# Directory the pollers checkpoint their working state to (empty disables it)
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', 'checkpoints')
+
+# Seconds between periodic checkpoints; one is also written on SIGTERM
+CHECKPOINT_INTERVAL = int(os.getenv('CHECKPOINT_INTERVAL', '60'))
+
+# Checkpoints older than this (seconds) are ignored on startup
+CHECKPOINT_MAX_AGE = int(os.getenv('CHECKPOINT_MAX_AGE', '3600'))
+
+# Checkpointed API keys older than this (seconds) are not reused
+CHECKPOINT_API_KEY_MAX_AGE = int(os.getenv('CHECKPOINT_API_KEY_MAX_AGE', '43200'))
+
+# =============================================================================
+# ANOMALY DETECTION CONFIGURATION
+# =============================================================================
+
+# Weight of the newest sample in the moving mean/variance (0-1)
+ANOMALY_EWMA_ALPHA = float(os.getenv('ANOMALY_EWMA_ALPHA', '0.2'))
+
+# Deviation from the moving mean (in standard deviations) treated as anomalous
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '3.0'))
+
+# Consecutive anomalous samples required before a series is flagged
+ANOMALY_SUSTAINED_SAMPLES = int(os.getenv('ANOMALY_SUSTAINED_SAMPLES', '3'))
+
+# Smallest standard deviation a sample is scored against: the larger of an
+# absolute floor and a percentage of the moving mean. Without it a series
+# that was flat (variance 0) never scores a step.
+ANOMALY_MIN_STD = float(os.getenv('ANOMALY_MIN_STD', '0.5'))
+ANOMALY_MIN_STD_PERCENT = float(os.getenv('ANOMALY_MIN_STD_PERCENT', '2'))
+
+# CPU / memory utilization (percent) treated as saturation
+CPU_SATURATION_PERCENT = float(os.getenv('CPU_SATURATION_PERCENT', '90'))
+MEMORY_SATURATION_PERCENT = float(os.getenv('MEMORY_SATURATION_PERCENT', '90'))
 
 # =============================================================================
 # INFLUXDB CONFIGURATION
@@ -63,10 +257,10 @@ INFLUXDB_TOKEN = os.getenv(
     'eegHpR9kkgxg5KG7rklj2zQI86-5z7yNETx0P0qQpSnw1owDxSL5IF-uQruOP-J8M_xmrhT3KWECh-QGbsdyYA=='
 )
 
-# InfluxDB Organization (optional, defaults in influxDBclient.py)
+# InfluxDB Organization
 INFLUXDB_ORG = os.getenv('INFLUXDB_ORG', 'keysight')
 
-# InfluxDB Bucket (optional, defaults in influxDBclient.py)
+# InfluxDB Bucket (point it at the target bucket after running migrateSchema.py)
 INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET', 'ixosChassisStatistics')
 
 # =============================================================================
@@ -77,12 +271,18 @@ def validate_config():
     """Validate configuration and print warnings if needed"""
     issues = []
     
+    if _chassis_env_error is not None:
+        issues.append(f"⚠️  Invalid CHASSIS_LIST JSON in environment variable: {_chassis_env_error}")
+    
     if not CHASSIS_LIST:
         issues.append("⚠️  CHASSIS_LIST is empty! No chassis will be polled.")
     
     if not INFLUXDB_TOKEN or INFLUXDB_TOKEN == 'your-super-secret-token-change-me':
         issues.append("⚠️  INFLUXDB_TOKEN not properly configured!")
     
+    if COLLECTION_MODE not in ('thread', 'process'):
+        issues.append(f"⚠️  COLLECTION_MODE '{COLLECTION_MODE}' is not 'thread' or 'process'. Using 'thread'.")
+    
     if POLLING_INTERVAL < 5:
         issues.append(f"⚠️  POLLING_INTERVAL ({POLLING_INTERVAL}s) is very low. Recommended: 10s or higher.")
     
@@ -104,6 +304,8 @@ def print_config():
             print(f"  - {chassis.get('ip', 'N/A')}")
     print(f"Polling Interval: {POLLING_INTERVAL} seconds for InfluxDB Polling")
     print(f"Polling Interval: {POLLING_INTERVAL_PERF_METRICS} seconds for Performance Metrics Polling")
+    print(f"Polling Interval: {POLLING_INTERVAL_PORT_STATS} seconds for Port Statistics Polling")
+    print(f"Collection Mode: {COLLECTION_MODE}" + (f" ({COLLECTION_PROCESSES} processes)" if COLLECTION_MODE == 'process' else ""))
     print(f"InfluxDB URL: {INFLUXDB_URL}")
     print(f"InfluxDB Org: {INFLUXDB_ORG}")
     print(f"InfluxDB Bucket: {INFLUXDB_BUCKET}")
@@ -0,0 +1,104 @@
+"""
+Monotonic counter to rate conversion for port statistics
+
+A CounterRateTracker keeps the previous value and sample time of every
+counter of every port of one chassis in two NumPy matrices (one row per
+port, one column per counter) and turns each new sample into per-second
+rates with vectorized operations.
+
+A counter that went down is treated as a reset (port or chassis restarted,
+counters cleared): the new value is the amount counted since the reset.
+Only counters configured as 32-bit are read as having wrapped, when the
+previous value was close to 2^32 and the new one is small.
+"""
+
+import numpy as np
+
+WRAP_32 = np.uint64(2 ** 32)
+
+# A decrease is only read as a 32-bit wrap from the top quarter of the range into the bottom quarter
+WRAP_32_HIGH = np.uint64(3 * 2 ** 30)
+WRAP_32_LOW = np.uint64(2 ** 30)
+
+
+class CounterRateTracker(object):
+    """
+    Previous counter values of one chassis' ports
+    counters:       counter names, one column each
+    counters_32bit: names of the counters that are 32 bits wide and wrap at 2^32
+    capacity:       initial number of port rows, grows as needed
+    """
+
+    def __init__(self, counters, counters_32bit=(), capacity=64):
+        self.counters = list(counters)
+        self.wraps_32 = np.array([counter in counters_32bit for counter in self.counters], dtype=bool)
+        self.index = {}
+        self.values = np.zeros((capacity, len(self.counters)), dtype=np.uint64)
+        self.timestamps = np.full((capacity, len(self.counters)), np.nan)
+
+    def _row(self, key):
+        row = self.index.get(key)
+        if row is None:
+            row = self.index[key] = len(self.index)
+            if row >= len(self.timestamps):
+                # Double the arrays, new rows have no previous sample
+                self.values = np.vstack([self.values, np.zeros_like(self.values)])
+                self.timestamps = np.vstack([self.timestamps, np.full_like(self.timestamps, np.nan)])
+        return row
+
+    def update(self, keys, values, present, timestamp):
+        """Fold in one sample of every port and return the rates since the previous one
+
+        Args:
+            keys:       unique port keys, one per row of values
+            values:     (ports, counters) uint64 array of current counter values
+            present:    (ports, counters) bool array, False where the chassis did not report a counter
+            timestamp:  collection time in seconds
+
+        Returns:
+            (ports, counters) float64 array of per-second rates, NaN where there
+            is no previous sample or the counter is missing
+        """
+        rows = np.fromiter((self._row(key) for key in keys), dtype=np.int64, count=len(keys))
+        current = np.asarray(values, dtype=np.uint64)
+        previous = self.values[rows]
+        elapsed = timestamp - self.timestamps[rows]
+
+        decreased = current < previous
+        wrapped = (decreased & self.wraps_32 & (previous >= WRAP_32_HIGH) & (previous < WRAP_32)
+                   & (current < WRAP_32_LOW))
+        reset = decreased & ~wrapped
+
+        delta = current - previous
+        delta = np.where(wrapped, current + (WRAP_32 - np.minimum(previous, WRAP_32)), delta)
+        delta = np.where(reset, current, delta)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rates = delta.astype(np.float64) / elapsed
+        rates[~present | ~(elapsed > 0)] = np.nan
+
+        # Missing counters keep their previous value and time for the next sample
+        self.values[rows] = np.where(present, current, previous)
+        self.timestamps[rows] = np.where(present, timestamp, self.timestamps[rows])
+        return rates
+
+    def snapshot(self):
+        """Previous values and sample times as JSON-friendly lists, None for no sample"""
+        rows = len(self.index)
+        return {
+            "counters": self.counters,
+            "keys": [list(key) for key in sorted(self.index, key=self.index.get)],
+            "values": self.values[:rows].tolist(),
+            "timestamps": [[None if t != t else t for t in row] for row in self.timestamps[:rows].tolist()],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, counters_32bit=()):
+        """Tracker continuing from snapshot(), so the first sample after a restart has a rate"""
+        tracker = cls(snapshot["counters"], counters_32bit, capacity=max(64, len(snapshot["keys"])))
+        rows = len(snapshot["keys"])
+        tracker.index = {tuple(key): row for row, key in enumerate(snapshot["keys"])}
+        if rows:
+            tracker.values[:rows] = np.array(snapshot["values"], dtype=np.uint64)
+            tracker.timestamps[:rows] = np.array(snapshot["timestamps"], dtype=np.float64)
+        return tracker
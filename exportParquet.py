@@ -0,0 +1,240 @@
+"""
+Export utilization history to partitioned Parquet files
+
+Pivoting months of portUtilization with query_api().query() builds every
+record as a Python object before anything is written, and long ranges time
+out. This command reads the history in time chunks with query_stream() and
+writes the rows as they arrive into Parquet files partitioned by month and
+chassis (hive layout, readable by pandas, pyarrow and DuckDB):
+
+    <output>/portUtilization/month=2025-11/chassis=10.36.236.121/part-20251102T060000Z.parquet
+
+String columns (owner, card, port, linkState, transmitState) are
+dictionary-encoded. chassis and month come from the directory names.
+
+Progress is recorded in <output>/<measurement>/_export_state.json after
+every finished chunk; running the same command again continues after the
+last finished chunk. A chunk interrupted midway leaves only .tmp files,
+which are removed and written again.
+
+Usage:
+    pip install pyarrow
+    python exportParquet.py --start -180d --output parquetExport
+    python exportParquet.py --measurement chassisUtilization --start -180d --output parquetExport
+
+    # pandas / DuckDB
+    pandas.read_parquet("parquetExport/portUtilization")
+    duckdb.sql("SELECT * FROM read_parquet('parquetExport/portUtilization/*/*/*.parquet', hive_partitioning=true)")
+"""
+
+import os
+import json
+import time
+import argparse
+from datetime import timedelta
+
+import influxDBclient
+from influxDBclient import get_client
+from migrateSchema import parse_time, rfc3339
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# measurement -> (tags written as columns, {field: type})
+MEASUREMENTS = {
+    'portUtilization': (('card', 'port'), {'owner': 'string', 'linkState': 'string', 'transmitState': 'string'}),
+    'chassisUtilization': ((), {'totalPorts': 'int64', 'ownedPorts': 'int64', 'freePorts': 'int64'}),
+}
+
+# Rows buffered per partition before they are written as one record batch
+BATCH_ROWS = 50000
+
+STATE_FILE = "_export_state.json"
+
+
+def partition_schema(measurement):
+    """Arrow schema of the files of a measurement, strings dictionary-encoded"""
+    tags, fields = MEASUREMENTS[measurement]
+    columns = [pa.field('time', pa.timestamp('s', tz='UTC'))]
+    columns += [pa.field(tag, pa.dictionary(pa.int32(), pa.string())) for tag in tags]
+    columns += [
+        pa.field(name, pa.dictionary(pa.int32(), pa.string()) if kind == 'string' else pa.int64())
+        for name, kind in fields.items()
+    ]
+    return pa.schema(columns)
+
+
+class PartitionWriter(object):
+    """
+    Parquet files of one chunk, one per (month, chassis), written batch by batch
+    Files are written as .tmp and renamed by commit(), so an interrupted chunk
+    never leaves a file that looks complete.
+    """
+
+    def __init__(self, directory, measurement, chunk_start):
+        self.directory = directory
+        self.schema = partition_schema(measurement)
+        self.file_name = f"part-{chunk_start.strftime('%Y%m%dT%H%M%SZ')}.parquet"
+        self.columns = [field.name for field in self.schema]
+        self._buffers = {}
+        self._writers = {}
+        self.rows = 0
+
+    def add(self, row):
+        moment = row['_time']
+        key = (moment.strftime('%Y-%m'), row.get('chassis', ''))
+        buffer = self._buffers.setdefault(key, {name: [] for name in self.columns})
+        buffer['time'].append(int(moment.timestamp()))
+        for name in self.columns[1:]:
+            buffer[name].append(row.get(name))
+        self.rows += 1
+        if len(buffer['time']) >= BATCH_ROWS:
+            self._flush(key)
+
+    def _path(self, key):
+        month, chassis = key
+        return os.path.join(self.directory, f"month={month}", f"chassis={chassis}", self.file_name)
+
+    def _flush(self, key):
+        buffer = self._buffers.pop(key, None)
+        if not buffer or not buffer['time']:
+            return
+        arrays = []
+        for field in self.schema:
+            values = buffer[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+        writer = self._writers.get(key)
+        if writer is None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = self._writers[key] = pq.ParquetWriter(path + ".tmp", self.schema, compression="zstd")
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def commit(self):
+        """Write what is buffered, close the files and give them their final names"""
+        for key in list(self._buffers):
+            self._flush(key)
+        for key, writer in self._writers.items():
+            writer.close()
+            os.replace(self._path(key) + ".tmp", self._path(key))
+        return len(self._writers)
+
+
+def chunk_query(bucket, measurement, start, stop):
+    tags, fields = MEASUREMENTS[measurement]
+    field_filter = " or ".join(f'r["_field"] == "{name}"' for name in fields)
+    columns = ", ".join(f'"{name}"' for name in ("_time", "_field", "_value", "chassis") + tags)
+    return f'''
+    from(bucket: "{bucket}")
+        |> range(start: {rfc3339(start)}, stop: {rfc3339(stop)})
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+        |> filter(fn: (r) => {field_filter})
+        |> keep(columns: [{columns}])
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+
+
+def export_chunk(bucket, measurement, directory, start, stop):
+    """Stream one time range into Parquet files
+
+    Returns:
+        (rows written, files written)
+    """
+    writer = PartitionWriter(directory, measurement, start)
+    records = get_client().query_api().query_stream(
+        org=influxDBclient.org, query=chunk_query(bucket, measurement, start, stop))
+    for record in records:
+        writer.add(record.values)
+    return writer.rows, writer.commit()
+
+
+def load_state(path, settings):
+    """Progress of an earlier run with the same settings, or None"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("settings") != settings:
+        print(f"⚠️  {path} belongs to an export with other settings ({state.get('settings')}), starting over")
+        return None
+    return state
+
+
+def save_state(path, state):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def remove_partial_files(directory):
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".parquet.tmp"):
+                os.remove(os.path.join(root, name))
+
+
+def export(args):
+    directory = os.path.join(args.output, args.measurement)
+    state_path = os.path.join(directory, STATE_FILE)
+    settings = {"bucket": args.bucket, "measurement": args.measurement, "start": args.start, "stop": args.stop,
+                "chunk_hours": args.chunk_hours}
+    os.makedirs(directory, exist_ok=True)
+    remove_partial_files(directory)
+
+    state = None if args.restart else load_state(state_path, settings)
+    if state is None:
+        # Relative times are resolved once, a resumed run ends where the first one would have
+        state = {"settings": settings, "range": [rfc3339(parse_time(args.start)), rfc3339(parse_time(args.stop))],
+                 "completed": None, "rows": 0, "files": 0}
+    else:
+        print(f"✓ Resuming after {state['completed']} ({state['rows']} rows already exported)")
+    start, stop = parse_time(state["range"][0]), parse_time(state["range"][1])
+
+    print(f"Exporting {args.measurement} from {args.bucket} {state['range'][0]} .. {state['range'][1]} "
+          f"in {args.chunk_hours}h chunks to {directory}")
+    chunk = timedelta(hours=args.chunk_hours)
+    chunk_start = parse_time(state["completed"]) if state["completed"] else start
+    while chunk_start < stop:
+        chunk_stop = min(chunk_start + chunk, stop)
+        started = time.time()
+        try:
+            rows, files = export_chunk(args.bucket, args.measurement, directory, chunk_start, chunk_stop)
+        except Exception as e:
+            print(f"❌ Chunk {rfc3339(chunk_start)} failed: {e}")
+            print("   Run the same command again to continue from this chunk")
+            return 1
+        state.update(completed=rfc3339(chunk_stop), rows=state["rows"] + rows, files=state["files"] + files)
+        save_state(state_path, state)
+        print(f"✓ {rfc3339(chunk_start)} .. {rfc3339(chunk_stop)}: {rows} rows, {files} files "
+              f"in {time.time() - started:.1f}s")
+        chunk_start = chunk_stop
+
+    print("-" * 80)
+    print(f"Rows exported: {state['rows']} in {state['files']} files under {directory}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export utilization history to Parquet, partitioned by month and chassis")
+    parser.add_argument("--bucket", default=influxDBclient.bucket)
+    parser.add_argument("--measurement", choices=sorted(MEASUREMENTS), default="portUtilization")
+    parser.add_argument("--start", default="-30d", help="RFC3339 time or -30d / -12h / -90m")
+    parser.add_argument("--stop", default="now")
+    parser.add_argument("--chunk-hours", type=float, default=6)
+    parser.add_argument("--output", default="parquetExport")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress of an earlier run")
+    args = parser.parse_args()
+    if pa is None:
+        parser.error("pyarrow is required: pip install pyarrow")
+    return export(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
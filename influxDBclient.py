@@ -1,95 +1,275 @@
-import influxdb_client
-from influxdb_client.client.write_api import SYNCHRONOUS
 import time
-import random
-from config import INFLUXDB_TOKEN, INFLUXDB_URL
+import threading
+import functools
+from config import INFLUXDB_TOKEN, INFLUXDB_URL, INFLUXDB_BUCKET, INFLUXDB_ORG
 
 # InfluxDB Configuration
 
-bucket = "ixosChassisStatistics"
-org = "keysight"
+bucket = INFLUXDB_BUCKET
+org = INFLUXDB_ORG
 token = INFLUXDB_TOKEN
 # Store the URL of your InfluxDB instance
 url=INFLUXDB_URL
 
+# The client and write API are created on first use and shared afterwards,
+# so importing this module does no network setup and pulls in no influxdb_client
+_client = None
+_write_api = None
+_client_lock = threading.Lock()
 
-client = influxdb_client.InfluxDBClient(
-   url=url,
-   token=token,
-   org=org
-)
 
+def get_client():
+    """Return the shared InfluxDB client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import influxdb_client
+                _client = influxdb_client.InfluxDBClient(
+                    url=url,
+                    token=token,
+                    org=org
+                )
+    return _client
 
-def write_data_to_influxdb(port_list_details):
-    """Write data to InfluxDB portUtilization measurement"""
 
-    write_api = client.write_api(write_options=SYNCHRONOUS)
+def get_write_api():
+    """Return the shared synchronous write API, creating it on first use"""
+    global _write_api
+    if _write_api is None:
+        client = get_client()
+        with _client_lock:
+            if _write_api is None:
+                from influxdb_client.client.write_api import SYNCHRONOUS
+                _write_api = client.write_api(write_options=SYNCHRONOUS)
+    return _write_api
+
+
+# Line protocol escaping, same rules as influxdb_client.Point
+_ESCAPE_KEY = str.maketrans({
+    ',': r'\,',
+    '=': r'\=',
+    ' ': r'\ ',
+    '\n': r'\n',
+    '\t': r'\t',
+    '\r': r'\r',
+})
+
+_ESCAPE_STRING = str.maketrans({
+    '"': r'\"',
+    '\\': r'\\',
+})
+
+
+@functools.lru_cache(maxsize=65536)
+def tag_prefix(measurement, tags):
+    """Escaped "measurement,key=value,..." line protocol prefix
+
+    tags: tuple of (key, value) pairs sorted by key, empty values are skipped
+    """
+    return measurement + "".join(
+        f",{key}={value.translate(_ESCAPE_KEY)}" for key, value in tags if value
+    )
+
+
+def _to_int(value):
+    """Chassis totals are "NA" when the chassis could not be polled"""
+    return int(value) if value != "NA" else 0
+
+
+def _collected_at(port_detail):
+    """Collection time of a port in whole seconds, now if it was not recorded"""
+    collected_at = port_detail.get("collectedAt")
+    return int(collected_at) if collected_at not in (None, "NA") else int(time.time())
+
+
+class PortLineProtocolEncoder(object):
+    """
+    Encodes port details straight into line protocol without building an
+    influxdb_client.Point per port.
+
+    Schema (timestamps are the collection time in seconds, write with precision "s"):
+        portUtilization,card=..,chassis=..,port=.. owner="..",linkState="..",transmitState=".."
+        chassisUtilization,chassis=.. totalPorts=..i,ownedPorts=..i,freePorts=..i
+
+    owner stays a field: it changes whenever a port is taken or released, and
+    as a tag every new owner would start a new series for the port.
+    The escaped "measurement,tags " prefix is computed once per
+    (chassis, card, port) and reused on every cycle, and encoded lines are
+    appended to a buffer that is reused between writes.
+    """
+
+    # Bound the caches in case port names churn (e.g. chassis replaced)
+    MAX_CACHE_ENTRIES = 65536
+
+    def __init__(self, measurement="portUtilization"):
+        self.measurement = measurement
+        self.buffer = []
+        self._prefixes = {}
+        self._strings = {}
+
+    def _prefix(self, chassis_tag, card_tag, port_tag):
+        key = (chassis_tag, card_tag, port_tag)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            if len(self._prefixes) >= self.MAX_CACHE_ENTRIES:
+                self._prefixes.clear()
+            # Tags sorted by key like Point does; empty tag values are not allowed
+            prefix = self._prefixes[key] = tag_prefix(
+                self.measurement, (("card", card_tag), ("chassis", chassis_tag), ("port", port_tag))
+            ) + " "
+        return prefix
+
+    def _string(self, value):
+        quoted = self._strings.get(value)
+        if quoted is None:
+            if len(self._strings) >= self.MAX_CACHE_ENTRIES:
+                self._strings.clear()
+            quoted = self._strings[value] = '"' + value.translate(_ESCAPE_STRING) + '"'
+        return quoted
+
+    def encode(self, port_detail):
+        """Append one port's portUtilization line to the buffer and return it"""
+        card_tag = str(port_detail["cardNumber"])
+        port_tag = port_detail["fullyQualifiedPortName"]
+        if port_tag == "N/A":
+            port_tag = port_detail["portNumber"]
+
+        # Convert transmitState boolean to string to avoid type conflicts
+        transmit_state = port_detail["transmitState"]
+        if transmit_state is True:
+            transmit_state = "active"
+        elif transmit_state is False:
+            transmit_state = "idle"
+
+        line = (
+            f'{self._prefix(str(port_detail["chassisIp"]), card_tag, str(port_tag))}'
+            f'owner={self._string(str(port_detail["owner"]))}'
+            f',linkState={self._string(str(port_detail["linkState"]))}'
+            f',transmitState={self._string(str(transmit_state))}'
+            f' {_collected_at(port_detail)}'
+        )
+        self.buffer.append(line)
+        return line
+
+    def encode_chassis(self, port_detail):
+        """Append the chassisUtilization line of the chassis a port belongs to
+
+        Returns:
+            The line, or None when the chassis could not be polled ("NA" totals)
+        """
+        if port_detail["totalPorts"] == "NA":
+            return None
+        line = (
+            f'{tag_prefix("chassisUtilization", (("chassis", str(port_detail["chassisIp"])),))}'
+            f' totalPorts={_to_int(port_detail["totalPorts"])}i'
+            f',ownedPorts={_to_int(port_detail["ownedPorts"])}i'
+            f',freePorts={_to_int(port_detail["freePorts"])}i'
+            f' {_collected_at(port_detail)}'
+        )
+        self.buffer.append(line)
+        return line
+
+    def encode_heartbeat(self, chassis_tag, port_count, timestamp=None):
+        """Append a portPollHeartbeat line for a chassis whose ports did not change"""
+        line = (
+            f"portPollHeartbeat,chassis={chassis_tag.translate(_ESCAPE_KEY)} unchanged=true,ports={port_count}i"
+            f" {int(timestamp or time.time())}"
+        )
+        self.buffer.append(line)
+        return line
+
+    def flush(self):
+        """Return the buffered lines as one payload and empty the buffer"""
+        payload = "\n".join(self.buffer)
+        self.buffer.clear()
+        return payload
+
+
+_port_encoder = PortLineProtocolEncoder()
+
+
+def write_line_protocol(payload, precision="ns"):
+    """Write a batch of newline separated line protocol records in a single request
+
+    precision: unit of the records' timestamps, "s" for encode_port_details payloads
+    """
+    if payload:
+        get_write_api().write(bucket=bucket, org=org, record=payload, write_precision=precision)
+
+
+def encode_port_details(port_list_details, unchanged_chassis=None, extra_lines=None):
+    """Encode port details as portUtilization and chassisUtilization line protocol
+
+    unchanged_chassis: chassis IP -> port count for chassis whose ports did not
+    change since the last cycle, written as a cheap portPollHeartbeat instead
+    extra_lines: already encoded lines with second timestamps (e.g. portEvents)
+    sent in the same request
+
+    Returns:
+        (payload with second precision timestamps, number of ports encoded)
+    """
+    encoded = 0
+    chassis_seen = set()
     for port_detail in port_list_details:
         try:
-            # Convert values to ensure consistent types
-            # Tags must be strings - cardNumber and portNumber are explicitly strings
-            chassis_tag = str(port_detail["chassisIp"])
-            card_tag = str(port_detail["cardNumber"])  # Explicitly string
-            
-            if port_detail["fullyQualifiedPortName"] == "N/A":
-                port_tag = str(port_detail["portNumber"])
-            else:
-                port_tag = str(port_detail["fullyQualifiedPortName"])
-            
-            # Convert transmitState boolean to string to avoid type conflicts
-            transmit_state = port_detail["transmitState"]
-            if isinstance(transmit_state, bool):
-                transmit_state_str = "active" if transmit_state else "idle"
-            else:
-                transmit_state_str = str(transmit_state)
-            
-            # Ensure numeric fields are integers
-            total_ports = int(port_detail["totalPorts"]) if port_detail["totalPorts"] != "NA" else 0
-            owned_ports = int(port_detail["ownedPorts"]) if port_detail["ownedPorts"] != "NA" else 0
-            free_ports = int(port_detail["freePorts"]) if port_detail["freePorts"] != "NA" else 0
-            
-            p = influxdb_client.Point("portUtilization")\
-                .tag("chassis", chassis_tag)\
-                .tag("card", card_tag)\
-                .tag("port", port_tag)\
-                .field("cardNumber", card_tag)\
-                .field("portNumber", port_tag)\
-                .field("owner", str(port_detail["owner"]))\
-                .field("linkState", str(port_detail["linkState"]))\
-                .field("transmitState", transmit_state_str)\
-                .field("totalPorts", total_ports)\
-                .field("ownedPorts", owned_ports)\
-                .field("freePorts", free_ports)
-            
-            # Actually write the point to InfluxDB
-            write_api.write(bucket=bucket, org=org, record=p)
-            print(f"✓ Written: {chassis_tag}/{card_tag}/{port_tag} -> Owner={port_detail['owner']}, LinkState={port_detail['linkState']}, TransmitState={transmit_state_str}")
+            _port_encoder.encode(port_detail)
+            if port_detail["chassisIp"] not in chassis_seen:
+                chassis_seen.add(port_detail["chassisIp"])
+                _port_encoder.encode_chassis(port_detail)
+            encoded += 1
         except Exception as e:
-            print(f"✗ Error writing data for {port_detail.get('chassisIp', 'unknown')}/{port_detail.get('cardNumber', 'unknown')}/{port_detail.get('portNumber', 'unknown')}: {e}")
+            print(f"✗ Error encoding data for {port_detail.get('chassisIp', 'unknown')}/{port_detail.get('cardNumber', 'unknown')}/{port_detail.get('portNumber', 'unknown')}: {e}")
+    for chassis_ip, port_count in (unchanged_chassis or {}).items():
+        _port_encoder.encode_heartbeat(str(chassis_ip), port_count)
+    _port_encoder.buffer.extend(extra_lines or ())
+    return _port_encoder.flush(), encoded
+
+
+def write_data_to_influxdb(port_list_details, unchanged_chassis=None, extra_lines=None):
+    """Write data to InfluxDB portUtilization measurement"""
+    payload, encoded = encode_port_details(port_list_details, unchanged_chassis, extra_lines)
+
+    # All ports of the cycle go out in one request instead of one request per port
+    try:
+        write_line_protocol(payload, precision="s")
+        if unchanged_chassis:
+            print(f"✓ Written: {encoded} ports to portUtilization, heartbeat for {len(unchanged_chassis)} unchanged chassis")
+        else:
+            print(f"✓ Written: {encoded} ports to portUtilization")
+    except Exception as e:
+        print(f"✗ Error writing {encoded} ports to portUtilization: {e}")
 
 
 
 def query_data():
-    query_api = client.query_api()
+    query_api = get_client().query_api()
     query = f'''
     from(bucket: "{bucket}")
         |> range(start: -1h)
         |> filter(fn: (r) => r["_measurement"] == "portUtilization")
         |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
     '''
+    totals_query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: -1h)
+        |> filter(fn: (r) => r["_measurement"] == "chassisUtilization")
+        |> last()
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
     
     result = query_api.query(org=org, query=query)
+    totals = query_api.query(org=org, query=totals_query)
     
     # Process and display results in row format
-    print(f"\n{'='*120}")
+    print(f"\n{'='*100}")
     print(f"MEASUREMENT: portUtilization")
-    print(f"{'='*120}")
+    print(f"{'='*100}")
     
     # Print header
     if result and result[0].records:
-        first_record = result[0].records[0]
-        print(f"\n{'Time':<30} {'Chassis':<18} {'Card':<6} {'Port':<6} {'Owner':<15} {'LinkState':<10} {'TransmitState':<12} {'Total':<6} {'Owned':<6} {'Free':<6}")
-        print("-" * 120)
+        print(f"\n{'Time':<30} {'Chassis':<18} {'Card':<6} {'Port':<6} {'Owner':<15} {'LinkState':<10} {'TransmitState':<12}")
+        print("-" * 100)
     
     # Print each row
     for table in result:
@@ -101,19 +281,26 @@ def query_data():
             owner = record.values.get("owner", "N/A")
             link_state = record.values.get("linkState", "N/A")
             transmit_state = record.values.get("transmitState", "N/A")
-            total_ports = record.values.get("totalPorts", "N/A")
-            owned_ports = record.values.get("ownedPorts", "N/A")
-            free_ports = record.values.get("freePorts", "N/A")
             
-            print(f"{time_str:<30} {chassis:<18} {card:<6} {port:<6} {owner:<15} {link_state:<10} {transmit_state:<12} {total_ports:<6} {owned_ports:<6} {free_ports:<6}")
+            print(f"{time_str:<30} {chassis:<18} {card:<6} {port:<6} {owner:<15} {link_state:<10} {transmit_state:<12}")
+    
+    # Chassis totals are stored once per chassis in chassisUtilization
+    print(f"\n{'MEASUREMENT: chassisUtilization (latest)':<40}")
+    print(f"{'Time':<30} {'Chassis':<18} {'Total':<6} {'Owned':<6} {'Free':<6}")
+    print("-" * 100)
+    for table in totals:
+        for record in table.records:
+            print(f"{str(record.get_time())[:19]:<30} {record.values.get('chassis', 'N/A'):<18} "
+                  f"{record.values.get('totalPorts', 'N/A'):<6} {record.values.get('ownedPorts', 'N/A'):<6} "
+                  f"{record.values.get('freePorts', 'N/A'):<6}")
     
-    print(f"{'='*120}\n")
+    print(f"{'='*100}\n")
     
     return result
 
 def delete_measurement_data():
     """Delete all data from portUtilization measurement"""
-    delete_api = client.delete_api()
+    delete_api = get_client().delete_api()
     
     start = "1970-01-01T00:00:00Z"  # Beginning of time
     stop = "2099-12-31T23:59:59Z"   # Far future
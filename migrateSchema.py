@@ -0,0 +1,332 @@
+"""
+Migrate portUtilization history to the lean schema
+
+The old schema stored per port, at server arrival time in nanoseconds:
+    portUtilization,card,chassis,port  cardNumber, portNumber, owner, linkState,
+                                       transmitState, totalPorts, ownedPorts, freePorts
+The current schema (see PortLineProtocolEncoder) stores, at collection time in seconds:
+    portUtilization,card,chassis,port  owner, linkState, transmitState
+    chassisUtilization,chassis         totalPorts, ownedPorts, freePorts
+
+The history is rewritten chunk by chunk into a target bucket, so the source
+bucket stays untouched until the new one is checked. Every other measurement
+is copied unchanged. Afterwards point INFLUXDB_BUCKET (and the Grafana
+dashboards) at the target bucket.
+
+Usage:
+    # Rewrite the last 90 days in 6 hour chunks
+    python migrateSchema.py --start -90d --chunk-hours 6 --target-bucket ixosChassisStatistics_v2
+
+    # Resume after an interruption from the chunk that failed
+    python migrateSchema.py --start 2025-11-02T06:00:00Z --target-bucket ixosChassisStatistics_v2
+
+    # Disk usage, series and query latency of both buckets
+    python migrateSchema.py --compare --target-bucket ixosChassisStatistics_v2
+"""
+
+import re
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+import influxDBclient
+from influxDBclient import get_client, get_write_api, tag_prefix, _ESCAPE_STRING
+from config import CHASSIS_LIST, POLLING_INTERVAL
+
+# Fields dropped from portUtilization: repeated tags and chassis totals
+OLD_ONLY_FIELDS = ('cardNumber', 'portNumber', 'totalPorts', 'ownedPorts', 'freePorts')
+TOTAL_FIELDS = ('totalPorts', 'ownedPorts', 'freePorts')
+STATE_FIELDS = ('owner', 'linkState', 'transmitState')
+
+# Columns of a Flux record that are not tags
+_NON_TAG_COLUMNS = ('result', 'table')
+
+_RELATIVE = re.compile(r'^-(\d+)([dhm])$')
+_UNITS = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+
+
+def parse_time(value):
+    """RFC3339 time, "now" or a duration back from now such as -30d, -12h, -90m"""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    if value == 'now':
+        return now
+    match = _RELATIVE.match(value)
+    if match:
+        return now - timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def rfc3339(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _string(value):
+    return '"' + str(value).translate(_ESCAPE_STRING) + '"'
+
+
+def old_line(row):
+    """Old-schema line of a pivoted portUtilization row, to measure the old payload size"""
+    tags = tag_prefix('portUtilization', (
+        ('card', row.get('card', '')), ('chassis', row.get('chassis', '')), ('port', row.get('port', ''))))
+    fields = ",".join(
+        f"{name}={row[name]}i" if name in TOTAL_FIELDS else f"{name}={_string(row[name])}"
+        for name in OLD_ONLY_FIELDS[:2] + STATE_FIELDS + TOTAL_FIELDS if row.get(name) is not None
+    )
+    return f"{tags} {fields} {int(row['_time'].timestamp() * 1e9)}"
+
+
+def is_owned(owner):
+    """Same rule as the poller: a port without an owner is Free"""
+    return bool(owner) and owner != 'Free'
+
+
+def split_cycles(rows, cycle_gap):
+    """Group one chassis' rows, sorted by time, into poll cycles
+
+    The old schema stamped every port with its own arrival time, so a cycle
+    ends when a port shows up again or cycle_gap seconds after its first row.
+    """
+    cycles = []
+    for row in rows:
+        key = (row.get('card', ''), row.get('port', ''))
+        current = cycles[-1] if cycles else None
+        if (current is None or key in current['ports']
+                or (row['_time'] - current['start']).total_seconds() >= cycle_gap):
+            current = {'start': row['_time'], 'ports': {}}
+            cycles.append(current)
+        current['ports'][key] = row
+    return cycles
+
+
+def migrate_port_rows(rows, cycle_gap=POLLING_INTERVAL / 2):
+    """Turn pivoted old portUtilization rows into new-schema lines
+
+    The rows of a chassis' poll cycle are written under one timestamp, and the
+    chassis totals are recounted from the cycle's owners: the old ownedPorts
+    always equalled totalPorts.
+
+    Returns:
+        (portUtilization and chassisUtilization lines in seconds, old-schema bytes)
+    """
+    lines = []
+    old_bytes = 0
+    by_chassis = {}
+    for row in rows:
+        old_bytes += len(old_line(row)) + 1
+        by_chassis.setdefault(row.get('chassis', ''), []).append(row)
+
+    for chassis, chassis_rows in by_chassis.items():
+        chassis_rows.sort(key=lambda row: row['_time'])
+        for cycle in split_cycles(chassis_rows, cycle_gap):
+            timestamp = int(cycle['start'].timestamp())
+            for (card, port), row in cycle['ports'].items():
+                tags = tag_prefix('portUtilization', (('card', card), ('chassis', chassis), ('port', port)))
+                fields = ",".join(f"{name}={_string(row[name])}" for name in STATE_FIELDS if row.get(name) is not None)
+                if fields:
+                    lines.append(f"{tags} {fields} {timestamp}")
+
+            total = len(cycle['ports'])
+            owned = sum(1 for row in cycle['ports'].values() if is_owned(row.get('owner')))
+            lines.append(
+                f"{tag_prefix('chassisUtilization', (('chassis', chassis),))} "
+                f"totalPorts={total}i,ownedPorts={owned}i,freePorts={total - owned}i {timestamp}"
+            )
+    return lines, old_bytes
+
+
+def copy_line(record):
+    """Line protocol (ns) of a raw record of any other measurement"""
+    from influxdb_client import Point
+    point = Point(record.get_measurement())
+    for column, value in record.values.items():
+        if not column.startswith('_') and column not in _NON_TAG_COLUMNS and value is not None:
+            point.tag(column, value)
+    return point.field(record.get_field(), record.get_value()).time(record.get_time()).to_line_protocol()
+
+
+def ensure_bucket(name, source_name):
+    """Create the target bucket with the source bucket's retention if it does not exist"""
+    buckets_api = get_client().buckets_api()
+    if buckets_api.find_bucket_by_name(name) is None:
+        source = buckets_api.find_bucket_by_name(source_name)
+        buckets_api.create_bucket(
+            bucket_name=name, org=influxDBclient.org,
+            retention_rules=source.retention_rules if source else None,
+            description=f"{source_name} migrated to the lean portUtilization schema",
+        )
+        print(f"✓ Created bucket {name}")
+
+
+def migrate_chunk(source, target, start, stop, dry_run=False, cycle_gap=POLLING_INTERVAL / 2):
+    """Rewrite one time range
+
+    Returns:
+        (port rows read, lines copied unchanged, old-schema bytes, new-schema bytes)
+    """
+    query_api = get_client().query_api()
+    port_rows = list(query_api.query_stream(org=influxDBclient.org, query=f'''
+    from(bucket: "{source}")
+        |> range(start: {rfc3339(start)}, stop: {rfc3339(stop)})
+        |> filter(fn: (r) => r["_measurement"] == "portUtilization")
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''))
+    new_lines, old_bytes = migrate_port_rows((record.values for record in port_rows), cycle_gap)
+
+    copied = [copy_line(record) for record in query_api.query_stream(org=influxDBclient.org, query=f'''
+    from(bucket: "{source}")
+        |> range(start: {rfc3339(start)}, stop: {rfc3339(stop)})
+        |> filter(fn: (r) => r["_measurement"] != "portUtilization")
+    ''')]
+
+    new_payload = "\n".join(new_lines)
+    if not dry_run:
+        write_api = get_write_api()
+        if new_payload:
+            write_api.write(bucket=target, org=influxDBclient.org, record=new_payload, write_precision="s")
+        if copied:
+            write_api.write(bucket=target, org=influxDBclient.org, record="\n".join(copied), write_precision="ns")
+    return len(port_rows), len(copied), old_bytes, len(new_payload) + 1 if new_payload else 0
+
+
+def migrate(args):
+    start, stop = parse_time(args.start), parse_time(args.stop)
+    chunk = timedelta(hours=args.chunk_hours)
+    if not args.dry_run:
+        ensure_bucket(args.target_bucket, args.source_bucket)
+
+    print(f"Migrating {args.source_bucket} -> {args.target_bucket} from {rfc3339(start)} to {rfc3339(stop)}"
+          f" in {args.chunk_hours}h chunks{' (dry run)' if args.dry_run else ''}")
+    totals = [0, 0, 0, 0]
+    chunk_start = start
+    while chunk_start < stop:
+        chunk_stop = min(chunk_start + chunk, stop)
+        started = time.time()
+        try:
+            result = migrate_chunk(args.source_bucket, args.target_bucket, chunk_start, chunk_stop,
+                                   args.dry_run, args.cycle_gap)
+        except Exception as e:
+            print(f"❌ Chunk {rfc3339(chunk_start)} failed: {e}")
+            print(f"   Resume with: --start {rfc3339(chunk_start)} --stop {rfc3339(stop)}")
+            return 1
+        totals = [total + value for total, value in zip(totals, result)]
+        print(f"✓ {rfc3339(chunk_start)} .. {rfc3339(chunk_stop)}: {result[0]} port rows, "
+              f"{result[1]} other points copied, {result[2]} -> {result[3]} bytes in {time.time() - started:.1f}s")
+        chunk_start = chunk_stop
+
+    rows, copied, old_bytes, new_bytes = totals
+    print("-" * 80)
+    print(f"Port rows migrated:            {rows}")
+    print(f"Other points copied:           {copied}")
+    if rows:
+        print(f"portUtilization line protocol: {old_bytes} -> {new_bytes} bytes "
+              f"({old_bytes / rows:.0f} -> {new_bytes / rows:.0f} bytes/port, "
+              f"{100 * (1 - new_bytes / old_bytes):.0f}% smaller)")
+    return 0
+
+
+def bucket_disk_bytes(bucket_names):
+    """On-disk size per bucket from the InfluxDB storage_shard_disk_size metric"""
+    buckets_api = get_client().buckets_api()
+    ids = {}
+    for name in bucket_names:
+        found = buckets_api.find_bucket_by_name(name)
+        if found is not None:
+            ids[found.id] = name
+    sizes = dict.fromkeys(bucket_names, 0)
+    metrics = requests.get(f"{influxDBclient.url}/metrics",
+                           headers={"Authorization": f"Token {influxDBclient.token}"}, timeout=30).text
+    for line in metrics.splitlines():
+        if line.startswith("storage_shard_disk_size{"):
+            match = re.search(r'bucket="([^"]+)"', line)
+            if match and match.group(1) in ids:
+                sizes[ids[match.group(1)]] += float(line.rsplit(" ", 1)[1])
+    return sizes
+
+
+def series_cardinality(bucket_name, start):
+    query = f'''
+    import "influxdata/influxdb"
+    influxdb.cardinality(bucket: "{bucket_name}", start: {start})
+    '''
+    try:
+        tables = get_client().query_api().query(org=influxDBclient.org, query=query)
+        return sum(record.get_value() for table in tables for record in table.records)
+    except Exception:
+        return None
+
+
+def query_latency(query, repeat):
+    """Median wall time of a Flux query in milliseconds"""
+    query_api = get_client().query_api()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query_api.query_raw(org=influxDBclient.org, query=query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def compare(args):
+    chassis = args.chassis or (CHASSIS_LIST[0]["ip"] if CHASSIS_LIST else "")
+    source, target = args.source_bucket, args.target_bucket
+
+    # The Grafana state timeline query and a fleet totals query, in each schema
+    queries = {
+        "owner timeline (dashboard)": (
+            f'''from(bucket: "{source}") |> range(start: {args.range})
+                |> filter(fn: (r) => r["_measurement"] == "portUtilization")
+                |> filter(fn: (r) => r["chassis"] == "{chassis}")
+                |> filter(fn: (r) => r["_field"] == "owner")''',
+            f'''from(bucket: "{target}") |> range(start: {args.range})
+                |> filter(fn: (r) => r["_measurement"] == "portUtilization")
+                |> filter(fn: (r) => r["chassis"] == "{chassis}")
+                |> filter(fn: (r) => r["_field"] == "owner")''',
+        ),
+        "owned ports per chassis": (
+            f'''from(bucket: "{source}") |> range(start: {args.range})
+                |> filter(fn: (r) => r["_measurement"] == "portUtilization")
+                |> filter(fn: (r) => r["_field"] == "ownedPorts")
+                |> group(columns: ["chassis"]) |> aggregateWindow(every: 1h, fn: max)''',
+            f'''from(bucket: "{target}") |> range(start: {args.range})
+                |> filter(fn: (r) => r["_measurement"] == "chassisUtilization")
+                |> filter(fn: (r) => r["_field"] == "ownedPorts")
+                |> group(columns: ["chassis"]) |> aggregateWindow(every: 1h, fn: max)''',
+        ),
+    }
+
+    print(f"Comparing {source} (old schema) with {target} (new schema), range {args.range}, chassis {chassis}")
+    print("-" * 80)
+    try:
+        sizes = bucket_disk_bytes([source, target])
+        print(f"{'Disk usage':<30} {sizes[source] / 1e6:10.1f} MB {sizes[target] / 1e6:10.1f} MB")
+    except Exception as e:
+        print(f"⚠️  Disk usage unavailable: {e}")
+    print(f"{'Series':<30} {series_cardinality(source, args.range)!s:>13} {series_cardinality(target, args.range)!s:>13}")
+    for name, (old_query, new_query) in queries.items():
+        print(f"{name:<30} {query_latency(old_query, args.repeat):10.1f} ms {query_latency(new_query, args.repeat):10.1f} ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite portUtilization history to the lean schema")
+    parser.add_argument("--source-bucket", default=influxDBclient.bucket)
+    parser.add_argument("--target-bucket", default=f"{influxDBclient.bucket}_v2")
+    parser.add_argument("--start", default="-30d", help="RFC3339 time or -30d / -12h / -90m")
+    parser.add_argument("--stop", default="now")
+    parser.add_argument("--chunk-hours", type=float, default=6)
+    parser.add_argument("--dry-run", action="store_true", help="Read and convert, but do not write")
+    parser.add_argument("--cycle-gap", type=float, default=POLLING_INTERVAL / 2,
+                        help="Seconds after which a chassis' port rows belong to the next poll cycle")
+    parser.add_argument("--compare", action="store_true", help="Report disk usage and query latency of both buckets")
+    parser.add_argument("--range", default="-24h", help="Query range for --compare")
+    parser.add_argument("--chassis", help="Chassis for the --compare dashboard query")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    return compare(args) if args.compare else migrate(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,16 +1,21 @@
 import time
-import json
-import math
 from datetime import datetime, timezone
-# Load .env file if it exists
-from dotenv import load_dotenv
- 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from prometheus_client import start_http_server, Gauge
-from RestApi.IxOSRestInterface import IxRestSession
-from config import CHASSIS_LIST, POLLING_INTERVAL_PERF_METRICS
+from RestApi.IxOSRestInterface import IxRestException
+from chassisSessions import get_session, invalidate_session, export_api_keys, restore_api_keys
+from adminServer import admin_server, recent_server, start_recent_server
+from remoteWrite import start_remote_writer
+from recentStore import RecentStore, CycleSamples
+from checkpoint import Checkpoint, PollSchedule, WorkerState, snapshot_gauges, restore_gauges
+from anomalyDetection import DetectorBank
+from collectionPool import get_collection_pool
+from config import (CHASSIS_LIST, POLLING_INTERVAL_PERF_METRICS, ANOMALY_EWMA_ALPHA,
+                    ANOMALY_Z_THRESHOLD, ANOMALY_SUSTAINED_SAMPLES,
+                    ANOMALY_MIN_STD, ANOMALY_MIN_STD_PERCENT,
+                    CPU_SATURATION_PERCENT, MEMORY_SATURATION_PERCENT,
+                    COLLECTION_MODE, COLLECTION_PROCESSES, ADMIN_ENABLED)
 
-load_dotenv()
 # ==============================================================================
 # METRIC DEFINITIONS
 # ==============================================================================
@@ -29,15 +34,91 @@ cpu_utilization = Gauge(
 )
 
 
+perf_anomaly_score = Gauge(
+    'ixos_perf_anomaly_score',
+    'Deviation of the latest sample from its moving baseline in standard deviations',
+    ['chassis', 'metric']
+)
+
+
+perf_anomaly_flag = Gauge(
+    'ixos_perf_anomaly_flag',
+    '1 while the metric is in sustained saturation or anomaly, else 0',
+    ['chassis', 'metric']
+)
+
+# One streaming detector per (chassis, metric)
+perf_detectors = DetectorBank(
+    alpha=ANOMALY_EWMA_ALPHA,
+    z_threshold=ANOMALY_Z_THRESHOLD,
+    sustain=ANOMALY_SUSTAINED_SAMPLES,
+    min_std=ANOMALY_MIN_STD,
+    min_std_ratio=ANOMALY_MIN_STD_PERCENT / 100.0
+)
+
+SATURATION_LIMITS = {
+    'cpu_utilization': CPU_SATURATION_PERCENT,
+    'memory_utilization': MEMORY_SATURATION_PERCENT,
+}
+
+# Last RECENT_WINDOW seconds of every gauge, queried through the /recent endpoint
+recent_store = RecentStore(POLLING_INTERVAL_PERF_METRICS)
+
+# Gauge values set this cycle with their chassis' collection time, for recent_store and remote_write
+cycle_samples = CycleSamples()
+
+# Chassis sessions are kept by the collection workers in COLLECTION_MODE=process
+worker_state = WorkerState({'api_keys': (export_api_keys, restore_api_keys)})
+
+
+CHECKPOINTED_GAUGES = (memory_utilization, cpu_utilization, perf_anomaly_score, perf_anomaly_flag)
+
+
+def build_checkpoint(schedule):
+    """Working state kept across restarts: API keys, last metric values, detector baselines"""
+    state = Checkpoint('perfMetricsPoller')
+    state.register('schedule', schedule.snapshot, schedule.restore)
+    state.register('gauges', lambda: snapshot_gauges(*CHECKPOINTED_GAUGES),
+                   lambda snapshot, age: restore_gauges(CHECKPOINTED_GAUGES, snapshot))
+    state.register('detectors', perf_detectors.snapshot, perf_detectors.restore)
+    worker_state.register(state)
+    return state
+
+
+def init_partition_worker(partition, snapshot, age):
+    """Collection worker initializer: continue from the partition's checkpointed API keys"""
+    worker_state.init_worker(partition, snapshot, age)
+
+
+def update_anomaly_metrics(chassisIp, metric, value, collected_at):
+    """Feed a sample to the metric's detector and export its score and flag"""
+    score, flagged = perf_detectors.update((chassisIp, metric), value, limit=SATURATION_LIMITS[metric])
+    labels = {'chassis': chassisIp, 'metric': metric}
+    cycle_samples.set(perf_anomaly_score, labels, score, collected_at)
+    cycle_samples.set(perf_anomaly_flag, labels, 1 if flagged else 0, collected_at)
+    if flagged:
+        print(f"⚠️  {chassisIp}: sustained {metric} anomaly (value={value}, score={score:.2f})")
+
+
 def get_perf_metrics(session, chassisIp):
-    """Method to get Performance Metrics from Ixia Chassis"""
+    """Method to get Performance Metrics from Ixia Chassis
+
+    Returns:
+        dict of the chassis metrics, or None when /perfcounters could not be read
+        (e.g. Windows chassis), so no sample reaches the gauges and detectors
+    """
     chassis_perf_dict = {}
-    # Exception Handling for Windows Chassis
-    perf = {}
     try:
         perf = session.get_perfcounters().data[0]
-    except Exception:
-        pass
+    except IxRestException as e:
+        # An expired API key must reach poll_single_chassis so the cached session is dropped
+        if str(e).startswith('401'):
+            raise
+        print(f"⚠️  {chassisIp}: no performance counters ({e})")
+        return None
+    except Exception as e:
+        print(f"⚠️  {chassisIp}: no performance counters ({e})")
+        return None
     
     mem_bytes = int(perf.get("memoryInUseBytes", "0"))
     mem_bytes_total = int(perf.get("memoryTotalBytes", "0"))
@@ -50,7 +131,8 @@ def get_perf_metrics(session, chassisIp):
     chassis_perf_dict.update({"chassisIp": chassisIp,
                               "mem_utilization": mem_util, 
                               "cpu_utilization": cpu_pert_usage,
-                              "lastUpdatedAt_UTC": last_update_at})
+                              "lastUpdatedAt_UTC": last_update_at,
+                              "collectedAt": time.time()})
     
     return chassis_perf_dict
 
@@ -63,26 +145,65 @@ def poll_single_chassis(chassis):
         chassis (dict): Dictionary containing chassis ip, username, and password
         
     Returns:
-        dict: Chassis metrics including IP, memory utilization, and CPU utilization
+        dict: Chassis metrics including IP, memory utilization, and CPU utilization,
+              None if the chassis or its counters could not be read
     """
     try:
-        session = IxRestSession(chassis['ip'], chassis['username'], chassis['password'])
+        session = get_session(chassis)
         chassis_metrics = get_perf_metrics(session, chassis['ip'])
         return chassis_metrics
     except Exception as e:
         print(f"❌ Error polling chassis {chassis['ip']}: {e}")
+        invalidate_session(chassis['ip'])
         return None
 
 
+def update_chassis_metrics(chassis_metrics):
+    """Print and export one chassis' metrics as returned by get_perf_metrics"""
+    print(f"✓ {chassis_metrics['chassisIp']}: "
+          f"CPU={chassis_metrics['cpu_utilization']}%, "
+          f"MEM={chassis_metrics['mem_utilization']:.2f}%")
+    
+    # Update Prometheus metrics
+    collected_at = chassis_metrics['collectedAt']
+    labels = {'chassis': chassis_metrics['chassisIp']}
+    cycle_samples.set(memory_utilization, labels, chassis_metrics['mem_utilization'], collected_at)
+    cycle_samples.set(cpu_utilization, labels, chassis_metrics['cpu_utilization'], collected_at)
+    update_anomaly_metrics(chassis_metrics['chassisIp'], 'memory_utilization',
+                           chassis_metrics['mem_utilization'], collected_at)
+    update_anomaly_metrics(chassis_metrics['chassisIp'], 'cpu_utilization',
+                           chassis_metrics['cpu_utilization'], collected_at)
+
+
+def collect_perf_partition(chassis_list):
+    """Worker process entry point: poll one partition and return its metrics dictionaries"""
+    with ThreadPoolExecutor(max_workers=len(chassis_list)) as executor:
+        metrics = [m for m in executor.map(poll_single_chassis, chassis_list) if m]
+    return metrics, worker_state.report()
+
+
 def get_chassis_metrics():
     """
     Get chassis metrics from all chassis in parallel using ThreadPoolExecutor.
     This ensures all chassis are polled at approximately the same time.
+    With COLLECTION_MODE=process the chassis are polled by the worker processes.
     """
     if not CHASSIS_LIST:
         print("⚠️  No chassis configured in CHASSIS_LIST")
         return
     
+    if COLLECTION_MODE == 'process':
+        pool = get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES)
+        results = pool.map(collect_perf_partition)
+        worker_state.update(report for _, report in results)
+        for partition, _ in results:
+            for chassis_metrics in partition:
+                try:
+                    update_chassis_metrics(chassis_metrics)
+                except Exception as e:
+                    print(f"❌ Exception processing chassis {chassis_metrics['chassisIp']}: {e}")
+        return
+    
     # Use ThreadPoolExecutor to poll all chassis in parallel
     # max_workers=None means it will default to min(32, num_chassis + 4)
     with ThreadPoolExecutor(max_workers=len(CHASSIS_LIST)) as executor:
@@ -98,17 +219,7 @@ def get_chassis_metrics():
             try:
                 chassis_metrics = future.result()
                 if chassis_metrics:
-                    print(f"✓ {chassis_metrics['chassisIp']}: "
-                          f"CPU={chassis_metrics['cpu_utilization']}%, "
-                          f"MEM={chassis_metrics['mem_utilization']:.2f}%")
-                    
-                    # Update Prometheus metrics
-                    memory_utilization.labels(chassis_metrics['chassisIp']).set(
-                        chassis_metrics['mem_utilization']
-                    )
-                    cpu_utilization.labels(chassis_metrics['chassisIp']).set(
-                        chassis_metrics['cpu_utilization']
-                    )
+                    update_chassis_metrics(chassis_metrics)
             except Exception as e:
                 print(f"❌ Exception processing chassis {chassis['ip']}: {e}")
 
@@ -120,32 +231,57 @@ def main():
     """
     Main function to start the HTTP server and begin monitoring loop.
     """
+    # Pick up API keys, last values and baselines from before a restart
+    schedule = PollSchedule(POLLING_INTERVAL_PERF_METRICS)
+    checkpoint = build_checkpoint(schedule)
+    checkpoint.restore()
+    checkpoint.save_on_sigterm()
+    if COLLECTION_MODE == 'process':
+        # The workers log in with the restored API keys
+        get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES, init_partition_worker, worker_state.initargs)
+    
     # Start the HTTP server to expose metrics on port 9001
     start_http_server(9001)
+    remote_writer = start_remote_writer('perfMetricsPoller')
     
     print("=" * 70)
     print("Chassis Performance Monitoring Service Started")
     print("=" * 70)
     print(f"Metrics endpoint: http://localhost:9001/metrics")
+    if ADMIN_ENABLED:
+        print(f"Admin endpoint: http://localhost:{admin_server.start(9001)}/debug/threads")
+    recent_store.add_routes(recent_server)
+    recent_port = start_recent_server(9001)
+    if recent_port:
+        print(f"Recent state endpoint: http://localhost:{recent_port}/recent")
+    if remote_writer:
+        print(f"Remote write: {remote_writer.url} (every {remote_writer.flush_interval:g}s)")
     print(f"Number of chassis: {len(CHASSIS_LIST)}")
     print(f"Monitoring interval: {POLLING_INTERVAL_PERF_METRICS} seconds")
-    print(f"Polling mode: Parallel (ThreadPoolExecutor)")
+    print(f"Polling mode: Parallel ({'ProcessPoolExecutor' if COLLECTION_MODE == 'process' else 'ThreadPoolExecutor'})")
     print("=" * 70)
     print("\nPress Ctrl+C to stop.\n")
     
-    # Main monitoring loop - runs every 110 seconds
-    poll_count = 0
+    # Main monitoring loop, keeping the cadence of the previous process after a restart
+    time.sleep(schedule.initial_delay())
     while True:
-        poll_count += 1
+        poll_count = schedule.start_cycle()
+        admin_server.begin_cycle()
         print(f"\n[Poll #{poll_count}] Starting parallel chassis polling...")
         start_time = time.time()
         
         get_chassis_metrics()
-        
+        samples = cycle_samples.take()
+        recent_store.record_samples(samples)
+        if remote_writer:
+            remote_writer.push_samples(samples)
+
         elapsed_time = time.time() - start_time
         print(f"[Poll #{poll_count}] Completed in {elapsed_time:.2f} seconds")
         print(f"Next poll in {POLLING_INTERVAL_PERF_METRICS} seconds...\n")
         
+        admin_server.end_cycle()
+        checkpoint.maybe_save()
         time.sleep(POLLING_INTERVAL_PERF_METRICS)
 
 if __name__ == "__main__":
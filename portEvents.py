@@ -0,0 +1,246 @@
+"""
+Port ownership, link-state and transmit-state transition events
+
+portInfoPoller already has every port's owner, linkState and transmitState
+in memory each cycle. A PortTransitionTracker compares them with the
+previous cycle per chassis and turns the differences into events, so
+consumers no longer have to query InfluxDB and diff owner values themselves.
+
+Events are published by a PortEventStream to:
+  - the portEvents measurement (line protocol, written with the cycle's ports)
+  - an append-only JSONL file, one event per line
+  - an HTTP endpoint with long-poll (GET /events?since=<seq>&timeout=<s>)
+    and Server-Sent Events (GET /events/stream) variants
+"""
+
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from influxDBclient import tag_prefix, _ESCAPE_STRING
+
+# Port fields whose changes are reported
+TRACKED_FIELDS = ('owner', 'linkState', 'transmitState')
+
+
+def _state_value(value):
+    """Same string form as the portUtilization fields"""
+    if value is True:
+        return "active"
+    if value is False:
+        return "idle"
+    return str(value)
+
+
+def _port_key(port_detail):
+    port = port_detail.get("fullyQualifiedPortName")
+    if not port or port == "N/A":
+        port = port_detail.get("portNumber", "NA")
+    return str(port_detail.get("cardNumber", "NA")), str(port)
+
+
+class PortTransitionTracker(object):
+    """
+    Previous owner / linkState / transmitState of every port, per chassis
+    A chassis or port seen for the first time only sets the baseline.
+    Detected events are queued until take_events() is called.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._events = []
+        self._lock = threading.Lock()
+
+    def observe(self, chassisIp, port_list_details):
+        """Compare one chassis' freshly decoded ports with its previous cycle
+
+        Returns:
+            Number of events detected
+        """
+        detected_at = time.time()
+        current = {
+            _port_key(port): tuple(_state_value(port.get(field, "NA")) for field in TRACKED_FIELDS)
+            for port in port_list_details
+        }
+        events = []
+        previous = self._states.get(chassisIp)
+        if previous is not None:
+            for key, state in current.items():
+                old_state = previous.get(key)
+                if old_state is None or old_state == state:
+                    continue
+                for field, old, new in zip(TRACKED_FIELDS, old_state, state):
+                    if old != new:
+                        events.append({
+                            "time": detected_at, "chassis": chassisIp, "card": key[0], "port": key[1],
+                            "field": field, "previous": old, "current": new,
+                        })
+        with self._lock:
+            self._states[chassisIp] = current
+            self._events.extend(events)
+        return len(events)
+
+    def forget(self, chassisIp):
+        with self._lock:
+            self._states.pop(chassisIp, None)
+
+    def snapshot(self):
+        """Port states as {chassis: [[card, port, owner, linkState, transmitState], ...]}"""
+        with self._lock:
+            return {chassisIp: [list(key) + list(state) for key, state in states.items()]
+                    for chassisIp, states in self._states.items()}
+
+    def restore(self, snapshot, age=0):
+        """Reload snapshot() so transitions across a restart are detected"""
+        with self._lock:
+            for chassisIp, ports in snapshot.items():
+                self._states[chassisIp] = {tuple(port[:2]): tuple(port[2:]) for port in ports}
+
+    def take_events(self):
+        """Return the events detected since the last call and clear them"""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+
+def encode_events(events):
+    """Encode events as portEvents line protocol, timestamped with their detection time in seconds"""
+    lines = []
+    for event in events:
+        prefix = tag_prefix("portEvents", (
+            ("card", event["card"]), ("chassis", event["chassis"]),
+            ("field", event["field"]), ("port", event["port"]),
+        ))
+        lines.append(
+            f'{prefix} previous="{event["previous"].translate(_ESCAPE_STRING)}"'
+            f',current="{event["current"].translate(_ESCAPE_STRING)}"'
+            f' {int(event["time"])}'
+        )
+    return lines
+
+
+class PortEventStream(object):
+    """
+    Publishes events to the JSONL file and to HTTP subscribers
+    path:       JSONL file events are appended to, None to disable
+    history:    number of recent events kept for long-poll / SSE clients
+    """
+
+    def __init__(self, path=None, history=10000):
+        self.path = path
+        self._recent = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._file = None
+
+    def publish(self, events):
+        """Number the events, append them to the file and wake up HTTP clients"""
+        if not events:
+            return
+        with self._cond:
+            for event in events:
+                self._seq += 1
+                event["seq"] = self._seq
+                self._recent.append(event)
+            self._cond.notify_all()
+        if self.path:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write("".join(json.dumps(self.to_json(e), separators=(",", ":")) + "\n" for e in events))
+            except OSError as e:
+                print(f"✗ Error appending {len(events)} port events to {self.path}: {e}")
+
+    @staticmethod
+    def to_json(event):
+        event = dict(event)
+        event["time"] = datetime.fromtimestamp(event["time"], timezone.utc).isoformat()
+        return event
+
+    def wait_for(self, since, timeout):
+        """Return the events after sequence number `since`, waiting up to timeout seconds for one"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > since, timeout)
+            return [e for e in self._recent if e["seq"] > since]
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def snapshot(self, recent=1000):
+        """Sequence number and the latest events, so clients can resume after a restart"""
+        with self._cond:
+            return {"seq": self._seq, "recent": list(self._recent)[-recent:]}
+
+    def restore(self, snapshot, age=0):
+        with self._cond:
+            self._seq = snapshot["seq"]
+            self._recent.extend(snapshot["recent"])
+
+    def serve(self, port, host="127.0.0.1"):
+        """Start the long-poll / SSE HTTP endpoint in a daemon thread"""
+        server = ThreadingHTTPServer((host, port), _make_handler(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="portEventsHttp", daemon=True).start()
+        return server
+
+
+def _make_handler(stream):
+
+    class PortEventsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                since = int(query.get("since", [self.headers.get("Last-Event-ID") or -1])[0])
+                timeout = min(float(query.get("timeout", ["30"])[0]), 300)
+            except ValueError:
+                self.send_error(400, "since and timeout must be numbers")
+                return
+            # Without a position clients start at the next event
+            if since < 0:
+                since = stream.last_seq
+
+            if url.path == "/events":
+                events = stream.wait_for(since, timeout)
+                body = json.dumps({
+                    "last": events[-1]["seq"] if events else since,
+                    "events": [stream.to_json(e) for e in events],
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif url.path == "/events/stream":
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                try:
+                    while True:
+                        events = stream.wait_for(since, 15)
+                        if not events:
+                            # keeps proxies from closing an idle stream
+                            self.wfile.write(b": keep-alive\n\n")
+                        for event in events:
+                            self.wfile.write(
+                                f"id: {event['seq']}\nevent: {event['field']}\n"
+                                f"data: {json.dumps(stream.to_json(event))}\n\n".encode()
+                            )
+                            since = event["seq"]
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PortEventsHandler
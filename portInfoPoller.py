@@ -1,26 +1,126 @@
 import time
 import config
-import logging
-from dotenv import load_dotenv
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from RestApi.IxOSRestInterface import IxRestSession
-from influxDBclient import write_data_to_influxdb
+from prometheus_client import start_http_server, Counter, Gauge
+
+from chassisSessions import get_session, invalidate_session, export_api_keys, restore_api_keys
+from adminServer import admin_server, recent_server, start_recent_server
+from checkpoint import Checkpoint, PollSchedule, WorkerState
+from collectionPool import get_collection_pool
+from responseFingerprint import ResponseFingerprintCache
+from portEvents import PortTransitionTracker, PortEventStream, encode_events
+from recentStore import RecentStore, StateTable
+from influxDBclient import write_data_to_influxdb, encode_port_details, write_line_protocol
 from config import POLLING_INTERVAL
 
-load_dotenv()
+# ==============================================================================
+# PROMETHEUS METRIC DEFINITIONS
+# ==============================================================================
+
+fingerprint_hits = Counter(
+    'ixos_response_fingerprint_hits_total',
+    'Responses whose raw body matched the previous cycle, decode and transform skipped',
+    ['endpoint']
+)
+
+fingerprint_misses = Counter(
+    'ixos_response_fingerprint_misses_total',
+    'Responses whose raw body changed (or expired) and were decoded and transformed',
+    ['endpoint']
+)
+
+fingerprint_hit_ratio = Gauge(
+    'ixos_response_fingerprint_hit_ratio',
+    'Share of chassis responses in the last cycle that were unchanged (0-1)',
+    ['endpoint']
+)
+
+port_events_total = Counter(
+    'ixos_port_events_total',
+    'Port owner / linkState / transmitState transitions detected',
+    ['field']
+)
+
+# Hash of the previous /ports body and its processed port list per chassis
+_fingerprints = ResponseFingerprintCache(max_age=config.FINGERPRINT_MAX_AGE)
+
+# Previous owner / linkState / transmitState per port, diffed on every changed /ports body
+_transitions = PortTransitionTracker()
+
+# Kept by the collection workers in COLLECTION_MODE=process, checkpointed through their reports
+worker_state = WorkerState({
+    'api_keys': (export_api_keys, restore_api_keys),
+    'fingerprints': (_fingerprints.snapshot, _fingerprints.restore),
+    'port_states': (_transitions.snapshot, _transitions.restore),
+})
+
+# Publishes transitions to the JSONL file and the long-poll / SSE endpoint
+event_stream = PortEventStream(config.PORT_EVENTS_FILE or None)
+
+# Current state of every port and the recent chassis totals, queried through
+# the /recent endpoint
+recent_ports = StateTable({
+    'chassis': 'chassisIp', 'card': 'cardNumber', 'port': 'fullyQualifiedPortName',
+    'owner': 'owner', 'linkState': 'linkState', 'transmitState': 'transmitState',
+}, group_by='chassis')
+recent_store = RecentStore(POLLING_INTERVAL)
+
+# Port keys sent back by the worker processes for recent_ports in COLLECTION_MODE=process
+RECENT_PORT_FIELDS = ('chassisIp', 'cardNumber', 'fullyQualifiedPortName', 'owner', 'linkState',
+                      'transmitState', 'totalPorts', 'ownedPorts', 'freePorts')
+
+
+def record_fingerprint_counts(hits, misses):
+    """Export one cycle's fingerprint hit and miss counts"""
+    fingerprint_hits.labels('/ports').inc(hits)
+    fingerprint_misses.labels('/ports').inc(misses)
+    if hits + misses:
+        fingerprint_hit_ratio.labels('/ports').set(hits / (hits + misses))
+
+
+def record_recent_ports(chassisIp, port_list_details, observed_at):
+    """Make a polled chassis' ports its current state and record its totals"""
+    recent_ports.replace(chassisIp, port_list_details, observed_at)
+    if port_list_details:
+        for total in ('totalPorts', 'ownedPorts', 'freePorts'):
+            recent_store.record(total, {'chassis': chassisIp}, port_list_details[0][total], observed_at)
+
+
+def publish_port_events(events):
+    """Publish one cycle's transitions and return them as portEvents line protocol"""
+    for event in events:
+        port_events_total.labels(event["field"]).inc()
+    event_stream.publish(events)
+    return encode_events(events)
 
-def get_chassis_ports_information(session, chassisIp, chassisType):
-    """Method to get chassis port information from Ixia Chassis using RestPy"""
+
+def build_checkpoint(schedule):
+    """Working state kept across restarts: API keys, /ports fingerprints, port states, event numbering"""
+    state = Checkpoint('portInfoPoller')
+    state.register('schedule', schedule.snapshot, schedule.restore)
+    state.register('events', event_stream.snapshot, event_stream.restore)
+    worker_state.register(state)
+    return state
+
+
+def init_partition_worker(partition, snapshot, age):
+    """Collection worker initializer: continue from the partition's checkpointed state"""
+    worker_state.init_worker(partition, snapshot, age)
+
+
+def get_chassis_ports_information(session, chassisIp, chassisType, port_list=None):
+    """Method to get chassis port information from Ixia Chassis using RestPy
+    
+    port_list: already decoded /ports response, fetched here when omitted
+    """
     port_data_list = [] # Final port information list
     used_port_details = []
     total_ports = 0
     used_ports = 0
     
     last_update_at = datetime.now(timezone.utc).strftime("%m/%d/%Y, %H:%M:%S")
-    port_list = session.get_ports().data
-    
     keys_to_keep = ['owner', 
                     'cardNumber', 
                     'portNumber',
@@ -28,29 +128,27 @@ def get_chassis_ports_information(session, chassisIp, chassisType):
                     'linkState', 
                     'transmitState']
 
-    a = []
-    if port_list:
-        a = list(port_list[0].keys())
-        
-    # Removing the extra keys from port details json response
-    keys_to_remove = [x for x in a if x not in keys_to_keep]
+    if port_list is None:
+        # Very large port lists can be decoded incrementally while they download
+        if config.PORTS_STREAMING_DECODE:
+            port_list = session.iter_ports()
+        else:
+            port_list = session.get_ports().data or []
 
-    # Setting up Owner
-    for port_data in port_list:
-        if not port_data.get("owner"):
-            port_data["owner"] = "Free"
-            
-        for k in keys_to_remove:
-            port_data.pop(k, None)  # Use None as default to avoid KeyError if key doesn't exist
+    # Collection time, written as the points' timestamp (second precision)
+    collected_at = int(time.time())
     
-    # Creating the final port information list
+    # Keeping only the reported keys and setting up Owner in a single pass
     for port in port_list:
-        port_data_list.append(port)
+        port_data = {k: port[k] for k in keys_to_keep if k in port}
+        if not port_data.get("owner"):
+            port_data["owner"] = "Free"
+        port_data_list.append(port_data)
     
     # Lets get used ports, free ports and total ports
     if port_data_list:
-        used_port_details = [item for item in port_data_list if item.get("owner")]
-        total_ports = len(port_list)
+        used_port_details = [item for item in port_data_list if item.get("owner") != "Free"]
+        total_ports = len(port_data_list)
         used_ports = len(used_port_details)
         
     
@@ -58,6 +156,7 @@ def get_chassis_ports_information(session, chassisIp, chassisType):
     for port_data_list_item in port_data_list:
         port_data_list_item.update({
                                 "lastUpdatedAt_UTC": last_update_at,
+                                "collectedAt": collected_at,
                                 "totalPorts": total_ports,
                                 "ownedPorts": used_ports, 
                                 "freePorts": (total_ports-used_ports),
@@ -66,6 +165,30 @@ def get_chassis_ports_information(session, chassisIp, chassisType):
     return port_data_list # Final port information list
 
 
+def get_changed_ports_information(session, chassisIp, chassisType):
+    """Get chassis port information, skipping decode and transform when /ports is unchanged
+    
+    The raw /ports body is hashed first. When it matches the previous cycle the
+    cached port list is returned instead of decoding and filtering it again.
+    
+    Returns:
+        (port details, unchanged) where unchanged is True for a cached result
+    """
+    if not config.FINGERPRINT_UNCHANGED or config.PORTS_STREAMING_DECODE:
+        return get_chassis_ports_information(session, chassisIp, chassisType), False
+    
+    key = (chassisIp, '/ports')
+    response = session.get_ports(decode=False)
+    digest, cached = _fingerprints.lookup(key, response.content)
+    if cached is not None:
+        return cached, True
+    
+    port_data_list = get_chassis_ports_information(
+        session, chassisIp, chassisType, session.decode_response(response) or [])
+    _fingerprints.store(key, digest, port_data_list)
+    return port_data_list, False
+
+
 def poll_single_chassis(chassis):
     """Poll a single chassis and return its port data
     
@@ -73,25 +196,30 @@ def poll_single_chassis(chassis):
         chassis: Dictionary with 'ip', 'username', 'password'
     
     Returns:
-        List of port details for this chassis
+        (list of port details for this chassis, True if /ports was unchanged)
     """
     try:
-        session = IxRestSession(
-            chassis["ip"], 
-            chassis["username"], 
-            chassis["password"], 
-            verbose=False)
+        session = get_session(chassis)
         
-        port_list_details = get_chassis_ports_information(
+        port_list_details, unchanged = get_changed_ports_information(
             session, 
             chassis["ip"], 
             "NA")
         
-        print(f"✓ Successfully polled {chassis['ip']} - {len(port_list_details)} ports")
-        return port_list_details
+        if unchanged:
+            # A byte-identical body cannot contain transitions
+            print(f"✓ Successfully polled {chassis['ip']} - {len(port_list_details)} ports (unchanged)")
+        else:
+            event_count = _transitions.observe(chassis["ip"], port_list_details)
+            print(f"✓ Successfully polled {chassis['ip']} - {len(port_list_details)} ports, {event_count} transitions")
+        
+        record_recent_ports(chassis["ip"], port_list_details, time.time())
+        return port_list_details, unchanged
         
     except Exception as e:
         print(f"✗ Error polling {chassis['ip']}: {e}")
+        invalidate_session(chassis["ip"])
+        _fingerprints.forget((chassis["ip"], '/ports'))
         # Return error placeholder data
         return [{
             'owner': 'NA',
@@ -103,46 +231,105 @@ def poll_single_chassis(chassis):
             'linkState': 'NA',
             'cardNumber': 'NA',
             'lastUpdatedAt_UTC': 'NA',
+            'collectedAt': int(time.time()),
             'totalPorts': 'NA',
             'ownedPorts': 'NA',
             'freePorts': 'NA',
             'chassisIp': chassis["ip"],
             'typeOfChassis': 'NA',
             'transmitState': 'NA'
-        }]
+        }], False
 
 
-def get_chassis_port_data():
+def get_chassis_port_data(chassis_list=None):
     """Poll all chassis in parallel to get synchronized timestamps
     
+    Args:
+        chassis_list: Chassis to poll, defaults to config.CHASSIS_LIST
+    
     Returns:
-        Combined list of port details from all chassis
+        (combined list of port details from all chassis whose /ports changed,
+         dict of chassis IP -> port count for chassis whose /ports was unchanged)
     """
     all_port_details = []
+    unchanged_chassis = {}
+    if chassis_list is None:
+        chassis_list = config.CHASSIS_LIST
     
-    if not config.CHASSIS_LIST:
-        return all_port_details
+    if not chassis_list:
+        return all_port_details, unchanged_chassis
     
     # Use ThreadPoolExecutor to poll all chassis simultaneously
     # max_workers=None will use (number of processors) * 5 threads
     # For 10 chassis, you can also set max_workers=10 explicitly
-    with ThreadPoolExecutor(max_workers=len(config.CHASSIS_LIST)) as executor:
+    with ThreadPoolExecutor(max_workers=len(chassis_list)) as executor:
         # Submit all chassis polling tasks
         future_to_chassis = {
             executor.submit(poll_single_chassis, chassis): chassis 
-            for chassis in config.CHASSIS_LIST
+            for chassis in chassis_list
         }
         
         # Collect results as they complete
         for future in as_completed(future_to_chassis):
             chassis = future_to_chassis[future]
             try:
-                port_details = future.result()
-                all_port_details.extend(port_details)
+                port_details, unchanged = future.result()
+                if unchanged:
+                    unchanged_chassis[chassis['ip']] = len(port_details)
+                else:
+                    all_port_details.extend(port_details)
             except Exception as e:
                 print(f"✗ Unexpected error for {chassis['ip']}: {e}")
 
-    return all_port_details
+    return all_port_details, unchanged_chassis
+
+
+def collect_port_partition(chassis_list):
+    """Worker process entry point for COLLECTION_MODE=process
+    
+    Polls and transforms one partition of the fleet inside the worker and
+    returns it already encoded, so only line protocol, transitions and (with
+    the /recent endpoint enabled) the RECENT_PORT_FIELDS of the ports cross processes.
+    
+    Returns:
+        (line protocol payload, number of ports, fingerprint hits, fingerprint misses,
+         transition events, [(chassis IP, observed at, port tuples), ...],
+         worker_state.report())
+    """
+    started = time.time()
+    port_list_details, unchanged_chassis = get_chassis_port_data(chassis_list)
+    payload, port_count = encode_port_details(port_list_details, unchanged_chassis)
+    recent = []
+    if config.RECENT_PORT_OFFSET:
+        recent = [
+            (chassisIp, observed_at, [tuple(port.get(field) for field in RECENT_PORT_FIELDS) for port in ports])
+            for chassisIp, observed_at, ports in recent_ports.replaced_since(started)
+        ]
+    return (payload, port_count) + _fingerprints.take_counts() + (_transitions.take_events(), recent,
+                                                                   worker_state.report())
+
+
+def write_port_data_multiprocess():
+    """Collect all partitions in the worker processes and write them in one request
+    
+    Returns:
+        Number of ports written
+    """
+    pool = get_collection_pool(config.CHASSIS_LIST, config.COLLECTION_PROCESSES)
+    results = pool.map(collect_port_partition)
+    port_count = sum(result[1] for result in results)
+    record_fingerprint_counts(sum(result[2] for result in results),
+                              sum(result[3] for result in results))
+    event_lines = publish_port_events([event for result in results for event in result[4]])
+    for result in results:
+        for chassisIp, observed_at, ports in result[5]:
+            record_recent_ports(chassisIp, [dict(zip(RECENT_PORT_FIELDS, port)) for port in ports], observed_at)
+    worker_state.update(result[6] for result in results)
+    try:
+        write_line_protocol("\n".join([result[0] for result in results if result[0]] + event_lines), precision="s")
+    except Exception as e:
+        print(f"✗ Error writing {port_count} ports to portUtilization: {e}")
+    return port_count
 
 
 if __name__ == '__main__':
@@ -150,31 +337,75 @@ if __name__ == '__main__':
     # print("Deleting all data from InfluxDB measurement...")
     # delete_measurement_data()
     
+    # Pick up API keys, port snapshots and event numbering from before a restart
+    schedule = PollSchedule(POLLING_INTERVAL)
+    checkpoint = build_checkpoint(schedule)
+    checkpoint.restore()
+    checkpoint.save_on_sigterm()
+    if config.COLLECTION_MODE == 'process':
+        # The workers start from the restored sessions, fingerprints and port states
+        get_collection_pool(config.CHASSIS_LIST, config.COLLECTION_PROCESSES,
+                            init_partition_worker, worker_state.initargs)
+    
+    # Expose poller metrics (fingerprint hit/miss ratios) for Prometheus
+    start_http_server(config.PORT_INFO_METRICS_PORT)
+    
+    # Port transition events for downstream tools
+    if config.PORT_EVENTS_PORT:
+        event_stream.serve(config.PORT_EVENTS_PORT, config.PORT_EVENTS_BIND)
+    
     # Start parallel chassis poller
     print(f"Starting parallel chassis poller for {len(config.CHASSIS_LIST)} chassis...")
+    print(f"Metrics endpoint: http://localhost:{config.PORT_INFO_METRICS_PORT}/metrics")
+    if config.ADMIN_ENABLED:
+        print(f"Admin endpoint: http://localhost:{admin_server.start(config.PORT_INFO_METRICS_PORT)}/debug/threads")
+    recent_store.add_routes(recent_server)
+    recent_server.add_route('/recent/ports', recent_ports.query)
+    recent_port = start_recent_server(config.PORT_INFO_METRICS_PORT)
+    if recent_port:
+        print(f"Recent state endpoint: http://localhost:{recent_port}/recent")
+    if config.PORT_EVENTS_PORT:
+        print(f"Port events: http://localhost:{config.PORT_EVENTS_PORT}/events (long-poll), /events/stream (SSE)")
+    if config.PORT_EVENTS_FILE:
+        print(f"Port events file: {config.PORT_EVENTS_FILE}")
     print(f"Polling interval: {config.POLLING_INTERVAL} seconds")
+    print(f"Collection mode: {config.COLLECTION_MODE}")
     print(f"Chassis IPs: {[c['ip'] for c in config.CHASSIS_LIST]}")
     print("-" * 80)
     
-    poll_count = 0
+    # After a restart, keep the cadence of the previous process
+    time.sleep(schedule.initial_delay())
     while True:
-        poll_count += 1
+        poll_count = schedule.start_cycle()
+        admin_server.begin_cycle()
         start_time = time.time()
         
         print(f"\n[Poll #{poll_count}] Starting parallel poll at {datetime.now().strftime('%H:%M:%S')}")
         
-        # Poll all chassis in parallel
-        port_list_details = get_chassis_port_data()
-        
-        poll_duration = time.time() - start_time
-        print(f"[Poll #{poll_count}] Collected {len(port_list_details)} total ports in {poll_duration:.2f}s")
-        
-        # Write all data to InfluxDB (synchronized timestamps)
-        if port_list_details:
-            write_data_to_influxdb(port_list_details)
-            print(f"[Poll #{poll_count}] Written to InfluxDB")
+        if config.COLLECTION_MODE == 'process':
+            # Decode and transform in the worker processes, write from here
+            port_count = write_port_data_multiprocess()
+            poll_duration = time.time() - start_time
+            print(f"[Poll #{poll_count}] Collected and wrote {port_count} total ports in {poll_duration:.2f}s")
         else:
-            print(f"[Poll #{poll_count}] ⚠ No data collected")
+            # Poll all chassis in parallel
+            port_list_details, unchanged_chassis = get_chassis_port_data()
+            record_fingerprint_counts(*_fingerprints.take_counts())
+            event_lines = publish_port_events(_transitions.take_events())
+            
+            poll_duration = time.time() - start_time
+            print(f"[Poll #{poll_count}] Collected {len(port_list_details)} changed ports, "
+                  f"{len(unchanged_chassis)} chassis unchanged in {poll_duration:.2f}s")
+            
+            # Write all data to InfluxDB (synchronized timestamps)
+            if port_list_details or unchanged_chassis:
+                write_data_to_influxdb(port_list_details, unchanged_chassis, event_lines)
+                print(f"[Poll #{poll_count}] Written to InfluxDB")
+            else:
+                print(f"[Poll #{poll_count}] ⚠ No data collected")
+        
+        admin_server.end_cycle()
+        checkpoint.maybe_save()
         
         # Wait for next polling interval
         time.sleep(POLLING_INTERVAL)
@@ -0,0 +1,229 @@
+import time
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from prometheus_client import start_http_server
+
+from chassisSessions import get_session, invalidate_session, export_api_keys, restore_api_keys
+from adminServer import admin_server
+from checkpoint import Checkpoint, PollSchedule, WorkerState
+from collectionPool import get_collection_pool
+from counterRates import CounterRateTracker
+from influxDBclient import tag_prefix, write_line_protocol
+from config import (CHASSIS_LIST, POLLING_INTERVAL_PORT_STATS, PORT_STATS_COUNTERS, PORT_STATS_32BIT_COUNTERS,
+                    COLLECTION_MODE, COLLECTION_PROCESSES, PORT_STATS_METRICS_PORT,
+                    ADMIN_ENABLED)
+
+# Previous counter values per chassis, only the rates are written
+rate_trackers = {}
+
+# Chassis sessions are kept by the collection workers in COLLECTION_MODE=process
+worker_state = WorkerState({'api_keys': (export_api_keys, restore_api_keys)})
+
+
+def build_checkpoint(schedule):
+    """Working state kept across restarts: API keys and previous counter values"""
+    state = Checkpoint('portStatsPoller')
+    state.register('schedule', schedule.snapshot, schedule.restore)
+    state.register('rate_trackers',
+                   lambda: {ip: tracker.snapshot() for ip, tracker in rate_trackers.items()},
+                   restore_rate_trackers)
+    worker_state.register(state)
+    return state
+
+
+def init_partition_worker(partition, snapshot, age):
+    """Collection worker initializer: continue from the partition's checkpointed API keys"""
+    worker_state.init_worker(partition, snapshot, age)
+
+
+def restore_rate_trackers(snapshot, age):
+    """Continue from the checkpointed counters unless the configured counters changed"""
+    for chassisIp, tracker in snapshot.items():
+        if tracker["counters"] == PORT_STATS_COUNTERS:
+            rate_trackers[chassisIp] = CounterRateTracker.from_snapshot(tracker, PORT_STATS_32BIT_COUNTERS)
+
+
+def get_port_key(record):
+    """(card, port) tags of a /portstats record, matching the portUtilization tags"""
+    port = record.get("fullyQualifiedPortName")
+    if not port or port == "N/A":
+        port = record.get("portNumber", record.get("id", "NA"))
+    return str(record.get("cardNumber", "NA")), str(port)
+
+
+def get_port_counters(session, chassisIp):
+    """Method to get the port traffic counters from Ixia Chassis
+
+    Returns:
+        (chassisIp, collection time, port keys, (ports, counters) uint64 values,
+         (ports, counters) bool mask of the counters the chassis reported)
+    """
+    stats = session.get_portstats().data or []
+    collected_at = time.time()
+
+    # A port listed twice in one response keeps its last record, the tracker needs unique keys
+    records = {get_port_key(record): record for record in stats}
+    keys = list(records)
+    values = np.zeros((len(keys), len(PORT_STATS_COUNTERS)), dtype=np.uint64)
+    present = np.zeros(values.shape, dtype=bool)
+    for i, record in enumerate(records.values()):
+        for j, counter in enumerate(PORT_STATS_COUNTERS):
+            value = record.get(counter)
+            if value is not None and value != "NA":
+                values[i, j] = int(value)
+                present[i, j] = True
+    return chassisIp, collected_at, keys, values, present
+
+
+def poll_single_chassis(chassis):
+    """
+    Poll a single chassis for port statistics.
+
+    Args:
+        chassis (dict): Dictionary containing chassis ip, username, and password
+
+    Returns:
+        tuple: see get_port_counters, None on error
+    """
+    try:
+        session = get_session(chassis)
+        return get_port_counters(session, chassis['ip'])
+    except Exception as e:
+        print(f"❌ Error polling chassis {chassis['ip']}: {e}")
+        invalidate_session(chassis['ip'])
+        return None
+
+
+def collect_portstats_partition(chassis_list):
+    """Worker process entry point: poll one partition and return the raw counter arrays"""
+    with ThreadPoolExecutor(max_workers=len(chassis_list)) as executor:
+        samples = [c for c in executor.map(poll_single_chassis, chassis_list) if c]
+    return samples, worker_state.report()
+
+
+def encode_port_rates(chassisIp, collected_at, keys, rates):
+    """Encode one chassis' rates as portTraffic line protocol, skipping ports without a rate yet"""
+    lines = []
+    timestamp_ns = int(collected_at * 1e9)
+    field_names = [f"{counter}PerSec" for counter in PORT_STATS_COUNTERS]
+    for (card, port), row in zip(keys, rates):
+        fields = ",".join(
+            f"{name}={rate:.3f}" for name, rate in zip(field_names, row) if rate == rate
+        )
+        if fields:
+            prefix = tag_prefix("portTraffic", (("card", card), ("chassis", chassisIp), ("port", port)))
+            lines.append(f"{prefix} {fields} {timestamp_ns}")
+    return lines
+
+
+def get_port_traffic_rates():
+    """
+    Get port counters from all chassis in parallel and convert them to rates.
+
+    Returns:
+        list: portTraffic line protocol lines for this cycle
+    """
+    if not CHASSIS_LIST:
+        print("⚠️  No chassis configured in CHASSIS_LIST")
+        return []
+
+    if COLLECTION_MODE == 'process':
+        pool = get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES)
+        results = pool.map(collect_portstats_partition)
+        worker_state.update(report for _, report in results)
+        samples = [c for partition, _ in results for c in partition]
+    else:
+        samples = []
+        with ThreadPoolExecutor(max_workers=len(CHASSIS_LIST)) as executor:
+            future_to_chassis = {
+                executor.submit(poll_single_chassis, chassis): chassis
+                for chassis in CHASSIS_LIST
+            }
+            for future in as_completed(future_to_chassis):
+                chassis = future_to_chassis[future]
+                try:
+                    sample = future.result()
+                    if sample:
+                        samples.append(sample)
+                except Exception as e:
+                    print(f"❌ Exception processing chassis {chassis['ip']}: {e}")
+
+    # Rates are computed here so the previous values survive across cycles in either mode
+    lines = []
+    for chassisIp, collected_at, keys, values, present in samples:
+        tracker = rate_trackers.get(chassisIp)
+        if tracker is None:
+            tracker = rate_trackers[chassisIp] = CounterRateTracker(PORT_STATS_COUNTERS, PORT_STATS_32BIT_COUNTERS)
+        rates = tracker.update(keys, values, present, collected_at)
+        chassis_lines = encode_port_rates(chassisIp, collected_at, keys, rates)
+        lines.extend(chassis_lines)
+        print(f"✓ {chassisIp}: {len(keys)} ports, {len(chassis_lines)} with rates")
+    return lines
+
+
+# ==============================================================================
+# MAIN APPLICATION
+# ==============================================================================
+
+def main():
+    """
+    Main function to start the HTTP server and begin the port statistics monitoring loop.
+    """
+    # Pick up API keys and previous counter values from before a restart
+    schedule = PollSchedule(POLLING_INTERVAL_PORT_STATS)
+    checkpoint = build_checkpoint(schedule)
+    checkpoint.restore()
+    checkpoint.save_on_sigterm()
+    if COLLECTION_MODE == 'process':
+        # The workers log in with the restored API keys
+        get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES, init_partition_worker, worker_state.initargs)
+
+    # Start the HTTP server to expose poller metrics (e.g. rate limiter waits)
+    start_http_server(PORT_STATS_METRICS_PORT)
+
+    print("=" * 70)
+    print("Port Traffic Statistics Service Started")
+    print("=" * 70)
+    print(f"Metrics endpoint: http://localhost:{PORT_STATS_METRICS_PORT}/metrics")
+    if ADMIN_ENABLED:
+        print(f"Admin endpoint: http://localhost:{admin_server.start(PORT_STATS_METRICS_PORT)}/debug/threads")
+    print(f"Number of chassis: {len(CHASSIS_LIST)}")
+    print(f"Monitoring interval: {POLLING_INTERVAL_PORT_STATS} seconds")
+    print(f"Counters: {', '.join(PORT_STATS_COUNTERS)}")
+    print(f"Polling mode: Parallel ({'ProcessPoolExecutor' if COLLECTION_MODE == 'process' else 'ThreadPoolExecutor'})")
+    print("=" * 70)
+    print("\nPress Ctrl+C to stop.\n")
+
+    # After a restart, keep the cadence of the previous process
+    time.sleep(schedule.initial_delay())
+    while True:
+        poll_count = schedule.start_cycle()
+        admin_server.begin_cycle()
+        print(f"\n[Poll #{poll_count}] Starting parallel port statistics polling at {datetime.now().strftime('%H:%M:%S')}...")
+        start_time = time.time()
+
+        lines = get_port_traffic_rates()
+
+        # All rates of the cycle go out in one request through the batched sink
+        if lines:
+            try:
+                write_line_protocol("\n".join(lines))
+                print(f"✓ Written: {len(lines)} port rates to portTraffic")
+            except Exception as e:
+                print(f"✗ Error writing {len(lines)} port rates to portTraffic: {e}")
+
+        elapsed_time = time.time() - start_time
+        print(f"[Poll #{poll_count}] Completed in {elapsed_time:.2f} seconds")
+        print(f"Next poll in {POLLING_INTERVAL_PORT_STATS} seconds...\n")
+
+        admin_server.end_cycle()
+        checkpoint.maybe_save()
+        time.sleep(POLLING_INTERVAL_PORT_STATS)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nPort statistics monitoring stopped by user (Ctrl+C). Exiting...")
@@ -0,0 +1,279 @@
+"""
+Caching Flux query proxy for the Grafana dashboards
+
+Grafana's InfluxDB (Flux) datasource POSTs every panel query to
+/api/v2/query on each refresh, so a dashboard left open by many people
+re-runs the same pivots against InfluxDB over and over. Point the datasource
+at this proxy instead and it:
+
+  - rounds absolute range(start:, stop:) times to QUERY_CACHE_ALIGN seconds,
+    so refreshes a few seconds apart produce the same query
+  - caches the CSV result per (org, query, dialect) for QUERY_CACHE_TTL
+    seconds (the poll interval: nothing newer can exist before the next
+    write), or QUERY_CACHE_HISTORY_TTL when the range ends in the past
+  - sends identical concurrent queries to InfluxDB only once, the other
+    requests wait for that result
+  - forwards every other request (health checks, bucket lists) unchanged
+
+Queries run with the caller's own Authorization header (the datasource
+token), never with the pollers' token, and cached results are only shared
+between requests carrying the same token.
+
+Hit rate, coalesced requests and backend latency are exported at /metrics.
+
+Usage:
+    python queryProxy.py
+    # Grafana datasource URL: http://<host>:8087 (http://host.docker.internal:8087 from Docker)
+"""
+
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+import influxDBclient
+from config import (QUERY_PROXY_PORT, QUERY_CACHE_ALIGN, QUERY_CACHE_TTL,
+                    QUERY_CACHE_HISTORY_TTL, QUERY_CACHE_MAX_MB)
+
+# ==============================================================================
+# PROMETHEUS METRIC DEFINITIONS
+# ==============================================================================
+
+query_cache_requests = Counter(
+    'ixos_query_cache_requests_total',
+    'Flux queries received by the proxy, by how they were answered (hit, miss, coalesced)',
+    ['result']
+)
+
+query_backend_seconds = Histogram(
+    'ixos_query_backend_seconds',
+    'Time InfluxDB took to answer the queries the proxy forwarded',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+query_cache_bytes = Gauge(
+    'ixos_query_cache_bytes',
+    'Size of the cached query results'
+)
+
+# range(start: 2025-11-09T22:41:38.123Z, stop: ...) with absolute times
+_RANGE = re.compile(r'range\(\s*start:\s*([0-9T:\-.]+Z)\s*(?:,\s*stop:\s*([0-9T:\-.]+Z)\s*)?\)')
+
+
+def _parse_rfc3339(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _format_rfc3339(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def normalize_query(query, align=QUERY_CACHE_ALIGN):
+    """Round absolute range() times outward to `align` seconds
+
+    Returns:
+        (normalized query, range stop in epoch seconds or None when the range is relative)
+    """
+    stops = []
+
+    def align_range(match):
+        start = int(_parse_rfc3339(match.group(1)) // align * align)
+        if match.group(2) is None:
+            return f"range(start: {_format_rfc3339(start)})"
+        stop = -int(-_parse_rfc3339(match.group(2)) // align * align)
+        stops.append(stop)
+        return f"range(start: {_format_rfc3339(start)}, stop: {_format_rfc3339(stop)})"
+
+    normalized = _RANGE.sub(align_range, query)
+    return normalized, (max(stops) if stops and len(stops) == len(_RANGE.findall(query)) else None)
+
+
+class QueryCache(object):
+    """
+    LRU cache of raw query results with per-entry expiry and request coalescing
+    max_bytes:  total size of cached results before the least recently used are dropped
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl, fetch):
+        """Return the cached result for key, or run fetch() once for all concurrent callers
+
+        Returns:
+            (result bytes, 'hit' | 'miss' | 'coalesced')
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[1], 'hit'
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = {"done": threading.Event(), "result": None, "error": None}
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            waiter["done"].wait()
+            if waiter["error"] is not None:
+                raise waiter["error"]
+            return waiter["result"], 'coalesced'
+
+        try:
+            result = fetch()
+            waiter["result"] = result
+            self._store(key, ttl, result)
+            return result, 'miss'
+        except Exception as e:
+            waiter["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter["done"].set()
+
+    def _store(self, key, ttl, result):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            if len(result) <= self.max_bytes:
+                self._entries[key] = (time.monotonic() + ttl, result)
+                self.size += len(result)
+            while self.size > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+            query_cache_bytes.set(self.size)
+
+
+_cache = QueryCache(QUERY_CACHE_MAX_MB * 1024 * 1024)
+
+
+class InfluxQueryError(Exception):
+    """A query InfluxDB answered with an error, passed back to the caller as is"""
+
+    def __init__(self, status, content_type, body):
+        super(InfluxQueryError, self).__init__(f"InfluxDB answered {status}")
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+
+def run_query(params, body, authorization):
+    """Send one query body to InfluxDB with the caller's credentials and return the raw CSV"""
+    started = time.perf_counter()
+    response = requests.post(
+        influxDBclient.url + "/api/v2/query", params=params, data=json.dumps(body),
+        headers={"Authorization": authorization, "Content-Type": "application/json", "Accept": "application/csv"},
+        timeout=300,
+    )
+    query_backend_seconds.observe(time.perf_counter() - started)
+    if response.status_code != 200:
+        raise InfluxQueryError(response.status_code, response.headers.get("Content-Type", "application/json"),
+                               response.content)
+    return response.content
+
+
+def cached_query(params, body, authorization):
+    """Answer a /api/v2/query body from the cache, querying InfluxDB at most once per key"""
+    query, stop = normalize_query(body["query"])
+    body = dict(body, query=query)
+    if "org" not in params and "orgID" not in params:
+        params = dict(params, org=influxDBclient.org)
+    # Ranges that ended before the latest poll can no longer change
+    history = stop is not None and stop < time.time() - QUERY_CACHE_TTL
+    # Results are only shared between callers with the same token
+    key = (hashlib.sha256(authorization.encode()).hexdigest(),
+           json.dumps(params, sort_keys=True), json.dumps(body, sort_keys=True))
+    result, how = _cache.get(key, QUERY_CACHE_HISTORY_TTL if history else QUERY_CACHE_TTL,
+                             lambda: run_query(params, body, authorization))
+    query_cache_requests.labels(how).inc()
+    return result
+
+
+class QueryProxyHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if url.path != "/api/v2/query":
+            return self.forward("POST", body)
+        authorization = self.headers.get("Authorization")
+        if not authorization:
+            return self.respond(401, "application/json", json.dumps(
+                {"code": "unauthorized", "message": "queries need the caller's InfluxDB token"}).encode())
+        try:
+            request = json.loads(body)
+            if request.get("type", "flux") != "flux" or "query" not in request:
+                return self.forward("POST", body)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            result = cached_query(params, request, authorization)
+        except ValueError as e:
+            return self.respond(400, "application/json", json.dumps({"code": "invalid", "message": str(e)}).encode())
+        except InfluxQueryError as e:
+            return self.respond(e.status, e.content_type, e.body)
+        except Exception as e:
+            status = getattr(e, "status", None) or 502
+            return self.respond(status, "application/json",
+                                json.dumps({"code": "internal error", "message": str(e)}).encode())
+        self.respond(200, "text/csv; charset=utf-8", result)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            return self.respond(200, CONTENT_TYPE_LATEST, generate_latest())
+        self.forward("GET")
+
+    def forward(self, method, body=None):
+        """Pass a request through to InfluxDB unchanged"""
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in ("host", "content-length")}
+        try:
+            response = requests.request(method, influxDBclient.url + self.path, data=body,
+                                        headers=headers, timeout=60)
+        except requests.RequestException as e:
+            return self.respond(502, "text/plain", str(e).encode())
+        self.respond(response.status_code, response.headers.get("Content-Type", "application/json"), response.content)
+
+    def respond(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("0.0.0.0", QUERY_PROXY_PORT), QueryProxyHandler)
+    server.daemon_threads = True
+    print("=" * 70)
+    print("Flux Query Cache Proxy Started")
+    print("=" * 70)
+    print(f"Proxy endpoint: http://localhost:{QUERY_PROXY_PORT}/api/v2/query -> {influxDBclient.url}")
+    print(f"Metrics endpoint: http://localhost:{QUERY_PROXY_PORT}/metrics")
+    print(f"Range alignment: {QUERY_CACHE_ALIGN}s, TTL: {QUERY_CACHE_TTL}s (history {QUERY_CACHE_HISTORY_TTL}s), "
+          f"max {QUERY_CACHE_MAX_MB} MB")
+    print("=" * 70)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nQuery proxy stopped by user (Ctrl+C). Exiting...")
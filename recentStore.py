@@ -0,0 +1,222 @@
+"""
+In-memory store of the recent samples a poller collected
+
+Each series (metric name + labels) keeps its last RECENT_WINDOW seconds of
+samples in a fixed-size ring of two numpy arrays (timestamps, values), sized
+from the poller's interval and capped at RECENT_MAX_SAMPLES. Nothing is
+allocated per sample once a series exists, so memory stays bounded however
+long the poller runs.
+
+The store answers on the poller's /recent endpoint (metrics port + 300, see
+RECENT_BIND to reach it from other hosts; it serves nothing but these
+routes), straight from memory:
+
+    GET /recent
+        Metrics held, series counts, window and memory used
+    GET /recent/latest?metric=cpu_utilization[&chassis=10.36.236.121&...]
+        Latest sample of every matching series
+    GET /recent/series?metric=cpu_utilization[&range=900][&chassis=...]
+        Samples of the last `range` seconds of every matching series
+    GET /recent/ports?chassis=10.36.236.121&owner=Free   (portInfoPoller)
+        Current state of the matching ports
+
+Query parameters other than metric, range and since filter on labels (on
+row fields for /recent/ports). Every response reports the time it took in
+microseconds (took_us).
+"""
+
+import time
+import threading
+
+import numpy as np
+
+from config import RECENT_WINDOW, RECENT_MAX_SAMPLES
+
+# Query parameters that are not label matchers
+_RESERVED_PARAMS = ('metric', 'range', 'since')
+
+
+class SeriesRing(object):
+    """Last `capacity` (timestamp, value) samples of one series"""
+
+    __slots__ = ('times', 'values', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def last(self):
+        if not self.count:
+            return None
+        i = self.head - 1
+        return float(self.times[i]), float(self.values[i])
+
+    def since(self, start):
+        """[[timestamp, value], ...] of the samples at or after start, oldest first"""
+        if self.count < len(self.times):
+            times, values = self.times[:self.count], self.values[:self.count]
+        else:
+            times = np.concatenate((self.times[self.head:], self.times[:self.head]))
+            values = np.concatenate((self.values[self.head:], self.values[:self.head]))
+        first = int(np.searchsorted(times, start))
+        return np.column_stack((times[first:], values[first:])).tolist()
+
+
+class RecentStore(object):
+    """
+    Ring buffers of the recent samples of every series a poller records
+    interval:       poll interval of the poller, sizes the rings to cover window
+    window:         seconds of samples kept and queryable
+    max_samples:    upper bound of samples per series
+    """
+
+    def __init__(self, interval, window=RECENT_WINDOW, max_samples=RECENT_MAX_SAMPLES):
+        self.window = window
+        self.capacity = max(2, min(max_samples, int(window // max(interval, 1)) + 1))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, metric, labels, value, timestamp):
+        """Append one sample; labels is a dict of strings"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(metric, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = (dict(labels), SeriesRing(self.capacity))
+            entry[1].append(timestamp, value)
+
+    def record_samples(self, samples):
+        """Append the (metric, labels, value, timestamp) samples of a CycleSamples.take()"""
+        for metric, labels, value, timestamp in samples:
+            self.record(metric, labels, value, timestamp)
+
+    def _matching(self, params):
+        metric = params.get('metric')
+        if metric is None:
+            raise ValueError(f"metric is required, one of: {', '.join(sorted(self._series))}")
+        matchers = {k: v for k, v in params.items() if k not in _RESERVED_PARAMS}
+        stale_before = time.time() - self.window
+        for labels, ring in self._series.get(metric, {}).values():
+            if all(labels.get(name) == value for name, value in matchers.items()):
+                last = ring.last()
+                if last is not None and last[0] >= stale_before:
+                    yield labels, ring, last
+
+    # Routes
+
+    def latest(self, params):
+        started = time.perf_counter()
+        with self._lock:
+            result = [{"labels": labels, "time": last[0], "value": last[1]}
+                      for labels, _, last in self._matching(params)]
+        return {"metric": params.get('metric'), "series": result,
+                "took_us": round((time.perf_counter() - started) * 1e6, 1)}
+
+    def series(self, params):
+        started = time.perf_counter()
+        if 'since' in params:
+            start = float(params['since'])
+        else:
+            start = time.time() - min(float(params.get('range', self.window)), self.window)
+        with self._lock:
+            result = [{"labels": labels, "points": ring.since(start)}
+                      for labels, ring, _ in self._matching(params)]
+        return {"metric": params.get('metric'), "since": start, "series": result,
+                "took_us": round((time.perf_counter() - started) * 1e6, 1)}
+
+    def index(self, params):
+        with self._lock:
+            metrics = {metric: len(series) for metric, series in self._series.items()}
+        series_count = sum(metrics.values())
+        return {
+            "window": self.window,
+            "samples_per_series": self.capacity,
+            "metrics": metrics,
+            "memory_bytes": series_count * self.capacity * 16,
+        }
+
+    def add_routes(self, admin):
+        admin.add_route('/recent', self.index)
+        admin.add_route('/recent/latest', self.latest)
+        admin.add_route('/recent/series', self.series)
+
+
+class CycleSamples(object):
+    """
+    Gauge values a poller set during the current cycle, each stamped with the
+    time its chassis was collected. Only these go to the RecentStore and the
+    remote_write push, so a chassis that failed to poll adds no samples and
+    its series goes stale instead of repeating the last value.
+    """
+
+    def __init__(self):
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def set(self, gauge, labels, value, timestamp):
+        """Set gauge.labels(**labels) to value and keep the sample, collected at `timestamp`"""
+        (gauge.labels(**labels) if labels else gauge).set(value)
+        sample = (gauge.describe()[0].name, {k: str(v) for k, v in labels.items()}, float(value), timestamp)
+        with self._lock:
+            self._samples.append(sample)
+
+    def take(self):
+        """Samples set since the last take(), as (metric, labels, value, timestamp)"""
+        with self._lock:
+            samples, self._samples = self._samples, []
+        return samples
+
+
+class StateTable(object):
+    """
+    Latest rows of a poller, replaced group by group (e.g. all ports of a chassis) every cycle
+    fields:     {name in the response: key in the stored rows}
+    group_by:   field whose value is the group, a filter on it only scans that group
+    window:     groups not replaced for this many seconds are left out of queries
+    """
+
+    def __init__(self, fields, group_by=None, window=RECENT_WINDOW):
+        self.fields = fields
+        self.group_by = group_by
+        self.window = window
+        self._groups = {}
+
+    def replace(self, group, rows, timestamp):
+        """Make rows (dicts, not copied) the current state of group"""
+        self._groups[group] = (timestamp, rows)
+
+    def replaced_since(self, timestamp):
+        """[(group, timestamp, rows), ...] of the groups replaced at or after timestamp"""
+        return [(group, observed_at, rows) for group, (observed_at, rows) in list(self._groups.items())
+                if observed_at >= timestamp]
+
+    def query(self, params):
+        started = time.perf_counter()
+        unknown = set(params) - set(self.fields)
+        if unknown:
+            raise ValueError(f"unknown filter {', '.join(sorted(unknown))}, filters: {', '.join(self.fields)}")
+        matchers = [(self.fields[name], value) for name, value in params.items()]
+        stale_before = time.time() - self.window
+        result = []
+        if self.group_by in params:
+            groups = [self._groups.get(params[self.group_by], (0, ()))]
+        else:
+            groups = list(self._groups.values())
+        for observed_at, rows in groups:
+            if observed_at < stale_before:
+                continue
+            for row in rows:
+                if all(str(row.get(key)) == value for key, value in matchers):
+                    entry = {name: row.get(key) for name, key in self.fields.items()}
+                    entry["observedAt"] = observed_at
+                    result.append(entry)
+        return {"count": len(result), "rows": result, "took_us": round((time.perf_counter() - started) * 1e6, 1)}
@@ -0,0 +1,398 @@
+"""
+Push mode for the poller metrics: Prometheus remote_write
+
+Scraping samples the pollers' gauges on Prometheus' schedule (30s in
+prometheus.yml), not on the pollers' (10s sensors, 60s perf metrics), so
+readings are skipped or scraped twice, and Prometheus has to reach every
+poller host. With REMOTE_WRITE_URL set, sensorsPoller and perfMetricsPoller
+also push the samples each cycle set, stamped with the time their chassis was
+collected, to a remote_write endpoint (Prometheus started with
+--web.enable-remote-write-receiver, Mimir, Thanos receive, VictoriaMetrics).
+
+Samples go into a bounded in-memory buffer (REMOTE_WRITE_MAX_BUFFER, the
+oldest are dropped when it is full) and a background thread sends them in
+batches of REMOTE_WRITE_BATCH_SIZE as snappy-compressed protobuf
+WriteRequests. Connection errors, 5xx and 429 responses are retried with
+exponential backoff; a batch that still fails goes back into the buffer for
+the next flush. Other 4xx responses (e.g. out-of-order samples) drop the batch.
+
+The protobuf and snappy encoding are done here so no extra package is
+needed; python-snappy is used for compression when it is installed.
+
+A stand-in receiver prints what it receives, e.g. to try the push mode
+without Prometheus:
+    python remoteWrite.py --receive 9201 [--fail 3]
+    REMOTE_WRITE_URL=http://localhost:9201/api/v1/write python sensorsPoller.py
+"""
+
+import sys
+import time
+import atexit
+import socket
+import struct
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+from prometheus_client import Counter, Gauge
+
+from config import (REMOTE_WRITE_URL, REMOTE_WRITE_BATCH_SIZE, REMOTE_WRITE_MAX_BUFFER,
+                    REMOTE_WRITE_FLUSH_INTERVAL, REMOTE_WRITE_RETRIES)
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+# ==============================================================================
+# PROMETHEUS METRIC DEFINITIONS
+# ==============================================================================
+
+remote_write_samples = Counter(
+    'ixos_remote_write_samples_total',
+    'Samples handled by the remote_write push, by result (sent, dropped, rejected)',
+    ['result']
+)
+
+remote_write_buffer_samples = Gauge(
+    'ixos_remote_write_buffer_samples',
+    'Samples waiting in the remote_write buffer'
+)
+
+# Longest wait between two attempts to send a batch, in seconds
+MAX_BACKOFF = 30
+
+
+# ==============================================================================
+# ENCODING (remote_write 1.0: snappy block format over protobuf WriteRequest)
+# ==============================================================================
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _length_delimited(field_tag, payload):
+    return field_tag + _varint(len(payload)) + payload
+
+
+def encode_write_request(samples):
+    """Protobuf WriteRequest of (labels, value, timestamp ms) samples, labels a sorted tuple of pairs"""
+    series = {}
+    for labels, value, timestamp in samples:
+        series.setdefault(labels, []).append((timestamp, value))
+    request = bytearray()
+    for labels, points in series.items():
+        body = bytearray()
+        for name, value in labels:
+            body += _length_delimited(b'\x0a', _length_delimited(b'\x0a', name.encode())
+                                      + _length_delimited(b'\x12', value.encode()))
+        for timestamp, value in sorted(points):
+            body += _length_delimited(b'\x12', b'\x09' + struct.pack('<d', value) + b'\x10' + _varint(timestamp))
+        request += _length_delimited(b'\x0a', bytes(body))
+    return bytes(request)
+
+
+def decode_write_request(data):
+    """{labels dict as sorted tuple: [(timestamp ms, value), ...]} of a WriteRequest"""
+    def fields(buffer):
+        pos = 0
+        while pos < len(buffer):
+            key, pos = _read_varint(buffer, pos)
+            wire_type = key & 7
+            if wire_type == 0:
+                value, pos = _read_varint(buffer, pos)
+            elif wire_type == 1:
+                value, pos = buffer[pos:pos + 8], pos + 8
+            else:
+                length, pos = _read_varint(buffer, pos)
+                value, pos = buffer[pos:pos + length], pos + length
+            yield key >> 3, value
+
+    result = {}
+    for _, series in fields(data):
+        labels, points = [], []
+        for number, value in fields(series):
+            parts = dict(fields(value))
+            if number == 1:
+                labels.append((parts.get(1, b'').decode(), parts.get(2, b'').decode()))
+            else:
+                points.append((parts.get(2, 0), struct.unpack('<d', parts.get(1, bytes(8)))[0]))
+        result.setdefault(tuple(labels), []).extend(points)
+    return result
+
+
+def _snappy_literal(data):
+    size = len(data) - 1
+    if size < 60:
+        return bytes([size << 2]) + data
+    width = (size.bit_length() + 7) // 8
+    return bytes([(59 + width) << 2]) + size.to_bytes(width, 'little') + data
+
+
+def snappy_compress(data):
+    """Snappy block format, with python-snappy when installed"""
+    if snappy is not None:
+        return snappy.compress(data)
+    out = bytearray(_varint(len(data)))
+    table = {}
+    pos = literal_start = 0
+    end = len(data)
+    while pos + 4 <= end:
+        key = data[pos:pos + 4]
+        candidate = table.get(key)
+        table[key] = pos
+        if candidate is None or pos - candidate > 0xffff:
+            pos += 1
+            continue
+        length = 4
+        while pos + length < end and length < 64 and data[candidate + length] == data[pos + length]:
+            length += 1
+        if literal_start < pos:
+            out += _snappy_literal(data[literal_start:pos])
+        # copy with a 2-byte offset
+        out += bytes([((length - 1) << 2) | 2]) + (pos - candidate).to_bytes(2, 'little')
+        pos += length
+        literal_start = pos
+    if literal_start < end:
+        out += _snappy_literal(data[literal_start:])
+    return bytes(out)
+
+
+def snappy_decompress(data):
+    if snappy is not None:
+        return snappy.uncompress(data)
+    expected, pos = _read_varint(data, 0)
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                width = size - 59
+                size = int.from_bytes(data[pos:pos + width], 'little')
+                pos += width
+            out += data[pos:pos + size + 1]
+            pos += size + 1
+            continue
+        if kind == 1:
+            length, offset = ((tag >> 2) & 7) + 4, ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        elif kind == 2:
+            length, offset = (tag >> 2) + 1, int.from_bytes(data[pos:pos + 2], 'little')
+            pos += 2
+        else:
+            length, offset = (tag >> 2) + 1, int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+        for _ in range(length):
+            out.append(out[-offset])
+    if len(out) != expected:
+        raise ValueError(f"snappy: decoded {len(out)} bytes, expected {expected}")
+    return bytes(out)
+
+
+# ==============================================================================
+# PUSH
+# ==============================================================================
+
+class RemoteWriter(object):
+    """
+    Bounded buffer of samples and the thread that pushes them
+    job:            value of the job label, the poller name
+    instance:       value of the instance label, defaults to the host name
+    """
+
+    def __init__(self, job, url=REMOTE_WRITE_URL, instance=None, batch_size=REMOTE_WRITE_BATCH_SIZE,
+                 max_buffer=REMOTE_WRITE_MAX_BUFFER, flush_interval=REMOTE_WRITE_FLUSH_INTERVAL,
+                 retries=REMOTE_WRITE_RETRIES, timeout=10):
+        self.url = url
+        self.job = job
+        self.instance = instance or socket.gethostname()
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.timeout = timeout
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._http = requests.Session()
+        self._http.headers.update({
+            'Content-Encoding': 'snappy',
+            'Content-Type': 'application/x-protobuf',
+            'User-Agent': 'ixos-pollers',
+            'X-Prometheus-Remote-Write-Version': '0.1.0',
+        })
+
+    def start(self):
+        """Start the push thread, remaining samples are flushed once more at exit"""
+        self._thread = threading.Thread(target=self._run, name=f"remoteWrite-{self.job}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def push_samples(self, samples):
+        """Queue the (metric, labels, value, timestamp) samples of a CycleSamples.take(), timestamps in epoch seconds"""
+        queued = []
+        for metric, labels, value, timestamp in samples:
+            labels = dict(labels, __name__=metric, job=self.job, instance=self.instance)
+            queued.append((tuple(sorted(labels.items())), value, int(timestamp * 1000)))
+        self.push(queued)
+
+    def push(self, samples):
+        """Queue (sorted label pairs, value, timestamp ms) samples, dropping the oldest beyond max_buffer"""
+        with self._lock:
+            self._buffer.extend(samples)
+            self._trim()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self):
+        dropped = len(self._buffer) - self.max_buffer
+        for _ in range(max(dropped, 0)):
+            self._buffer.popleft()
+        if dropped > 0:
+            remote_write_samples.labels('dropped').inc(dropped)
+        remote_write_buffer_samples.set(len(self._buffer))
+
+    def _take_batch(self):
+        with self._lock:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            remote_write_buffer_samples.set(len(self._buffer))
+        return batch
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._buffer.extendleft(reversed(batch))
+            self._trim()
+
+    def send(self, batch, retries=None):
+        """Send one batch, retrying what may succeed later
+
+        Returns:
+            True when the batch was accepted or rejected for good, False to try it again later
+        """
+        body = snappy_compress(encode_write_request(batch))
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                response = self._http.post(self.url, data=body, timeout=self.timeout)
+                if response.status_code < 300:
+                    remote_write_samples.labels('sent').inc(len(batch))
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    print(f"✗ remote_write rejected {len(batch)} samples: "
+                          f"{response.status_code} {response.text[:200].strip()}")
+                    remote_write_samples.labels('rejected').inc(len(batch))
+                    return True
+                error = f"{response.status_code} {response.reason}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < retries and not self._stopped:
+                time.sleep(min(MAX_BACKOFF, 0.5 * 2 ** attempt))
+        print(f"⚠️  remote_write to {self.url} failed ({error}), keeping {len(batch)} samples for the next flush")
+        return False
+
+    def flush(self, retries=None):
+        """Send everything buffered, stop at the first batch that cannot be sent"""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return True
+            if not self.send(batch, retries):
+                self._requeue(batch)
+                return False
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the thread and try once to send what is left"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self.flush(retries=0)
+
+
+def start_remote_writer(job):
+    """RemoteWriter for a poller when REMOTE_WRITE_URL is set, else None"""
+    if not REMOTE_WRITE_URL:
+        return None
+    return RemoteWriter(job).start()
+
+
+# ==============================================================================
+# STAND-IN RECEIVER
+# ==============================================================================
+
+def run_receiver(port, fail=0):
+    """Accept remote_write requests on /api/v1/write and print them, answering the first `fail` with 503"""
+    state = {"requests": 0}
+
+    class ReceiverHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            state["requests"] += 1
+            if state["requests"] <= fail:
+                print(f"✗ request {state['requests']}: answering 503")
+                self.send_response(503)
+                self.end_headers()
+                return
+            try:
+                series = decode_write_request(snappy_decompress(body))
+            except Exception as e:
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(str(e).encode())
+                return
+            samples = sum(len(points) for points in series.values())
+            print(f"✓ request {state['requests']}: {len(series)} series, {samples} samples, {len(body)} bytes")
+            for labels, points in list(series.items())[:5]:
+                labels = dict(labels)
+                name = labels.pop("__name__", "")
+                print(f"    {name}{labels} {points}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Stand-in remote_write receiver on http://localhost:{port}/api/v1/write")
+    HTTPServer(("0.0.0.0", port), ReceiverHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in remote_write receiver")
+    parser.add_argument("--receive", type=int, default=9201, metavar="PORT")
+    parser.add_argument("--fail", type=int, default=0, help="Answer the first N requests with 503")
+    args = parser.parse_args()
+    try:
+        run_receiver(args.receive, args.fail)
+    except KeyboardInterrupt:
+        sys.exit(0)
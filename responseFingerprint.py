@@ -0,0 +1,78 @@
+"""
+Raw-response fingerprinting
+
+Most chassis return a byte-identical /ports body between consecutive
+cycles. Hashing the raw bytes is much cheaper than decoding and
+transforming them, so the poller keeps the hash and the processed result
+of the previous cycle per (chassis, endpoint) and reuses the result when
+the hash matches.
+"""
+
+import time
+import hashlib
+import threading
+
+
+class ResponseFingerprintCache(object):
+    """
+    Last body hash and processed result per (chassis, endpoint) key
+    max_age:    seconds after which an entry is treated as a miss even if
+                the body is unchanged, so unchanged data is still rewritten
+                periodically
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(content):
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    def lookup(self, key, content):
+        """Hash a raw body and look for the previous cycle's result
+
+        Returns:
+            (digest, cached result or None on a miss)
+        """
+        digest = self.digest(content)
+        entry = self._entries.get(key)
+        with self._lock:
+            if entry is not None and entry[0] == digest and time.monotonic() - entry[1] < self.max_age:
+                self.hits += 1
+                return digest, entry[2]
+            self.misses += 1
+        return digest, None
+
+    def store(self, key, digest, result):
+        """Remember the processed result of a body"""
+        with self._lock:
+            self._entries[key] = (digest, time.monotonic(), result)
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def snapshot(self):
+        """Entries as [[key, digest hex, age in seconds, result], ...]"""
+        now = time.monotonic()
+        with self._lock:
+            return [[list(key), digest.hex(), now - stored, result]
+                    for key, (digest, stored, result) in self._entries.items()]
+
+    def restore(self, snapshot, age=0):
+        """Reload snapshot() entries, aged by the age of the checkpoint"""
+        now = time.monotonic()
+        with self._lock:
+            for key, digest, entry_age, result in snapshot:
+                self._entries[tuple(key)] = (bytes.fromhex(digest), now - entry_age - age, result)
+
+    def take_counts(self):
+        """Return (hits, misses) since the last call and reset them"""
+        with self._lock:
+            counts = (self.hits, self.misses)
+            self.hits = self.misses = 0
+        return counts
@@ -94,11 +94,20 @@ else
     echo "✓ Started sensorsPoller.py (PID: $!)"
 fi
 
+# Start portStatsPoller
+if pgrep -f "portStatsPoller.py" > /dev/null; then
+    echo "⚠️  portStatsPoller.py is already running (PID: $(pgrep -f portStatsPoller.py))"
+else
+    nohup python3 portStatsPoller.py > portStatsPoller.log 2>&1 &
+    echo "✓ Started portStatsPoller.py (PID: $!)"
+fi
+
 echo ""
 echo "View logs:"
 echo "  tail -f ./logs/portInfoPoller.log"
 echo "  tail -f ./logs/perfMetricsPoller.log"
 echo "  tail -f ./logs/sensorsPoller.log"
+echo "  tail -f ./logs/portStatsPoller.log"
 echo ""
 echo "Stop: sh ./stop_pollers.sh"
 echo ""
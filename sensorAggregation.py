@@ -0,0 +1,152 @@
+"""
+Fleet-level aggregation of chassis sensor readings
+
+Each cycle's sensor list is loaded once into a columnar NumPy structure
+(chassis index, sensor type, unit, value). All per-chassis counts and
+fleet statistics are then computed with vectorized operations instead of
+repeated passes over the list of dictionaries.
+"""
+
+import numpy as np
+
+# Unit codes used in the columnar frame
+UNIT_CELSIUS = 0
+UNIT_AMPERAGE = 1
+UNIT_PERCENTAGE = 2
+UNIT_OTHER = 3
+
+UNIT_CODES = {
+    'CELSIUS': UNIT_CELSIUS,
+    'AMPERAGE': UNIT_AMPERAGE,
+    'PERCENTAGE': UNIT_PERCENTAGE,
+}
+
+# Fans whose robust z-score exceeds this are reported as outliers
+FAN_OUTLIER_Z_SCORE = 3.5
+
+
+class SensorFrame(object):
+    """
+    Columnar view of one polling cycle's sensor readings
+    chassis_names:  chassis IPs, indexed by chassis_idx
+    sensor_types:   sensor type strings (e.g. 'CPU'), indexed by type_idx
+    chassis_idx:    int array, chassis of each reading
+    type_idx:       int array, sensor type of each reading
+    unit:           int array, one of the UNIT_* codes
+    values:         float array, raw reading (fans in percent)
+    """
+
+    def __init__(self, chassis_names, sensor_types, chassis_idx, type_idx, unit, values):
+        self.chassis_names = chassis_names
+        self.sensor_types = sensor_types
+        self.chassis_idx = chassis_idx
+        self.type_idx = type_idx
+        self.unit = unit
+        self.values = values
+
+    @classmethod
+    def from_sensor_list(cls, sensor_list):
+        """Build a frame from the dictionaries returned by get_sensor_information"""
+        chassis_lookup = {}
+        type_lookup = {}
+        count = len(sensor_list)
+        chassis_idx = np.empty(count, dtype=np.int32)
+        type_idx = np.empty(count, dtype=np.int32)
+        unit = np.empty(count, dtype=np.int8)
+        values = np.empty(count, dtype=np.float64)
+
+        for i, sensor in enumerate(sensor_list):
+            chassis_idx[i] = chassis_lookup.setdefault(sensor['chassisIp'], len(chassis_lookup))
+            type_idx[i] = type_lookup.setdefault(sensor['type'], len(type_lookup))
+            unit[i] = UNIT_CODES.get(sensor['unit'], UNIT_OTHER)
+            try:
+                values[i] = float(sensor['value'])
+            except (TypeError, ValueError):
+                values[i] = np.nan
+
+        return cls(list(chassis_lookup), list(type_lookup), chassis_idx, type_idx, unit, values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def chassis_sensor_counts(self):
+        """Count CPU temperature, current and fan sensors per chassis
+
+        Returns:
+            dict: chassis IP -> (cpu_temps, currents, fans)
+        """
+        n = len(self.chassis_names)
+        cpu_code = self.sensor_types.index('CPU') if 'CPU' in self.sensor_types else -1
+        cpu_temps = np.bincount(self.chassis_idx[(self.unit == UNIT_CELSIUS) & (self.type_idx == cpu_code)], minlength=n)
+        currents = np.bincount(self.chassis_idx[self.unit == UNIT_AMPERAGE], minlength=n)
+        fans = np.bincount(self.chassis_idx[self.unit == UNIT_PERCENTAGE], minlength=n)
+        return {
+            chassis: (int(cpu_temps[i]), int(currents[i]), int(fans[i]))
+            for i, chassis in enumerate(self.chassis_names)
+        }
+
+    def temperature_by_type(self, percentile=95):
+        """Fleet max and percentile temperature per sensor type
+
+        Returns:
+            dict: sensor type -> (max_celsius, percentile_celsius)
+        """
+        mask = (self.unit == UNIT_CELSIUS) & ~np.isnan(self.values)
+        temps = self.values[mask]
+        types = self.type_idx[mask]
+        if not len(temps):
+            return {}
+
+        # Sort by type once so each type is a contiguous slice
+        order = np.argsort(types, kind='stable')
+        temps = temps[order]
+        types = types[order]
+        type_codes, starts = np.unique(types, return_index=True)
+        maxima = np.maximum.reduceat(temps, starts)
+        bounds = np.append(starts, len(temps))
+
+        result = {}
+        for i, code in enumerate(type_codes):
+            group = temps[bounds[i]:bounds[i + 1]]
+            result[self.sensor_types[code]] = (float(maxima[i]), float(np.percentile(group, percentile)))
+        return result
+
+    def fan_outliers(self, z_threshold=FAN_OUTLIER_Z_SCORE):
+        """Find fans whose speed is far from the fleet median
+
+        Uses the median absolute deviation so a few failing fans do not
+        shift the baseline they are compared against.
+
+        Returns:
+            (fleet median fan ratio, dict: chassis IP -> outlier fan count)
+        """
+        mask = (self.unit == UNIT_PERCENTAGE) & ~np.isnan(self.values)
+        ratios = self.values[mask] / 100.0
+        chassis = self.chassis_idx[mask]
+        n = len(self.chassis_names)
+        if not len(ratios):
+            return None, {name: 0 for name in self.chassis_names}
+
+        median = np.median(ratios)
+        deviation = np.abs(ratios - median)
+        mad = np.median(deviation)
+        if mad > 0:
+            z_scores = 0.6745 * deviation / mad
+        else:
+            # More than half the fans agree exactly, fall back to the mean absolute deviation
+            mean_deviation = np.mean(deviation)
+            z_scores = deviation / (1.253314 * mean_deviation) if mean_deviation > 0 else np.zeros_like(deviation)
+        outliers = z_scores > z_threshold
+
+        counts = np.bincount(chassis[outliers], minlength=n)
+        return float(median), {name: int(counts[i]) for i, name in enumerate(self.chassis_names)}
+
+    def current_per_chassis(self):
+        """Total current draw per chassis in Amperes
+
+        Returns:
+            dict: chassis IP -> amperes
+        """
+        mask = (self.unit == UNIT_AMPERAGE) & ~np.isnan(self.values)
+        totals = np.bincount(self.chassis_idx[mask], weights=self.values[mask], minlength=len(self.chassis_names))
+        return {name: float(totals[i]) for i, name in enumerate(self.chassis_names)}
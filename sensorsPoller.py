@@ -1,15 +1,20 @@
 import time
-import config
-import logging
-from dotenv import load_dotenv
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from prometheus_client import start_http_server, Gauge
 
-from RestApi.IxOSRestInterface import IxRestSession
-from config import CHASSIS_LIST, POLLING_INTERVAL
-
-load_dotenv()
+from chassisSessions import get_session, invalidate_session, export_api_keys, restore_api_keys
+from adminServer import admin_server, recent_server, start_recent_server
+from remoteWrite import start_remote_writer
+from recentStore import RecentStore, CycleSamples
+from checkpoint import Checkpoint, PollSchedule, WorkerState, snapshot_gauges, restore_gauges
+from sensorAggregation import SensorFrame
+from anomalyDetection import DetectorBank
+from collectionPool import get_collection_pool
+from config import (CHASSIS_LIST, POLLING_INTERVAL, ANOMALY_EWMA_ALPHA,
+                    ANOMALY_Z_THRESHOLD, ANOMALY_SUSTAINED_SAMPLES,
+                    ANOMALY_MIN_STD, ANOMALY_MIN_STD_PERCENT,
+                    COLLECTION_MODE, COLLECTION_PROCESSES, ADMIN_ENABLED)
 
 # ==============================================================================
 # PROMETHEUS METRIC DEFINITIONS
@@ -36,15 +41,110 @@ sensor_fan_speed_ratio = Gauge(
     ['chassis', 'sensor_name', 'sensor_type']
 )
 
+# ==============================================================================
+# FLEET AGGREGATE METRICS (computed from the whole cycle in vectorized form)
+# ==============================================================================
+
+fleet_temperature_max_celsius = Gauge(
+    'ixos_fleet_temperature_max_celsius',
+    'Highest temperature reading across the fleet per sensor type',
+    ['sensor_type']
+)
+
+fleet_temperature_p95_celsius = Gauge(
+    'ixos_fleet_temperature_p95_celsius',
+    '95th percentile temperature reading across the fleet per sensor type',
+    ['sensor_type']
+)
+
+fleet_fan_speed_median_ratio = Gauge(
+    'ixos_fleet_fan_speed_median_ratio',
+    'Median fan speed across the fleet as ratio (0-1)'
+)
+
+chassis_fan_outliers = Gauge(
+    'ixos_chassis_fan_outlier_count',
+    'Number of fans on the chassis whose speed is an outlier against the fleet median',
+    ['chassis']
+)
+
+chassis_current_total_amperes = Gauge(
+    'ixos_chassis_current_total_amperes',
+    'Sum of all current sensor readings on the chassis in Amperes',
+    ['chassis']
+)
+
+
+# ==============================================================================
+# STREAMING ANOMALY DETECTION (temperature and fan sensors)
+# ==============================================================================
+
+sensor_anomaly_score = Gauge(
+    'ixos_sensor_anomaly_score',
+    'Deviation of the latest reading from its moving baseline in standard deviations',
+    ['chassis', 'sensor_name', 'sensor_type']
+)
+
+sensor_anomaly_flag = Gauge(
+    'ixos_sensor_anomaly_flag',
+    '1 while the sensor reading is in a sustained anomaly, else 0',
+    ['chassis', 'sensor_name', 'sensor_type']
+)
+
+# One streaming detector per (chassis, sensor name, sensor type)
+sensor_detectors = DetectorBank(
+    alpha=ANOMALY_EWMA_ALPHA,
+    z_threshold=ANOMALY_Z_THRESHOLD,
+    sustain=ANOMALY_SUSTAINED_SAMPLES,
+    min_std=ANOMALY_MIN_STD,
+    min_std_ratio=ANOMALY_MIN_STD_PERCENT / 100.0
+)
+
+# Last RECENT_WINDOW seconds of every gauge, queried through the /recent endpoint
+recent_store = RecentStore(POLLING_INTERVAL)
+
+# Gauge values set this cycle with their chassis' collection time, for recent_store and remote_write
+cycle_samples = CycleSamples()
+
+# Chassis sessions are kept by the collection workers in COLLECTION_MODE=process
+worker_state = WorkerState({'api_keys': (export_api_keys, restore_api_keys)})
+
+
+CHECKPOINTED_GAUGES = (
+    sensor_temperature_celsius, sensor_current_amperes, sensor_fan_speed_ratio,
+    fleet_temperature_max_celsius, fleet_temperature_p95_celsius, fleet_fan_speed_median_ratio,
+    chassis_fan_outliers, chassis_current_total_amperes, sensor_anomaly_score, sensor_anomaly_flag,
+)
+
+
+def build_checkpoint(schedule):
+    """Working state kept across restarts: API keys, last sensor values, detector baselines"""
+    state = Checkpoint('sensorsPoller')
+    state.register('schedule', schedule.snapshot, schedule.restore)
+    state.register('gauges', lambda: snapshot_gauges(*CHECKPOINTED_GAUGES),
+                   lambda snapshot, age: restore_gauges(CHECKPOINTED_GAUGES, snapshot))
+    # Detectors checkpointed before the key included the sensor type are dropped
+    state.register('detectors', sensor_detectors.snapshot,
+                   lambda snapshot, age: sensor_detectors.restore([d for d in snapshot if len(d[0]) == 3], age))
+    worker_state.register(state)
+    return state
+
+
+def init_partition_worker(partition, snapshot, age):
+    """Collection worker initializer: continue from the partition's checkpointed API keys"""
+    worker_state.init_worker(partition, snapshot, age)
+
 
 def get_sensor_information(session, chassis, type_chassis):
     """Method to get sensor information from Ixia Chassis using RestPy"""
-    sensor_list = session.get_sensors().json()
+    sensor_list = session.get_sensors().data
+    collected_at = time.time()
     keys_to_remove = ["criticalValue", "maxValue", 'parentId', 'id','adapterName','minValue','sensorSetName', 'cpuName']
     for record in sensor_list:
         for item in keys_to_remove:
             record.pop(item, "NA")
-        record.update({"chassisIp":chassis, "typeOfChassis": type_chassis, "lastUpdatedAt_UTC": datetime.now(timezone.utc).strftime("%m/%d/%Y, %H:%M:%S")})
+        record.update({"chassisIp":chassis, "typeOfChassis": type_chassis, "lastUpdatedAt_UTC": datetime.now(timezone.utc).strftime("%m/%d/%Y, %H:%M:%S"),
+                       "collectedAt": collected_at})
     return sensor_list
 
 
@@ -56,29 +156,54 @@ def update_prometheus_metrics(sensor_list):
         sensor_type = sensor['type']
         unit = sensor['unit']
         value = sensor['value']
+        collected_at = sensor['collectedAt']
+        labels = {'chassis': chassis, 'sensor_name': sensor_name, 'sensor_type': sensor_type}
+        
+        # Temperature and fan readings also feed the streaming anomaly detectors
+        if unit in ('CELSIUS', 'PERCENTAGE'):
+            score, flagged = sensor_detectors.update((chassis, sensor_name, sensor_type), value)
+            cycle_samples.set(sensor_anomaly_score, labels, score, collected_at)
+            cycle_samples.set(sensor_anomaly_flag, labels, 1 if flagged else 0, collected_at)
         
         # Route to appropriate metric based on unit type
         if unit == 'CELSIUS':
-            sensor_temperature_celsius.labels(
-                chassis=chassis,
-                sensor_name=sensor_name,
-                sensor_type=sensor_type
-            ).set(value)
+            cycle_samples.set(sensor_temperature_celsius, labels, value, collected_at)
             
         elif unit == 'AMPERAGE':
-            sensor_current_amperes.labels(
-                chassis=chassis,
-                sensor_name=sensor_name,
-                sensor_type=sensor_type
-            ).set(value)
+            cycle_samples.set(sensor_current_amperes, labels, value, collected_at)
             
         elif unit == 'PERCENTAGE':
             # Convert percentage (0-100) to ratio (0-1) for Prometheus best practice
-            sensor_fan_speed_ratio.labels(
-                chassis=chassis,
-                sensor_name=sensor_name,
-                sensor_type=sensor_type
-            ).set(value / 100.0)
+            cycle_samples.set(sensor_fan_speed_ratio, labels, value / 100.0, collected_at)
+
+
+def remove_missing_chassis(gauge, present):
+    """Remove the samples of a per-chassis gauge for chassis not in `present`"""
+    for metric in gauge.collect():
+        for sample in metric.samples:
+            if sample.labels['chassis'] not in present:
+                gauge.remove(sample.labels['chassis'])
+
+
+def update_fleet_metrics(frame, timestamp):
+    """Update fleet aggregate metrics from a cycle's SensorFrame, collected at `timestamp`"""
+    for sensor_type, (max_celsius, p95_celsius) in frame.temperature_by_type().items():
+        cycle_samples.set(fleet_temperature_max_celsius, {'sensor_type': sensor_type}, max_celsius, timestamp)
+        cycle_samples.set(fleet_temperature_p95_celsius, {'sensor_type': sensor_type}, p95_celsius, timestamp)
+
+    median_ratio, outlier_counts = frame.fan_outliers()
+    if median_ratio is not None:
+        cycle_samples.set(fleet_fan_speed_median_ratio, {}, median_ratio, timestamp)
+    for chassis, count in outlier_counts.items():
+        cycle_samples.set(chassis_fan_outliers, {'chassis': chassis}, count, timestamp)
+
+    for chassis, amperes in frame.current_per_chassis().items():
+        cycle_samples.set(chassis_current_total_amperes, {'chassis': chassis}, amperes, timestamp)
+
+    # A chassis that did not answer this cycle has no fan outliers or current total
+    present = set(frame.chassis_names)
+    remove_missing_chassis(chassis_fan_outliers, present)
+    remove_missing_chassis(chassis_current_total_amperes, present)
 
 
 def poll_single_chassis(chassis):
@@ -92,31 +217,41 @@ def poll_single_chassis(chassis):
         list: List of sensor dictionaries
     """
     try:
-        session = IxRestSession(chassis['ip'], chassis['username'], chassis['password'])
+        session = get_session(chassis)
         sensor_data = get_sensor_information(session, chassis['ip'], 'NA')
         return sensor_data
     except Exception as e:
         print(f"❌ Error polling chassis {chassis['ip']}: {e}")
+        invalidate_session(chassis['ip'])
         return []
 
 
-def get_all_chassis_sensors():
+def get_all_chassis_sensors(chassis_list=None):
     """
     Get sensor data from all chassis in parallel using ThreadPoolExecutor.
     This ensures all chassis are polled at approximately the same time.
+    
+    Args:
+        chassis_list: Chassis to poll. Defaults to CHASSIS_LIST, collected
+                      through the worker processes when COLLECTION_MODE=process.
     """
-    if not CHASSIS_LIST:
+    if chassis_list is None:
+        if COLLECTION_MODE == 'process' and CHASSIS_LIST:
+            return get_all_chassis_sensors_multiprocess()
+        chassis_list = CHASSIS_LIST
+    
+    if not chassis_list:
         print("⚠️  No chassis configured in CHASSIS_LIST")
         return []
     
     all_sensors = []
     
     # Use ThreadPoolExecutor to poll all chassis in parallel
-    with ThreadPoolExecutor(max_workers=len(CHASSIS_LIST)) as executor:
+    with ThreadPoolExecutor(max_workers=len(chassis_list)) as executor:
         # Submit all polling tasks
         future_to_chassis = {
             executor.submit(poll_single_chassis, chassis): chassis 
-            for chassis in CHASSIS_LIST
+            for chassis in chassis_list
         }
         
         # Process results as they complete
@@ -126,19 +261,37 @@ def get_all_chassis_sensors():
                 sensor_data = future.result()
                 if sensor_data:
                     all_sensors.extend(sensor_data)
-                    
-                    # Count sensor types for this chassis
-                    cpu_temps = sum(1 for s in sensor_data if s['type'] == 'CPU' and s['unit'] == 'CELSIUS')
-                    currents = sum(1 for s in sensor_data if s['unit'] == 'AMPERAGE')
-                    fans = sum(1 for s in sensor_data if s['unit'] == 'PERCENTAGE')
-                    
-                    print(f"✓ {chassis['ip']}: {cpu_temps} temp sensors, {currents} current sensors, {fans} fan sensors")
             except Exception as e:
                 print(f"❌ Exception processing chassis {chassis['ip']}: {e}")
     
     return all_sensors
 
 
+# Only these sensor keys cross the process boundary in COLLECTION_MODE=process
+SENSOR_FIELDS = ('chassisIp', 'name', 'type', 'unit', 'value', 'collectedAt')
+
+
+def collect_sensor_partition(chassis_list):
+    """Worker process entry point: poll one partition and return compact sensor tuples"""
+    sensors = [
+        tuple(sensor.get(field) for field in SENSOR_FIELDS)
+        for sensor in get_all_chassis_sensors(chassis_list)
+    ]
+    return sensors, worker_state.report()
+
+
+def get_all_chassis_sensors_multiprocess():
+    """Collect all partitions in the worker processes and rebuild the sensor list"""
+    pool = get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES)
+    results = pool.map(collect_sensor_partition)
+    worker_state.update(report for _, report in results)
+    return [
+        dict(zip(SENSOR_FIELDS, sensor))
+        for sensors, _ in results
+        for sensor in sensors
+    ]
+
+
 # ==============================================================================
 # MAIN APPLICATION
 # ==============================================================================
@@ -147,23 +300,42 @@ def main():
     """
     Main function to start the HTTP server and begin monitoring loop.
     """
+    # Pick up API keys, last sensor values and baselines from before a restart
+    schedule = PollSchedule(POLLING_INTERVAL)
+    checkpoint = build_checkpoint(schedule)
+    checkpoint.restore()
+    checkpoint.save_on_sigterm()
+    if COLLECTION_MODE == 'process':
+        # The workers log in with the restored API keys
+        get_collection_pool(CHASSIS_LIST, COLLECTION_PROCESSES, init_partition_worker, worker_state.initargs)
+    
     # Start the HTTP server to expose metrics on port 9002
     start_http_server(9002)
+    remote_writer = start_remote_writer('sensorsPoller')
     
     print("=" * 70)
     print("Chassis Sensor Monitoring Service Started")
     print("=" * 70)
     print(f"Metrics endpoint: http://localhost:9002/metrics")
+    if ADMIN_ENABLED:
+        print(f"Admin endpoint: http://localhost:{admin_server.start(9002)}/debug/threads")
+    recent_store.add_routes(recent_server)
+    recent_port = start_recent_server(9002)
+    if recent_port:
+        print(f"Recent state endpoint: http://localhost:{recent_port}/recent")
+    if remote_writer:
+        print(f"Remote write: {remote_writer.url} (every {remote_writer.flush_interval:g}s)")
     print(f"Number of chassis: {len(CHASSIS_LIST)}")
     print(f"Monitoring interval: {POLLING_INTERVAL} seconds")
-    print(f"Polling mode: Parallel (ThreadPoolExecutor)")
+    print(f"Polling mode: Parallel ({'ProcessPoolExecutor' if COLLECTION_MODE == 'process' else 'ThreadPoolExecutor'})")
     print("=" * 70)
     print("\nPress Ctrl+C to stop.\n")
     
-    # Main monitoring loop
-    poll_count = 0
+    # Main monitoring loop, keeping the cadence of the previous process after a restart
+    time.sleep(schedule.initial_delay())
     while True:
-        poll_count += 1
+        poll_count = schedule.start_cycle()
+        admin_server.begin_cycle()
         print(f"\n[Poll #{poll_count}] Starting parallel chassis polling at {datetime.now().strftime('%H:%M:%S')}...")
         start_time = time.time()
         
@@ -171,14 +343,29 @@ def main():
         all_sensors = get_all_chassis_sensors()
         
         if all_sensors:
+            # Load the cycle into columnar form once for counts and fleet aggregates
+            frame = SensorFrame.from_sensor_list(all_sensors)
+            for chassis, (cpu_temps, currents, fans) in frame.chassis_sensor_counts().items():
+                print(f"✓ {chassis}: {cpu_temps} temp sensors, {currents} current sensors, {fans} fan sensors")
+            
             # Update Prometheus metrics
             update_prometheus_metrics(all_sensors)
+            update_fleet_metrics(frame, start_time)
             print(f"✓ Updated Prometheus metrics: {len(all_sensors)} total sensors")
+            samples = cycle_samples.take()
+            recent_store.record_samples(samples)
+            if remote_writer:
+                remote_writer.push_samples(samples)
+        else:
+            remove_missing_chassis(chassis_fan_outliers, set())
+            remove_missing_chassis(chassis_current_total_amperes, set())
         
         elapsed_time = time.time() - start_time
         print(f"[Poll #{poll_count}] Completed in {elapsed_time:.2f} seconds")
         print(f"Next poll in {POLLING_INTERVAL} seconds...\n")
         
+        admin_server.end_cycle()
+        checkpoint.maybe_save()
         time.sleep(POLLING_INTERVAL)
 
 
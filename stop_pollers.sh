@@ -31,6 +31,14 @@ else
     echo "ℹ️  pensorsoPowler.py was not running"
 fi
 
+if pgrep -f "portStatsPoller.py" > /dev/null; then
+    pkill -f portStatsPoller.py
+    echo "✓ Stopped portStatsPoller.py"
+    STOPPED=$((STOPPED + 1))
+else
+    echo "ℹ️  portStatsPoller.py was not running"
+fi
+
 echo "========================================"
 if [ $STOPPED -eq 0 ]; then
     echo "No pollers were running"